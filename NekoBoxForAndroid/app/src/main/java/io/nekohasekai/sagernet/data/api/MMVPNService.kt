@@ -37,6 +37,9 @@ interface MMVPNService {
         @Part("uuid") uuid: RequestBody,
         @Part("protocol") protocol: RequestBody
     ): Call<PaymentResponse>
+
+    @GET("/api/payment/jobs/{jobId}")
+    fun getPaymentJob(@Path("jobId") jobId: String): Call<PaymentResponse>
     @GET("/")
     fun ping(): Call<okhttp3.ResponseBody>
 }
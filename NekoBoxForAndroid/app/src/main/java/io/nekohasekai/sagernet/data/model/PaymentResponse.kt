@@ -2,10 +2,17 @@ package io.nekohasekai.sagernet.data.model
 
 import com.google.gson.annotations.SerializedName
 
+/**
+ * A payment verification job: returned queued by POST /api/payment/verify,
+ * then polled via GET /api/payment/jobs/{job_id} until it succeeds or fails.
+ */
 data class PaymentResponse(
-    @SerializedName("success") val success: Boolean,
-    @SerializedName("message") val message: String,
-    @SerializedName("key") val key: String,
-    @SerializedName("protocol") val protocol: String,
-    @SerializedName("transaction_id") val transactionId: String
+    @SerializedName("job_id") val jobId: String?,
+    @SerializedName("status") val status: String?,
+    @SerializedName("success") val success: Boolean?,
+    @SerializedName("message") val message: String?,
+    @SerializedName("key") val key: String?,
+    @SerializedName("protocol") val protocol: String?,
+    @SerializedName("transaction_id") val transactionId: String?,
+    @SerializedName("error") val error: String?
 )
@@ -31,6 +31,7 @@ import java.io.File
 import java.io.FileOutputStream
 import kotlinx.coroutines.CoroutineScope
 import kotlinx.coroutines.Dispatchers
+import kotlinx.coroutines.delay
 import kotlinx.coroutines.launch
 import kotlinx.coroutines.withContext
 import okhttp3.MediaType.Companion.toMediaTypeOrNull
@@ -307,20 +308,12 @@ class MMVPNStatusFragment : ToolbarFragment(), SagerConnection.Callback {
                                     call: Call<PaymentResponse>,
                                     response: Response<PaymentResponse>
                             ) {
-                                dialog.dismiss()
-                                if (response.isSuccessful) {
-                                    val result = response.body()
-                                    if (result != null && result.success) {
-                                        showSuccessDialog(result)
-                                    } else {
-                                        Toast.makeText(
-                                                        context,
-                                                        "Verification failed: ${result?.message}",
-                                                        Toast.LENGTH_LONG
-                                                )
-                                                .show()
-                                    }
+                                val jobId = response.body()?.jobId
+                                if (response.isSuccessful && jobId != null) {
+                                    // OCR runs in the background on the server
+                                    pollPaymentJob(jobId, dialog)
                                 } else {
+                                    dialog.dismiss()
                                     Toast.makeText(
                                                     context,
                                                     "Error: ${response.code()} - ${response.errorBody()?.string()}",
@@ -343,6 +336,47 @@ class MMVPNStatusFragment : ToolbarFragment(), SagerConnection.Callback {
                 )
     }
 
+    private fun pollPaymentJob(jobId: String, dialog: androidx.appcompat.app.AlertDialog) {
+        val context = requireContext()
+        CoroutineScope(Dispatchers.Main).launch {
+            var job: PaymentResponse? = null
+            try {
+                var attempts = 0
+                while (attempts++ < PAYMENT_POLL_ATTEMPTS) {
+                    delay(PAYMENT_POLL_INTERVAL_MS)
+                    job = withContext(Dispatchers.IO) {
+                        ApiClient.service.getPaymentJob(jobId).execute().body()
+                    }
+                    if (job?.status == "succeeded" || job?.status == "failed") break
+                }
+            } catch (e: Exception) {
+                dialog.dismiss()
+                Toast.makeText(context, "Network Error: ${e.message}", Toast.LENGTH_SHORT).show()
+                return@launch
+            }
+
+            dialog.dismiss()
+            val result = job
+            when {
+                result != null && result.status == "succeeded" && result.success == true -> showSuccessDialog(result)
+                result != null && result.status == "failed" ->
+                        Toast.makeText(
+                                        context,
+                                        "Verification failed: ${result.error}",
+                                        Toast.LENGTH_LONG
+                                )
+                                .show()
+                else ->
+                        Toast.makeText(
+                                        context,
+                                        "Verification is taking longer than usual. Your key will appear under My Keys once it is approved.",
+                                        Toast.LENGTH_LONG
+                                )
+                                .show()
+            }
+        }
+    }
+
     private fun showSuccessDialog(result: PaymentResponse) {
         MaterialAlertDialogBuilder(requireContext())
                 .setTitle("Payment Verified! ✅")
@@ -354,7 +388,7 @@ class MMVPNStatusFragment : ToolbarFragment(), SagerConnection.Callback {
                             val proxies =
                                     withContext(Dispatchers.Default) {
                                         io.nekohasekai.sagernet.group.RawUpdater.parseRaw(
-                                                result.key
+                                                result.key.orEmpty()
                                         )
                                     }
 
@@ -950,4 +984,9 @@ class MMVPNStatusFragment : ToolbarFragment(), SagerConnection.Callback {
             }
         }
     }
+
+    companion object {
+        private const val PAYMENT_POLL_INTERVAL_MS = 2000L
+        private const val PAYMENT_POLL_ATTEMPTS = 90
+    }
 }
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time and peak Python memory of a full config rebuild.
+
+For each --users count, builds a temp database of active keys and the
+matching config.json (split across the five managed inbounds), then writes
+the full config three ways:
+
+    legacy   json.load of config.json, then json.dump(indent=2) of the whole
+             document (the pre-writer save path)
+    whole    json.load, then config_writer.write_config: one compact
+             serialization of the whole document, atomic write
+    stream   config_stream.generate_config: template plus user arrays
+             streamed from DB cursors, atomic write
+
+Time is measured without tracing; peak memory is a separate tracemalloc run
+(Python allocations, which include json's encoder and the sqlite3 rows).
+
+Usage:
+    python3 scripts/bench/bench_config_stream.py --users 10000 100000 500000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from unittest import mock
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from bot import config_stream
+from bot.config_writer import write_config
+from bot.reconcile import PROTOCOL_TAGS, user_entry
+
+PROTOCOLS = ['vless', 'vless_limited', 'ss', 'tuic', 'vlessplain']
+TEMPLATE = {
+    "log": {"level": "warn"},
+    "inbounds": [
+        {"type": "vless", "tag": "vless-in", "listen": "::", "listen_port": 8443, "users": [],
+         "tls": {"enabled": True, "server_name": "www.example.com",
+                 "reality": {"enabled": True, "handshake": {"server": "www.example.com", "server_port": 443},
+                             "private_key": "x" * 43, "short_id": ["6ba85179e30d4fc2"]}}},
+        {"type": "vless", "tag": "vless-limited-in", "listen": "::", "listen_port": 10001, "users": []},
+        {"type": "shadowsocks", "tag": "ss-in", "listen": "::", "listen_port": 9388,
+         "method": "chacha20-ietf-poly1305", "users": []},
+        {"type": "tuic", "tag": "tuic-in", "listen": "::", "listen_port": 2083, "users": []},
+        {"type": "vless", "tag": "vless-plain-in", "listen": "::", "listen_port": 8444, "users": []},
+    ],
+    "outbounds": [{"type": "direct", "tag": "direct"}, {"type": "block", "tag": "block"}],
+    "route": {"rules": [{"protocol": "bittorrent", "outbound": "block"}]},
+    "experimental": {"v2ray_api": {"listen": "127.0.0.1:10085", "stats": {"enabled": True, "users": []}}},
+}
+
+
+def make_fixture(tmpdir, users):
+    database.DB_PATH = os.path.join(tmpdir, f'bench-{users}.db')
+    with mock.patch('builtins.print'):
+        database.init_db()
+    rows = [(str(uuid.uuid4()), 1000 + i, f"user{i}", PROTOCOLS[i % len(PROTOCOLS)]) for i in range(users)]
+    conn = database.get_db_connection()
+    conn.executemany('INSERT INTO users (uuid, telegram_id, username, protocol) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+    # The same config the generator produces, written the legacy way
+    config = json.loads(json.dumps(TEMPLATE))
+    inbounds = {inbound['tag']: inbound for inbound in config['inbounds']}
+    stats = config['experimental']['v2ray_api']['stats']['users']
+    for key, _, name, protocol in rows:
+        tag = PROTOCOL_TAGS[protocol]
+        inbounds[tag]['users'].append(user_entry(tag, key, name))
+    for tag in ('vless-in', 'vless-limited-in'):
+        stats.extend(user['uuid'] for user in inbounds[tag]['users'])
+    path = os.path.join(tmpdir, 'config.json')
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+    return path
+
+
+def legacy(path, out):
+    with open(path) as f:
+        config = json.load(f)
+    with open(out, 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def whole(path, out):
+    with open(path) as f:
+        config = json.load(f)
+    write_config(out, config, mode='direct')
+
+
+def stream(path, out):
+    with mock.patch.object(config_stream.config_manager, 'FileLock', mock.MagicMock):
+        config_stream.generate_config(out, TEMPLATE, mode='direct')
+
+
+def measure(func, path, out):
+    start = time.perf_counter()
+    func(path, out)
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(out)
+    tracemalloc.start()
+    func(path, out)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[10000, 100000, 500000], help="User counts")
+    args = parser.parse_args()
+
+    print(f"{'users':>7}  {'path':<7} {'time':>9} {'peak mem':>10} {'file':>9}")
+    for users in args.users:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = make_fixture(tmpdir, users)
+            out = os.path.join(tmpdir, 'out.json')
+            for label, func in (('legacy', legacy), ('whole', whole), ('stream', stream)):
+                seconds, peak, size = measure(func, path, out)
+                print(f"{users:>7}  {label:<7} {seconds * 1000:7.0f} ms {peak / 1e6:7.1f} MB {size / 1e6:6.1f} MB")
+            close_all_pools()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-mutation latency of a sing-box config change.
+
+Runs one add_ss mutation at a time against a config with --users users
+(split across vless-in, vless-limited-in, ss-in, tuic-in and vless-plain-in)
+in a temp directory.
+
+    legacy   the pre-writer path: json.load, scan-and-append, json.dump to
+             /tmp, `cp` (was `sudo cp`) and `rm` subprocesses, then a
+             json.load re-read to verify
+    atomic   config_manager.apply_ops without the reload: json.load into
+             SingboxConfig, O(1) add, one serialization, same-directory
+             fsync + os.replace, digest as the verification (indent=2
+             unless CONFIG_JSON_INDENT=0 selects compact JSON)
+    fragment the same with CONFIG_LAYOUT=fragments: every fragment is read
+             and merged, but only 10-ss-in.json is rewritten and hashed
+
+Usage:
+    python3 scripts/bench/bench_config_write.py --users 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+import numpy as np
+
+from bot import config_manager
+
+TAGS = [('vless', 'vless-in'), ('vless', 'vless-limited-in'), ('shadowsocks', 'ss-in'),
+        ('tuic', 'tuic-in'), ('vless', 'vless-plain-in')]
+
+
+def make_config(users):
+    inbounds = []
+    for inbound_type, tag in TAGS:
+        inbound = {"type": inbound_type, "tag": tag, "listen": "::", "listen_port": 8443, "users": []}
+        inbounds.append(inbound)
+    for i in range(users):
+        inbound_type, tag = TAGS[i % len(TAGS)]
+        key = str(uuid.uuid4())
+        user = {"password": key, "name": f"User{i}-Key1"} if inbound_type == 'shadowsocks' else \
+            {"uuid": key, "flow": "xtls-rprx-vision", "name": f"User{i}-Key1"}
+        inbounds[i % len(TAGS)]["users"].append(user)
+    return {"log": {"level": "warn"}, "inbounds": inbounds, "outbounds": [{"type": "direct", "tag": "direct"}]}
+
+
+def legacy_add_ss(path, password, name):
+    with open(path) as f:
+        config = json.load(f)
+    for inbound in config.get('inbounds', []):
+        if inbound.get('tag') == 'ss-in':
+            if any(u.get('password') == password for u in inbound['users']):
+                return False
+            inbound['users'].append({"password": password, "name": name})
+    temp_path = os.path.join(tempfile.gettempdir(), "bench_singbox_config.json")
+    with open(temp_path, 'w') as f:
+        json.dump(config, f, indent=2)
+    subprocess.run(["cp", temp_path, path], check=True, timeout=5, capture_output=True)
+    subprocess.run(["rm", temp_path], check=True, timeout=5)
+    with open(path) as f:
+        verify = json.load(f)
+    return any(u.get('password') == password for i in verify['inbounds'] if i.get('tag') == 'ss-in' for u in i['users'])
+
+
+def atomic_add_ss(path, password, name):
+    with mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', path), \
+         mock.patch.object(config_manager, 'reload_service'), \
+         mock.patch('builtins.print'):
+        return config_manager.apply_ops([('add_ss', (password, name))])[0]
+
+
+def fragment_add_ss(directory, password, name):
+    fragments = config_manager.config_fragments
+    with mock.patch.object(fragments, 'CONFIG_LAYOUT', 'fragments'), \
+         mock.patch.object(fragments, 'CONFIG_FRAGMENT_DIR', directory), \
+         mock.patch.object(config_manager, 'reload_service'), \
+         mock.patch('builtins.print'):
+        return config_manager.apply_ops([('add_ss', (password, name))])[0]
+
+
+def timed(func, path, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        assert func(path, str(uuid.uuid4()), f"Bench{i}")
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000, help="Users in the config")
+    parser.add_argument('--repeat', type=int, default=20, help="Mutations per path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'config.json')
+        with open(path, 'w') as f:
+            json.dump(make_config(args.users), f, indent=2)
+        print(f"{args.users} users, {os.path.getsize(path) / 1e6:.1f} MB config")
+        fragment_dir = os.path.join(tmpdir, 'conf.d')
+        os.mkdir(fragment_dir)
+        with open(path) as f:
+            config_manager.config_fragments.write_fragments(config_manager.config_fragments.split(json.load(f)), fragment_dir)
+        for label, func, target in (('legacy', legacy_add_ss, path), ('atomic', atomic_add_ss, path),
+                                    ('fragment', fragment_add_ss, fragment_dir)):
+            p50, p99 = timed(func, target, args.repeat)
+            print(f"  {label:<8} p50 {p50:7.1f} ms  p99 {p99:7.1f} ms")
+        written = os.path.getsize(os.path.join(fragment_dir, '10-ss-in.json'))
+        print(f"  bytes written per change: single {os.path.getsize(path) / 1e6:.1f} MB, fragment {written / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
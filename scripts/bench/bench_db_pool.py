@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: get_user / get_daily_usage with connect-per-call vs the pool.
+
+Builds a throwaway database with --users rows and today's usage for each,
+then times --calls lookups of each function twice:
+
+  connect - the old behaviour, sqlite3.connect() on every call
+  pooled  - db.pool's persistent WAL connection
+
+Usage:
+    python3 scripts/bench/bench_db_pool.py --users 10000 --calls 20000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid as uuid_lib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+
+from db import database
+from db.pool import close_all_pools
+
+
+def connect_per_call():
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def seed(user_count):
+    database.init_db()
+    today = datetime.date.today()
+    uuids = [str(uuid_lib.uuid4()) for _ in range(user_count)]
+    conn = database.get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (uuid, telegram_id, username) VALUES (?, ?, ?)",
+            [(u, i, f"user{i}") for i, u in enumerate(uuids)]
+        )
+        conn.executemany(
+            "INSERT INTO usage_logs (uuid, date, bytes_used) VALUES (?, ?, ?)",
+            [(u, today, random.randint(0, 1 << 30)) for u in uuids]
+        )
+    return uuids
+
+
+def time_calls(func, uuids, calls):
+    sample = [random.choice(uuids) for _ in range(calls)]
+    start = time.perf_counter()
+    for uuid in sample:
+        func(uuid)
+    return time.perf_counter() - start
+
+
+def run(user_count, calls):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.DB_PATH = os.path.join(tmpdir, 'bench.db')
+        uuids = seed(user_count)
+
+        pooled_get_connection = database.get_db_connection
+        results = {}
+        for mode in ('connect', 'pooled'):
+            database.get_db_connection = connect_per_call if mode == 'connect' else pooled_get_connection
+            results[mode] = {
+                'get_user': time_calls(database.get_user, uuids, calls),
+                'get_daily_usage': time_calls(database.get_daily_usage, uuids, calls),
+            }
+        database.get_db_connection = pooled_get_connection
+        close_all_pools()
+
+    print(f"{user_count} users, {calls} calls per function")
+    print(f"{'function':<18} {'connect (us/call)':>18} {'pooled (us/call)':>17} {'speedup':>8}")
+    for func in ('get_user', 'get_daily_usage'):
+        before = results['connect'][func] / calls * 1e6
+        after = results['pooled'][func] / calls * 1e6
+        print(f"{func:<18} {before:18.1f} {after:17.1f} {before / after:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+    run(args.users, args.calls)
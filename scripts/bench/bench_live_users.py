@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency of a live user add (src/bot/live_users.py).
+
+Runs a local fake HandlerService, like tests/test_live_users.py, and times
+apply_live for single-user batches. This is the cost that replaces
+`systemctl reload sing-box` on the purchase path when LIVE_USERS_API is set.
+A reload also re-parses the whole config and drops connections. Time one on
+a server with:
+
+    time sudo systemctl reload sing-box
+
+Usage:
+    python3 scripts/bench/bench_live_users.py --repeat 500
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent import futures
+from unittest import mock
+
+import grpc
+import numpy as np
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src', 'v2ray-proto'))
+
+import handler_command
+from bot import live_users
+from bot.config_model import SingboxConfig
+
+
+class NullHandlerService:
+    def AlterInbound(self, request, context):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=500, help="Live adds to time")
+    args = parser.parse_args()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    handler_command.add_HandlerServiceServicer_to_server(NullHandlerService(), server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+
+    config = {"inbounds": [{"type": "vless", "tag": "vless-in", "users": []}]}
+    times = []
+    with mock.patch.object(live_users, 'LIVE_USERS_API', f'127.0.0.1:{port}'):
+        for _ in range(args.repeat):
+            model = SingboxConfig(config)
+            key = str(uuid.uuid4())
+            model.add_user('vless-in', {"uuid": key, "flow": "xtls-rprx-vision", "name": key})
+            start = time.perf_counter()
+            assert live_users.apply_live(model)
+            times.append(time.perf_counter() - start)
+        live_users.get_applier().close()
+    server.stop(None)
+
+    times = np.array(times[1:]) * 1000  # first call opens the channel
+    print(f"live add: p50 {np.percentile(times, 50):.2f} ms  p99 {np.percentile(times, 99):.2f} ms "
+          f"({args.repeat} calls, local fake server)")
+
+
+if __name__ == '__main__':
+    main()
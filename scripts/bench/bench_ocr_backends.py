@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: slips per second, spawn-per-call OCR vs warm OCR workers.
+
+Feeds the same slips through each backend from --concurrency threads:
+
+    spawn  pytesseract, a new tesseract process (and language data load) per slip
+    warm   WarmPoolBackend with --concurrency long-lived workers
+
+Slips are tests/KBZ-Pay-Slip-Sample.jpeg plus the synthetic slips from
+bench_ocr_preprocess.py, preprocessed as OCRService does by default. The
+warm backend needs tesserocr; without it only spawn is measured.
+
+Usage:
+    python3 scripts/bench/bench_ocr_backends.py --slips 40 --concurrency 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+
+from PIL import Image
+
+from bench_ocr_preprocess import SAMPLE_SLIP, SYNTHETIC_SLIPS, render_slip
+from services.image_preprocess import preprocess
+from services.ocr_backends import SpawnBackend, WarmPoolBackend, TesserocrBackend
+
+
+def load_slips(count):
+    images = [Image.open(SAMPLE_SLIP).convert('RGB')] + [render_slip(*slip[1:]) for slip in SYNTHETIC_SLIPS]
+    images = [preprocess(image) for image in images]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def throughput(backend, slips, concurrency):
+    # One warm-up slip per worker so pool startup is not counted
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(backend.image_to_string, slips[:concurrency]))
+        start = time.perf_counter()
+        texts = list(executor.map(backend.image_to_string, slips))
+    return len(slips) / (time.perf_counter() - start), texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slips', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    if shutil.which('tesseract') is None and not TesserocrBackend.available():
+        print("Neither tesseract nor tesserocr is installed; nothing to benchmark.")
+        return 1
+
+    slips = load_slips(args.slips)
+    print(f"{args.slips} slips, {args.concurrency} concurrent "
+          f"(tesserocr {'installed' if TesserocrBackend.available() else 'not installed'})")
+
+    spawn_rate, spawn_texts = throughput(SpawnBackend(), slips, args.concurrency)
+    print(f"  spawn : {spawn_rate:6.2f} slips/s")
+
+    if not TesserocrBackend.available():
+        print("  warm  : skipped (tesserocr not installed)")
+        return 0
+    warm = WarmPoolBackend(workers=args.concurrency)
+    try:
+        warm_rate, warm_texts = throughput(warm, slips, args.concurrency)
+    finally:
+        warm.close()
+    print(f"  warm  : {warm_rate:6.2f} slips/s   ({warm_rate / spawn_rate:.1f}x)")
+
+    same = sum(a.split() == b.split() for a, b in zip(spawn_texts, warm_texts))
+    print(f"  identical text for {same}/{len(slips)} slips")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
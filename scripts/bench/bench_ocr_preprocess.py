@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark: OCR latency with and without image preprocessing.
+
+Runs tests/KBZ-Pay-Slip-Sample.jpeg and a set of synthetic slips (rendered
+at common phone resolutions, light and dark themes) through OCR with each
+preprocessing configuration. For every run it reports the preprocessing and
+Tesseract time, the pixel count handed to Tesseract, and whether
+PaymentValidator still extracts the same provider, TID and amount as the
+raw image (or, for synthetic slips, the values that were rendered).
+
+Without a tesseract binary on PATH only preprocessing time and pixel counts
+are reported.
+
+Usage:
+    python3 scripts/bench/bench_ocr_preprocess.py --repeat 3
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+from services.image_preprocess import PreprocessOptions, preprocess
+from services.payment_validator import payment_validator, InvalidReceiptError
+
+SAMPLE_SLIP = os.path.join(PROJECT_ROOT, 'tests', 'KBZ-Pay-Slip-Sample.jpeg')
+
+CONFIGS = [
+    ('raw', None),
+    ('grayscale', PreprocessOptions(rescale=False, crop=False, binarize=False)),
+    ('gray+rescale', PreprocessOptions(crop=False, binarize=False)),
+    ('gray+rescale+crop', PreprocessOptions(binarize=False)),
+    ('all (+binarize)', PreprocessOptions(binarize=True)),
+]
+
+# (name, size, provider line, TID, amount line, dark theme)
+SYNTHETIC_SLIPS = [
+    ('kbz-1080x2400', (1080, 2400), 'KBZ Pay', '01003984021770423299', '3,000.00 Ks', False),
+    ('wave-1080x2400-dark', (1080, 2400), 'Wave Money', '5012345678901234', '3,000 MMK', True),
+    ('kbz-1440x3200', (1440, 3200), 'KBZPay', '01003984021770400001', '6,000.00 Ks', False),
+    ('wave-720x1280', (720, 1280), 'WavePay', '5098765432109876', '3,000 Ks', False),
+]
+
+
+def render_slip(size, provider, tid, amount, dark):
+    """Draw a plain phone-screenshot style receipt."""
+    width, height = size
+    background, text, muted = ((18, 18, 18), (235, 235, 235), (150, 150, 150)) if dark else \
+        ((255, 255, 255), (20, 20, 20), (150, 150, 150))
+    image = Image.new('RGB', size, background)
+    draw = ImageDraw.Draw(image)
+    unit = width / 1080
+    header = ImageFont.load_default(size=int(56 * unit))
+    body = ImageFont.load_default(size=int(38 * unit))
+
+    # Status bar and a coloured banner, like a real screenshot
+    draw.rectangle((0, 0, width, int(90 * unit)), fill=(0, 0, 0))
+    draw.rectangle((0, int(90 * unit), width, int(320 * unit)), fill=(0, 84, 166))
+    draw.text((int(60 * unit), int(170 * unit)), provider, font=header, fill=(255, 255, 255))
+
+    rows = [
+        ('Transfer Successful', ''),
+        ('Transaction ID', tid),
+        ('Transaction Type', 'Transfer'),
+        ('Amount', amount),
+        ('Notes', 'Payment'),
+    ]
+    y = int(420 * unit)
+    for label, value in rows:
+        draw.text((int(60 * unit), y), label, font=body, fill=muted)
+        if value:
+            right = width - int(60 * unit) - draw.textlength(value, font=body)
+            draw.text((right, y), value, font=body, fill=text)
+        y += int(90 * unit)
+    return image
+
+
+def expected_result(slip):
+    _name, _size, provider, tid, amount, _dark = slip
+    return {
+        'provider': payment_validator._identify_provider(provider),
+        'transaction_id': tid,
+        'amount': float(amount.split()[0].replace(',', '')),
+    }
+
+
+def validate(text_lines):
+    try:
+        return payment_validator.validate_receipt(text_lines)
+    except InvalidReceiptError as e:
+        return {'error': str(e)}
+
+
+def run_config(image, options, repeat, ocr):
+    """Return (preprocess seconds, ocr seconds, pixels, validation result)."""
+    prep_time = ocr_time = 0.0
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prepared = preprocess(image, options) if options else image
+        prep_time += time.perf_counter() - start
+        if ocr:
+            start = time.perf_counter()
+            text = pytesseract.image_to_string(prepared)
+            ocr_time += time.perf_counter() - start
+            result = validate([line.strip() for line in text.split('\n') if line.strip()])
+    return prep_time / repeat, ocr_time / repeat, prepared.width * prepared.height, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    ocr = shutil.which('tesseract') is not None
+    if not ocr:
+        print("tesseract not found on PATH: reporting preprocessing only\n")
+
+    images = [('KBZ-Pay-Slip-Sample.jpeg', Image.open(SAMPLE_SLIP).convert('RGB'), None)]
+    for slip in SYNTHETIC_SLIPS:
+        images.append((slip[0], render_slip(*slip[1:]), expected_result(slip)))
+
+    for name, image, expected in images:
+        print(f"{name} ({image.width}x{image.height})")
+        baseline = None
+        for label, options in CONFIGS:
+            prep, ocr_time, pixels, result = run_config(image, options, args.repeat, ocr)
+            line = f"  {label:<18} prep {prep * 1000:7.1f} ms   pixels {pixels / 1e6:5.2f} M"
+            if ocr:
+                reference = expected or baseline
+                if options is None:
+                    baseline = result
+                    reference = expected or result
+                match = 'same' if result == reference else f"DIFFERS: {result}"
+                line += f"   ocr {ocr_time * 1000:8.1f} ms   validator {match}"
+            print(line)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: QR rendering time and PNG size per protocol link format.
+
+Compares the bot's previous renderer (qrcode.QRCode(version=1, box_size=10,
+border=5), default error correction, RGB image through the qrcode PIL
+factory) with services.qr_render.render_png (smallest version, strongest
+error correction that fits it, 1-bit palette PNG, QR_BOX_SIZE/QR_BORDER).
+
+Links are built like src/bot/main.py builds them, from sample server values
+and a random UUID per run.
+
+Usage:
+    python3 scripts/bench/bench_qr_render.py --repeat 50
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+
+import qrcode
+
+from services.qr_render import make_qr, render_png, QR_BOX_SIZE, QR_BORDER
+
+SERVER_IP = "203.0.113.7"
+PUBLIC_KEY = "Q2xhdWRlUmVhbGl0eVB1YmxpY0tleUV4YW1wbGUxMjM"
+SHORT_ID = "6ba85179e30d4fc2"
+SERVER_NAME = "www.microsoft.com"
+SS_METHOD = "chacha20-ietf-poly1305"
+
+
+def links(key_tag="ExampleUser-Key1"):
+    user_uuid = str(uuid.uuid4())
+    ss_encoded = base64.b64encode(f"{SS_METHOD}:{base64.b64encode(os.urandom(32)).decode()}".encode()).decode()
+    return {
+        'vless': f"vless://{user_uuid}@{SERVER_IP}:8443?security=reality&encryption=none&pbk={PUBLIC_KEY}&fp=randomized&type=tcp&flow=xtls-rprx-vision&sni={SERVER_NAME}&sid={SHORT_ID}#{key_tag}",
+        'vlessplain': f"vless://{user_uuid}@{SERVER_IP}:8444?security=tls&encryption=none&type=tcp&sni=www.microsoft.com&allowInsecure=1#{key_tag}",
+        'tuic': f"tuic://{user_uuid}:{user_uuid}@{SERVER_IP}:2083?congestion_control=bbr&alpn=h3&sni=www.microsoft.com&allow_insecure=1#{key_tag}",
+        'ss': f"ss://{ss_encoded}@{SERVER_IP}:9388#{key_tag}",
+    }
+
+
+def legacy_png(link):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(link)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    bio = io.BytesIO()
+    img.save(bio)
+    return bio.getvalue()
+
+
+def timed(func, link, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        png = func(link)
+    return (time.perf_counter() - start) / repeat * 1000, len(png)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50, help="Renders per link and renderer")
+    args = parser.parse_args()
+
+    levels = {v: k for k, v in {'L': 1, 'M': 0, 'Q': 3, 'H': 2}.items()}
+    print(f"compact: box_size {QR_BOX_SIZE}, border {QR_BORDER}; legacy: box_size 10, border 5")
+    print(f"{'protocol':<11} {'chars':>5} {'symbol':>7}  {'legacy ms':>9} {'bytes':>7}  {'compact ms':>10} {'bytes':>7}")
+    for protocol, link in links().items():
+        qr = make_qr(link)
+        legacy_ms, legacy_bytes = timed(legacy_png, link, args.repeat)
+        compact_ms, compact_bytes = timed(render_png, link, args.repeat)
+        print(f"{protocol:<11} {len(link):>5} {f'v{qr.version}-{levels[qr.error_correction]}':>7}  "
+              f"{legacy_ms:9.2f} {legacy_bytes:7d}  {compact_ms:10.2f} {compact_bytes:7d}")
+
+
+if __name__ == '__main__':
+    main()
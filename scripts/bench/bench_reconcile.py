@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reconcile a config against --keys database keys.
+
+Builds a temp database with --keys active keys across the managed protocols
+and a config that has drifted from it: --drift keys are missing and --drift
+stale users are extra. It then times each step of reconcile() except the
+reload: the DB query, json.load into SingboxConfig, the set diff, applying
+the delta, and the single atomic save. A second run checks that an in-sync
+config costs only the query, the load and the diff.
+
+Usage:
+    python3 scripts/bench/bench_reconcile.py --keys 100000 --drift 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from bot import config_manager
+from bot import reconcile
+from bot.config_model import SingboxConfig
+
+PROTOCOLS = ['vless', 'vless_limited', 'ss', 'tuic', 'vlessplain']
+
+
+def make_fixture(db_path, config_path, keys, drift):
+    database.DB_PATH = db_path
+    with mock.patch('builtins.print'):
+        database.init_db()
+    rows = [(str(uuid.uuid4()), 1000 + i, f"user{i}", PROTOCOLS[i % len(PROTOCOLS)]) for i in range(keys)]
+    conn = database.get_db_connection()
+    conn.executemany('INSERT INTO users (uuid, telegram_id, username, protocol) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+    # The config has every key but the first `drift`, plus `drift` stale users
+    config = SingboxConfig({"inbounds": [{"type": t, "tag": tag, "users": []} for tag, t in (
+        ('vless-in', 'vless'), ('vless-limited-in', 'vless'), ('ss-in', 'shadowsocks'),
+        ('tuic-in', 'tuic'), ('vless-plain-in', 'vless'))]})
+    for key, telegram_id, name, protocol in rows[drift:]:
+        tag = reconcile.PROTOCOL_TAGS[protocol]
+        config.add_user(tag, reconcile.user_entry(tag, key, name))
+    for i in range(drift):
+        tag = reconcile.MANAGED_TAGS[i % len(reconcile.MANAGED_TAGS)]
+        config.add_user(tag, reconcile.user_entry(tag, str(uuid.uuid4()), f"stale{i}"))
+    with open(config_path, 'w') as f:
+        json.dump(config.to_dict(), f)
+
+
+def timed_run(label):
+    steps = {}
+    start = time.perf_counter()
+    keys = database.get_provisioned_keys()
+    steps['query'] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    config = SingboxConfig(config_manager.load_config())
+    steps['load'] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    plan = reconcile.compute_plan(config, keys)
+    steps['diff'] = time.perf_counter() - mark
+
+    if not plan.empty:
+        mark = time.perf_counter()
+        reconcile.apply_plan(config, plan)
+        steps['apply'] = time.perf_counter() - mark
+        mark = time.perf_counter()
+        config_manager.save_config(config.to_dict())
+        steps['save'] = time.perf_counter() - mark
+    total = time.perf_counter() - start
+
+    detail = '  '.join(f"{name} {seconds * 1000:.0f}" for name, seconds in steps.items())
+    return f"  {label:<8} {total * 1000:6.0f} ms  ({detail} ms)  {plan.counts() or 'in sync'}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=100000, help="Active keys in the database")
+    parser.add_argument('--drift', type=int, default=500, help="Missing keys (and stale users) in the config")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, 'config.json')
+        make_fixture(os.path.join(tmpdir, 'bench.db'), config_path, args.keys, args.drift)
+        print(f"{args.keys} keys, {args.drift} missing + {args.drift} stale, "
+              f"{os.path.getsize(config_path) / 1e6:.1f} MB config")
+        with mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', config_path), \
+             mock.patch('builtins.print'):
+            results = [timed_run('drifted'), timed_run('in sync')]
+        close_all_pools()
+    print('\n'.join(results))
+
+
+if __name__ == '__main__':
+    main()
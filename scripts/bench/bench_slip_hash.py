@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark: near-duplicate slip lookup latency and accuracy.
+
+Accuracy, on rendered slips (bench_ocr_preprocess.render_slip, random
+transaction IDs and amounts across the synthetic templates, plus
+tests/KBZ-Pay-Slip-Sample.jpeg) or on a directory of real, distinct slips
+(--slip-dir):
+
+    recall         share of reused copies (Telegram-style recompression,
+                   rescaling, JPEG quality 60, added border) that match
+    false matches  distinct slips that match another distinct slip; with
+                   SLIP_HASH_ACTION=reject each one is a wrongly refused payment
+
+Latency, at --size stored slips: the rendered slips' strips are recombined
+per template into --size hashes, so the index holds the same kind of
+near-identical layouts a real slip history does. Lookups of stored slips,
+copies and fresh slips are timed through SlipHashIndex and, for comparison,
+through a NumPy linear scan over every stored hash.
+
+Rendered slips differ only in the glyphs of the TID and amount, the worst
+case for a perceptual hash; real slips also differ in names, times and
+reference numbers. Run --slip-dir on real slips before enabling
+SLIP_HASH_ACTION=reject.
+
+Usage:
+    python3 scripts/bench/bench_slip_hash.py --size 100000 --slips 200
+    python3 scripts/bench/bench_slip_hash.py --slip-dir ~/slips
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from bench_ocr_preprocess import SAMPLE_SLIP, SYNTHETIC_SLIPS, render_slip
+from services.slip_hash import SlipHashIndex, SLIP_HASH_MAX_DISTANCE, load_slip_hash, _popcount
+
+
+def jpeg(image, quality=87, max_side=None):
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+COPIES = {
+    'telegram': lambda image: jpeg(image, 87, 1280),
+    'small': lambda image: jpeg(image, 80, 800),
+    'jpeg60': lambda image: jpeg(image, 60),
+    'rescaled': lambda image: jpeg(image.resize((image.width * 2 // 3, image.height * 2 // 3), Image.Resampling.LANCZOS)),
+    'border': lambda image: jpeg(ImageOps.expand(image, border=40, fill=image.getpixel((0, image.height - 1)))),
+}
+
+
+def render_slips(count, rng):
+    """Return [(template, image)] of distinct slips."""
+    slips = [(-1, Image.open(SAMPLE_SLIP).convert('RGB'))]
+    for i in range(count - 1):
+        template = i % len(SYNTHETIC_SLIPS)
+        _name, size, provider, tid, _amount, dark = SYNTHETIC_SLIPS[template]
+        tid = ''.join(rng.choice('0123456789') for _ in tid)
+        amount = f"{rng.choice((3, 6, 9, 12))},000{'.00' if 'KBZ' in provider else ''} {rng.choice(('Ks', 'MMK'))}"
+        slips.append((template, render_slip(size, provider, tid, amount, dark)))
+    return slips
+
+
+def load_slips(directory):
+    """Return [(0, image)] for every image in directory."""
+    slips = []
+    for name in sorted(os.listdir(directory)):
+        try:
+            slips.append((0, Image.open(os.path.join(directory, name)).convert('RGB')))
+        except OSError:
+            continue
+    return slips
+
+
+def accuracy(slips, hashes):
+    stored = np.array(hashes)
+    false_matches = 0
+    for i, phash in enumerate(stored):
+        distances = _popcount(stored ^ phash).max(axis=1)
+        distances[i] = 64
+        false_matches += bool((distances <= SLIP_HASH_MAX_DISTANCE).any())
+
+    index = SlipHashIndex()
+    for i, phash in enumerate(hashes):
+        index.add(phash, i)
+    recall = {}
+    for name, copy in COPIES.items():
+        hits = 0
+        for i, (_template, image) in enumerate(slips):
+            match = index.find(load_slip_hash(copy(image)))
+            hits += match is not None and match[0] == i
+        recall[name] = hits / len(slips)
+    return recall, false_matches
+
+
+def build_history(slips, hashes, size, seed):
+    """size hashes, each strip taken from a random slip of the same template."""
+    by_template = {}
+    for (template, _image), phash in zip(slips, hashes):
+        by_template.setdefault(template, []).append(phash)
+    pools = [np.array(group) for group in by_template.values()]
+    rng = np.random.default_rng(seed)
+    templates = rng.integers(0, len(pools), size)
+    history = np.empty((size, hashes[0].shape[0]), dtype=np.uint64)
+    for template, pool in enumerate(pools):
+        rows = np.nonzero(templates == template)[0]
+        picks = rng.integers(0, len(pool), (len(rows), pool.shape[1]))
+        history[rows] = pool[picks, np.arange(pool.shape[1])]
+    return history
+
+
+def timed(lookup, queries):
+    times = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(lookup(query))
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return np.percentile(times, 50), np.percentile(times, 99), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100000, help="Stored slips for the latency test")
+    parser.add_argument('--slips', type=int, default=200, help="Distinct slips to render")
+    parser.add_argument('--slip-dir', help="Use the (distinct) slip images in this directory instead")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    slips = load_slips(args.slip_dir) if args.slip_dir else render_slips(args.slips, rng)
+    hashes = [load_slip_hash(jpeg(image, 95)) for _template, image in slips]
+    recall, false_matches = accuracy(slips, hashes)
+    print(f"Accuracy over {len(slips)} distinct slips (max distance {SLIP_HASH_MAX_DISTANCE} per strip)")
+    for name, rate in recall.items():
+        print(f"  recall {name:<9} {rate:6.1%}")
+    print(f"  false matches    {false_matches}/{len(slips)}")
+
+    history = build_history(slips, hashes, args.size, args.seed)
+    index = SlipHashIndex()
+    for row, phash in enumerate(history):
+        index.add(phash, row)
+    start = time.perf_counter()
+    index.find(history[0])
+    print(f"\n{args.size} stored slips (index built in {time.perf_counter() - start:.2f} s)")
+
+    copies = [load_slip_hash(COPIES['telegram'](image)) for _template, image in slips[:50]]
+    hits = [history[rng.randrange(args.size)] for _ in range(200)]
+    fresh = [load_slip_hash(jpeg(image, 95)) for _template, image in render_slips(51, random.Random(args.seed + 1))[1:]]
+
+    def linear(phash):
+        distances = _popcount(history ^ phash).max(axis=1)
+        best = int(distances.argmin())
+        return best if distances[best] <= SLIP_HASH_MAX_DISTANCE else None
+
+    for label, queries in (('stored', hits), ('copies', copies), ('fresh', fresh)):
+        p50, p99, found = timed(index.find, queries)
+        linear_p50, linear_p99, _ = timed(linear, queries)
+        matched = sum(r is not None for r in found)
+        print(f"  {label:<7} index p50 {p50:6.3f} ms  p99 {p99:6.3f} ms   "
+              f"linear scan p50 {linear_p50:6.2f} ms  p99 {linear_p99:6.2f} ms   matched {matched}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
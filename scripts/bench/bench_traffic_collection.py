@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-user vs bulk traffic collection against a fake StatsService.
+
+Starts an in-process gRPC server that serves "user>>>{uuid}>>>traffic>>>{dir}"
+counters, then times one watchdog collection cycle both ways:
+
+  legacy - two QueryStats calls per user (the old query_stats loop)
+  bulk   - one QueryStats(pattern="user>>>", reset=True) call
+
+Usage:
+    python3 scripts/bench/bench_traffic_collection.py
+    python3 scripts/bench/bench_traffic_collection.py --users 1000 10000 --skip-legacy
+"""
+import argparse
+import os
+import sys
+import time
+import uuid as uuid_lib
+from concurrent import futures
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src')
+sys.path.insert(0, os.path.join(SRC_DIR, 'v2ray-proto'))
+sys.path.insert(0, os.path.join(SRC_DIR, 'watchdog'))
+
+import grpc
+import command_pb2
+import command_pb2_grpc
+
+from traffic_collector import collect_user_traffic
+
+
+class FakeStatsService(command_pb2_grpc.StatsServiceServicer):
+    """Minimal StatsService holding a flat name -> value counter map."""
+
+    def __init__(self, uuids):
+        self.counters = {}
+        self.reload(uuids)
+
+    def reload(self, uuids):
+        for uuid in uuids:
+            self.counters[f"user>>>{uuid}>>>traffic>>>uplink"] = 1024
+            self.counters[f"user>>>{uuid}>>>traffic>>>downlink"] = 4096
+
+    def QueryStats(self, request, context):
+        # Exact-name fast path so the legacy mode isn't penalised by the fake
+        if request.pattern in self.counters:
+            names = [request.pattern]
+        else:
+            names = [n for n in self.counters if request.pattern in n]
+
+        response = command_pb2.QueryStatsResponse()
+        for name in names:
+            response.stat.add(name=name, value=self.counters[name])
+            if request.reset:
+                self.counters[name] = 0
+        return response
+
+
+def legacy_cycle(stub, uuids):
+    traffic = {}
+    for uuid in uuids:
+        total = 0
+        for direction in ("downlink", "uplink"):
+            request = command_pb2.QueryStatsRequest(
+                pattern=f"user>>>{uuid}>>>traffic>>>{direction}", reset=True
+            )
+            response = stub.QueryStats(request, timeout=5)
+            for stat in response.stat:
+                if direction in stat.name:
+                    total += stat.value
+        traffic[uuid] = total
+    return traffic
+
+
+def run(user_counts, skip_legacy):
+    max_message = 256 * 1024 * 1024
+    options = [
+        ('grpc.max_send_message_length', max_message),
+        ('grpc.max_receive_message_length', max_message),
+    ]
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), options=options)
+    service = FakeStatsService([])
+    command_pb2_grpc.add_StatsServiceServicer_to_server(service, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+
+    channel = grpc.insecure_channel(f'127.0.0.1:{port}', options=options)
+    stub = command_pb2_grpc.StatsServiceStub(channel)
+
+    print(f"{'users':>8} {'legacy (s)':>12} {'bulk (s)':>10} {'speedup':>9}")
+    try:
+        for count in user_counts:
+            uuids = [str(uuid_lib.uuid4()) for _ in range(count)]
+            service.counters.clear()
+
+            legacy = None
+            if not skip_legacy:
+                service.reload(uuids)
+                start = time.perf_counter()
+                legacy_cycle(stub, uuids)
+                legacy = time.perf_counter() - start
+
+            service.reload(uuids)
+            start = time.perf_counter()
+            traffic = collect_user_traffic(stub, timeout=60)
+            bulk = time.perf_counter() - start
+            assert len(traffic) == count, f"expected {count} users, got {len(traffic)}"
+
+            legacy_str = f"{legacy:12.3f}" if legacy is not None else f"{'skipped':>12}"
+            speedup = f"{legacy / bulk:8.1f}x" if legacy is not None else f"{'-':>9}"
+            print(f"{count:>8} {legacy_str} {bulk:10.3f} {speedup}")
+    finally:
+        channel.close()
+        server.stop(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--skip-legacy', action='store_true', help="Only time the bulk collector")
+    args = parser.parse_args()
+    run(args.users, args.skip_legacy)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: get_user_stats for one Telegram user with many keys.
+
+Compares the old N+1 implementation (one users query, then get_daily_usage
+per key) with the single LEFT JOIN in database.USER_STATS_QUERY.
+
+Usage:
+    python3 scripts/bench/bench_user_stats.py --keys 200 --repeat 200
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid as uuid_lib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+
+from db import database
+from db.pool import close_all_pools
+
+TELEGRAM_ID = 424242
+
+
+def legacy_get_user_stats(telegram_id):
+    """The pre-join implementation: one extra get_daily_usage per key."""
+    conn = database.get_db_connection()
+    users = conn.execute('SELECT * FROM users WHERE telegram_id = ? ORDER BY rowid', (telegram_id,)).fetchall()
+    stats = []
+    for user in users:
+        stats.append({
+            'uuid': user['uuid'],
+            'protocol': user['protocol'] or 'ss',
+            'is_active': user['is_active'],
+            'data_limit_gb': user['data_limit_gb'],
+            'daily_usage_bytes': database.get_daily_usage(user['uuid']),
+            'expiry_date': user['expiry_date']
+        })
+    conn.close()
+    return stats
+
+
+def seed(key_count, other_users):
+    database.init_db()
+    today = datetime.date.today()
+    conn = database.get_db_connection()
+    with conn:
+        for telegram_id, count in ((TELEGRAM_ID, key_count), (None, other_users)):
+            rows = [(str(uuid_lib.uuid4()), telegram_id or random.randint(1, 10**9)) for _ in range(count)]
+            conn.executemany("INSERT INTO users (uuid, telegram_id, username, protocol) VALUES (?, ?, 'bench', 'vless')", rows)
+            conn.executemany(
+                "INSERT INTO usage_logs (uuid, date, bytes_used) VALUES (?, ?, ?)",
+                [(u, today, random.randint(0, 1 << 30)) for u, _ in rows]
+            )
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(TELEGRAM_ID)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run(key_count, other_users, repeat):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.DB_PATH = os.path.join(tmpdir, 'bench.db')
+        seed(key_count, other_users)
+
+        legacy_time, legacy_result = timed(legacy_get_user_stats, repeat)
+        joined_time, joined_result = timed(database.get_user_stats, repeat)
+        assert legacy_result == joined_result, "single-query stats differ from the N+1 result"
+        close_all_pools()
+
+    print(f"user with {key_count} keys ({other_users} other users), {repeat} calls each")
+    print(f"  N+1 queries : {legacy_time * 1000:8.2f} ms/call ({key_count + 1} queries)")
+    print(f"  LEFT JOIN   : {joined_time * 1000:8.2f} ms/call (1 query)")
+    print(f"  speedup     : {legacy_time / joined_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=200)
+    parser.add_argument('--other-users', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    run(args.keys, args.other_users, args.repeat)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Load test: /api/status latency while payment verifications run concurrently.
+
+Drives the FastAPI app in-process (httpx ASGI transport, temp database). OCR
+is replaced with a fixed sleep so a "payment" costs --ocr-seconds of blocking
+work, like a real Tesseract run. Payments go through the OCR job queue
+(POST /api/payment/verify, then polling the job), whose workers are forked
+so they inherit the stub. Each scenario is measured twice:
+
+    offloaded : handlers as shipped (run_db / run_blocking executors)
+    inline    : handler bodies run directly on the event loop
+
+Usage:
+    python3 scripts/bench/load_test_status.py --requests 200 --rate 200 --payments 8 --ocr-seconds 1.5 --ocr-workers 4
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid as uuid_lib
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, PROJECT_ROOT)
+
+import httpx
+
+from src.api import server
+from src.db import database
+from src.db.pool import close_all_pools
+from src.services.ocr_jobs import OCRJobQueue
+from src.services.ocr_service import ocr_service
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def seed(user_count):
+    database.init_db()
+    today = datetime.date.today()
+    uuids = [str(uuid_lib.uuid4()) for _ in range(user_count)]
+    conn = database.get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (uuid, telegram_id, username, protocol, expiry_date) VALUES (?, 1, 'bench', 'account', ?)",
+            [(u, (datetime.datetime.now() + datetime.timedelta(days=30)).isoformat()) for u in uuids]
+        )
+        conn.executemany(
+            "INSERT INTO vpn_keys (user_uuid, key_name, protocol, key_uuid, config_link, expires_at) VALUES (?, 'k', 'vless', ?, '', NULL)",
+            [(u, u) for u in uuids]
+        )
+        conn.executemany("INSERT INTO usage_logs (uuid, date, bytes_used) VALUES (?, ?, 1024)", [(u, today) for u in uuids])
+    return uuids
+
+
+async def poll_status(client, uuids, count, rate, until=()):
+    """
+    Open-loop status polling: request i is scheduled at start + i / rate and
+    its latency is measured from that scheduled time, so time spent waiting
+    on a blocked event loop counts against the request. Keeps going past
+    count while any of the until tasks is still running.
+    """
+    latencies = []
+    requests = []
+
+    async def one(user_uuid, scheduled):
+        response = await client.get(f"/api/status/{user_uuid}")
+        latencies.append(time.perf_counter() - scheduled)
+        assert response.status_code == 200, response.text
+
+    start = time.perf_counter()
+    i = 0
+    while i < count or not all(t.done() for t in until):
+        scheduled = start + i / rate
+        await asyncio.sleep(max(0, scheduled - time.perf_counter()))
+        requests.append(asyncio.create_task(one(uuids[i % len(uuids)], scheduled)))
+        i += 1
+    await asyncio.gather(*requests)
+    return latencies
+
+
+async def verify_payment(client, user_uuid):
+    """Submit a slip and wait for its job to finish; returns the time taken."""
+    start = time.perf_counter()
+    files = {'file': ('slip.jpg', b'\xff\xd8 not really a jpeg', 'image/jpeg')}
+    data = {'uuid': user_uuid, 'protocol': 'vless'}
+    response = await client.post("/api/payment/verify", files=files, data=data)
+    assert response.status_code == 202, response.text
+    status_url = response.json()['status_url']
+    # The stubbed OCR returns no text, so every job ends up failed after the sleep
+    while (await client.get(status_url)).json()['status'] not in ('succeeded', 'failed'):
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - start
+
+
+async def scenario(uuids, requests, rate, payments):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up (executor threads, pooled connections) before measuring
+        await poll_status(client, uuids, 20, rate)
+        payment_tasks = [asyncio.create_task(verify_payment(client, uuids[0])) for _ in range(payments)]
+        latencies = await poll_status(client, uuids, requests, rate, until=payment_tasks)
+        payment_times = await asyncio.gather(*payment_tasks)
+    return latencies, payment_times
+
+
+def report(label, latencies, payment_times):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"  {label:<28} p50 {p50:9.2f} ms   p99 {p99:9.2f} ms   max {latencies[-1] * 1000:9.2f} ms")
+    if payment_times:
+        print(f"  {'':<28} {len(payment_times)} payments done in {max(payment_times):.2f} s")
+
+
+def run(args):
+    ocr_service.extract_text = lambda path: time.sleep(args.ocr_seconds) or []
+    run_db, run_blocking = server.run_db, server.run_blocking
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.DB_PATH = server.DB_PATH = os.path.join(tmpdir, 'load.db')
+        uuids = seed(args.users)
+        server.payment_jobs = OCRJobQueue(server._provision_payment, workers=args.ocr_workers, start_method='fork')
+        server.payment_jobs.start()
+
+        print(f"{args.requests}+ status requests at {args.rate}/s, "
+              f"{args.payments} payments x {args.ocr_seconds}s OCR")
+        for mode in ('offloaded', 'inline'):
+            if mode == 'inline':
+                server.run_db = server.run_blocking = _inline
+            for payments in (0, args.payments):
+                latencies, payment_times = asyncio.run(scenario(uuids, args.requests, args.rate, payments))
+                report(f"{mode}, {payments} payments", latencies, payment_times)
+        server.run_db, server.run_blocking = run_db, run_blocking
+        server.payment_jobs.shutdown()
+        close_all_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=200, help="Status requests per second")
+    parser.add_argument('--payments', type=int, default=4)
+    parser.add_argument('--ocr-seconds', type=float, default=1.0)
+    parser.add_argument('--ocr-workers', type=int, default=4)
+    args = parser.parse_args()
+    run(args)
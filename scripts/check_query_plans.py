@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN QUERY PLAN check for the SQL in src/db/database.py and src/api/server.py.
+
+Every SQL string literal with a WHERE clause is planned against the database.
+The check fails (exit code 1) if any of them falls back to a full SCAN of a
+table holding more than --min-rows rows. Queries without a WHERE clause are
+intentional full reads (e.g. get_all_users) and are skipped.
+
+Usage:
+    python3 scripts/check_query_plans.py                      # schema-only, every scan fails
+    python3 scripts/check_query_plans.py --db src/db/vpn_bot.db --min-rows 1000
+"""
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+
+SOURCE_FILES = [
+    os.path.join('src', 'db', 'database.py'),
+    os.path.join('src', 'api', 'server.py'),
+]
+
+SQL_START = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+TABLE_ALIAS = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|SET|ON|LEFT|JOIN|INNER|ORDER|GROUP|LIMIT)(\w+))?',
+    re.IGNORECASE
+)
+SCAN = re.compile(r'^SCAN (\w+)')
+
+
+def find_queries(path):
+    """Yield (line, sql) for every SQL string literal with a WHERE clause."""
+    with open(os.path.join(PROJECT_ROOT, path)) as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            sql = node.value
+            if SQL_START.match(sql) and re.search(r'\bWHERE\b', sql, re.IGNORECASE):
+                yield node.lineno, ' '.join(sql.split())
+
+
+def table_row_counts(conn):
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+
+
+def scanned_tables(conn, sql):
+    """Return the real table names the plan for sql scans in full."""
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+
+    params = (None,) * sql.count('?')
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    scans = []
+    for row in plan:
+        match = SCAN.match(row[-1])
+        if match:
+            scans.append(aliases.get(match.group(1), match.group(1)))
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="Database to plan against (default: fresh schema, every scan fails)")
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help="Only fail scans of tables with more rows than this (default: 1000)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.db:
+            conn = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+            row_counts = table_row_counts(conn)
+        else:
+            database.DB_PATH = os.path.join(tmpdir, 'schema.db')
+            database.init_db()
+            close_all_pools()
+            conn = sqlite3.connect(database.DB_PATH)
+            # No data to go by: treat every table as large
+            row_counts = {t: float('inf') for t in table_row_counts(conn)}
+
+        failures = 0
+        checked = 0
+        for path in SOURCE_FILES:
+            for line, sql in find_queries(path):
+                checked += 1
+                try:
+                    scans = scanned_tables(conn, sql)
+                except sqlite3.Error as e:
+                    print(f"ERROR {path}:{line}: {e}\n    {sql}")
+                    failures += 1
+                    continue
+
+                large = [t for t in scans if row_counts.get(t, 0) > args.min_rows]
+                if large:
+                    failures += 1
+                    print(f"SCAN  {path}:{line}: full scan of {', '.join(sorted(set(large)))}\n    {sql}")
+        conn.close()
+
+    print(f"\nChecked {checked} queries, {failures} failing")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
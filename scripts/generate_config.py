@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Regenerate sing-box config.json from the template and the database (src/bot/config_stream.py).
+
+The user arrays are streamed from the database, so memory use does not grow
+with the user count.
+
+Usage:
+    python3 scripts/generate_config.py --init-template     # extract CONFIG_TEMPLATE_PATH from config.json
+    python3 scripts/generate_config.py                     # regenerate config.json and reload sing-box
+    python3 scripts/generate_config.py --output /tmp/config.json --no-reload
+"""
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from bot import config_stream
+from bot.config_manager import load_config, reload_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--init-template', action='store_true',
+                        help="Write the template extracted from the live config, then exit")
+    parser.add_argument('--template', help=f"Template path (default: {config_stream.CONFIG_TEMPLATE_PATH})")
+    parser.add_argument('--output', help="Output path (default: SINGBOX_CONFIG_PATH)")
+    parser.add_argument('--no-reload', action='store_true', help="Do not reload sing-box")
+    args = parser.parse_args()
+
+    if args.init_template:
+        digest = config_stream.save_template(load_config(), args.template)
+        print(f"Template written to {args.template or config_stream.CONFIG_TEMPLATE_PATH} ({digest[:12]})")
+        return 0
+
+    template = config_stream.load_template(args.template)
+    digest = config_stream.generate_config(args.output, template)
+    if isinstance(digest, dict):
+        # Fragment layout
+        for name, fragment_digest in digest.items():
+            print(f"Fragment {name} written ({fragment_digest[:12]})")
+    else:
+        print(f"Config written to {args.output or 'SINGBOX_CONFIG_PATH'} ({digest[:12]})")
+    if not args.no_reload and not args.output:
+        reload_service()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,11 @@
-import sqlite3
+import sys
+import os
 
-conn = sqlite3.connect('src/db/vpn_bot.db')
-cursor = conn.cursor()
-try:
-    cursor.execute("ALTER TABLE users ADD COLUMN phone TEXT")
-    conn.commit()
-    print("Column 'phone' added successfully.")
-except Exception as e:
-    print(f"Error: {e}")
-finally:
-    conn.close()
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+
+from db.migrations import main
+
+# Usage: python3 scripts/migrate_db.py [status|upgrade] [--db PATH]
+if __name__ == "__main__":
+    sys.exit(main())
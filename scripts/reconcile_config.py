@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Reconcile sing-box config.json with the database (src/bot/reconcile.py).
+
+Adds every active key that is missing from its inbound and removes users the
+database no longer wants. It writes and reloads once, and only if something
+changed.
+
+Usage:
+    python3 scripts/reconcile_config.py --dry-run -v   # print the plan only
+    python3 scripts/reconcile_config.py                # apply it
+    python3 scripts/reconcile_config.py --keep-extra   # add missing keys, remove nothing
+"""
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from bot.reconcile import reconcile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help="Print the plan without writing")
+    parser.add_argument('--keep-extra', action='store_true', help="Do not remove users the database does not want")
+    parser.add_argument('-v', '--verbose', action='store_true', help="List every key in the plan")
+    args = parser.parse_args()
+
+    plan = reconcile(dry_run=args.dry_run, keep_extra=args.keep_extra)
+    print(plan.describe(verbose=args.verbose))
+    if plan.applied:
+        print("Config written and sing-box reloaded.")
+    elif args.dry_run and not plan.empty:
+        print("Dry run, nothing written.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,6 +28,22 @@ fi
 # 3. Generate Config
 echo "[3/5] Generating Configuration..."
 sudo mkdir -p $CONFIG_DIR
+# CONFIG_LAYOUT=fragments: sing-box merges conf.d/*.json (src/bot/config_fragments.py)
+if [ "$CONFIG_LAYOUT" = "fragments" ]; then
+    sudo mkdir -p $CONFIG_DIR/conf.d
+    SINGBOX_CONFIG_ARGS="-C $CONFIG_DIR/conf.d"
+else
+    SINGBOX_CONFIG_ARGS="-c $CONFIG_DIR/config.json"
+fi
+# Let the bot/API user replace configs atomically without sudo (CONFIG_WRITE_MODE=direct)
+if [ -n "$CONFIG_GROUP" ]; then
+    sudo chgrp "$CONFIG_GROUP" $CONFIG_DIR
+    sudo chmod 2775 $CONFIG_DIR
+    if [ -d $CONFIG_DIR/conf.d ]; then
+        sudo chgrp "$CONFIG_GROUP" $CONFIG_DIR/conf.d
+        sudo chmod 2775 $CONFIG_DIR/conf.d
+    fi
+fi
 sudo mkdir -p $LOG_DIR
 # Try nobody:nogroup, fall back to nobody:nobody, then root
 if getent group nogroup >/dev/null; then
@@ -106,7 +122,7 @@ After=network.target nss-lookup.target
 [Service]
 CapabilityBoundingSet=CAP_NET_ADMIN CAP_NET_BIND_SERVICE
 AmbientCapabilities=CAP_NET_ADMIN CAP_NET_BIND_SERVICE
-ExecStart=$INSTALL_DIR/sing-box run -c $CONFIG_DIR/config.json
+ExecStart=$INSTALL_DIR/sing-box run $SINGBOX_CONFIG_ARGS
 Restart=on-failure
 RestartSec=10s
 LimitNOFILE=infinity
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Privileged config writer for CONFIG_WRITE_MODE=helper (src/bot/config_writer.py).
+
+Reads the new file from stdin, replaces the target atomically (temp file in
+the same directory, fsync, rename, directory fsync), keeps the old file's
+permissions and ownership, and prints the SHA-256 of what it wrote.
+
+Install it root-owned, outside the bot's checkout (the bot user must not be
+able to edit it), and allow only it in sudoers; no setuid bit is needed:
+
+    sudo install -o root -g root -m 0755 scripts/singbox_config_write.py /usr/local/bin/singbox-config-write
+    echo 'ubuntu ALL=(root) NOPASSWD: /usr/local/bin/singbox-config-write' | sudo tee /etc/sudoers.d/singbox-config-write
+
+Only files directly inside ALLOWED_DIRS can be written. It is self-contained
+on purpose: importing code from the bot's directory would let the bot user
+run code as root.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+
+ALLOWED_DIRS = ('/etc/sing-box', '/etc/sing-box/conf.d', '/etc/tuic')
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("usage: singbox-config-write <path>  (new contents on stdin)")
+    path = os.path.realpath(sys.argv[1])
+    directory = os.path.dirname(path)
+    if directory not in ALLOWED_DIRS:
+        sys.exit(f"refusing to write outside {', '.join(ALLOWED_DIRS)}: {path}")
+
+    data = sys.stdin.buffer.read()
+    try:
+        st = os.stat(path)
+        mode, uid, gid = st.st_mode & 0o7777, st.st_uid, st.st_gid
+    except FileNotFoundError:
+        mode, uid, gid = 0o644, 0, 0
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fchown(f.fileno(), uid, gid)
+            os.fchmod(f.fileno(), mode)
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    print(hashlib.sha256(data).hexdigest())
+
+
+if __name__ == '__main__':
+    main()
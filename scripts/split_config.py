@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Convert the single sing-box config.json to the fragment layout (src/bot/config_fragments.py).
+
+Writes 00-base.json, one 10-<tag>.json per managed inbound and
+90-experimental.json to the fragment directory. It then checks that merging
+them gives back the original config, with inbounds compared by tag because
+the merge changes their order. Afterwards:
+
+    sing-box check -C /etc/sing-box/conf.d
+    # sing-box.service: ExecStart=/usr/local/bin/sing-box run -C /etc/sing-box/conf.d
+    # bot / API / watchdog environment: CONFIG_LAYOUT=fragments
+
+Usage:
+    python3 scripts/split_config.py [--config /etc/sing-box/config.json] [--dir /etc/sing-box/conf.d]
+"""
+import argparse
+import json
+import os
+import sys
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from bot import config_fragments
+from bot.config import SINGBOX_CONFIG_PATH
+
+
+def by_tag(config):
+    return {inbound.get('tag'): inbound for inbound in config.get('inbounds', [])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default=SINGBOX_CONFIG_PATH, help="Single config to split")
+    parser.add_argument('--dir', default=config_fragments.CONFIG_FRAGMENT_DIR, help="Fragment directory")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    os.makedirs(args.dir, exist_ok=True)
+    digests = config_fragments.write_fragments(config_fragments.split(config), args.dir)
+    for name, digest in digests.items():
+        size = os.path.getsize(os.path.join(args.dir, name))
+        print(f"{name:<28} {size:>10} bytes  {digest[:12]}")
+
+    merged = config_fragments.load_fragments(args.dir)
+    if by_tag(merged) != by_tag(config) or \
+            {k: v for k, v in merged.items() if k != 'inbounds'} != {k: v for k, v in config.items() if k != 'inbounds'}:
+        print(f"Merged fragments differ from {args.config}; check {args.dir} for stale *.json files")
+        return 1
+    print(f"OK: {args.dir} merges back to {args.config}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,21 @@
-import sqlite3
 from fastapi import FastAPI, HTTPException, Body, UploadFile, File, Form
 from pydantic import BaseModel
-import shutil
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import functools
+import logging
 import os
 import uvicorn
 import uuid
 from google.oauth2 import id_token
 from google.auth.transport import requests
-from src.db.database import get_user_by_email, get_user_by_phone, add_user, get_user, get_daily_usage, is_in_grace_period, get_grace_period_remaining
+from src.db.database import init_db, get_user_by_email, get_user_by_phone, add_user, get_user, get_daily_usage, get_account_usage, is_in_grace_period, get_grace_period_remaining, get_payment_job
+from src.db.pool import get_connection
+from src.db.aio import run_db
+from src.services.ocr_jobs import OCRJobQueue
+from src.services.payment_validator import TEST_SLIP_ID
 
 # Database setup
 DB_PATH = os.getenv("DB_PATH", "src/db/vpn_bot.db")
@@ -16,8 +23,33 @@ API_PORT = int(os.getenv("API_PORT", "8000"))
 # CLIENT_ID should be loaded from env or config, but for now we can accept any valid token for this app
 # In production, you MUST verify the aud claim matches your client ID.
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID") 
-
-app = FastAPI(title="MMVPN API")
+# Workers for slow non-DB calls (Google token verification, sing-box config writes)
+API_BLOCKING_WORKERS = int(os.getenv("API_BLOCKING_WORKERS", "4"))
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=os.getenv("LOG_LEVEL", "INFO").upper()
+)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_db(init_db)
+    # Fails jobs a previous run left unfinished, then starts the OCR workers
+    await run_db(payment_jobs.start)
+    yield
+    payment_jobs.shutdown(wait=False)
+
+app = FastAPI(title="MMVPN API", lifespan=lifespan)
+
+# Kept separate from the database executor so a burst of logins that
+# provision keys (seconds each) can never starve the status/key queries.
+_blocking_executor = ThreadPoolExecutor(max_workers=API_BLOCKING_WORKERS, thread_name_prefix="api-blocking")
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a slow blocking call (sudo/systemctl, outbound HTTP) off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(func, *args, **kwargs))
 
 class UserStatus(BaseModel):
     uuid: str
@@ -63,14 +95,16 @@ class VpnKeyResponse(BaseModel):
     expires_at: str
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled, persistent per-thread connection; close() just releases it
+    return get_connection(DB_PATH)
 
 # VPN Keys API endpoints
 @app.post("/api/keys")
 async def save_vpn_key(key: VpnKey):
     """Save a VPN key for a specific user"""
+    return await run_db(_save_vpn_key, key)
+
+def _save_vpn_key(key):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -91,6 +125,9 @@ async def save_vpn_key(key: VpnKey):
 @app.get("/api/keys/{user_uuid}")
 async def get_user_keys(user_uuid: str):
     """Get all VPN keys for a specific user"""
+    return await run_db(_get_user_keys, user_uuid)
+
+def _get_user_keys(user_uuid):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -120,6 +157,9 @@ async def get_user_keys(user_uuid: str):
 @app.delete("/api/keys/{key_id}")
 async def delete_vpn_key(key_id: int, user_uuid: str):
     """Delete a VPN key (soft delete by setting is_active=0)"""
+    return await run_db(_delete_vpn_key, key_id, user_uuid)
+
+def _delete_vpn_key(key_id, user_uuid):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -137,6 +177,10 @@ async def delete_vpn_key(key_id: int, user_uuid: str):
 
 @app.post("/api/auth/google")
 async def google_login(request: GoogleLoginRequest):
+    # Token verification fetches Google's certs; auto-provisioning writes the sing-box config
+    return await run_blocking(_google_login, request)
+
+def _google_login(request):
     try:
         # Verify the token
         id_info = id_token.verify_oauth2_token(
@@ -291,7 +335,7 @@ async def google_login(request: GoogleLoginRequest):
                 import uuid as uuid_lib
                 from src.db.database import get_user_stats
                 from src.bot.config import SERVER_IP, PUBLIC_KEY, SHORT_ID, SERVER_NAME, LIMITED_PORT
-                from src.bot.config_manager import add_user_to_config
+                from src.bot.config_queue import add_user_to_config
                 
                 new_key_uuid = str(uuid_lib.uuid4())
                 key_uuid_to_return = new_key_uuid
@@ -306,7 +350,7 @@ async def google_login(request: GoogleLoginRequest):
                 if add_user(new_key_uuid, 0, email.split('@')[0], 'vless_limited', 'en', False, speed_limit_mbps=12.0, data_limit_gb=3.0):
                     
                     # Add to Sing-Box Config
-                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=12.0)
+                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=12.0).result()
                     
                     # Generate Link
                     vpn_key_link = f"vless://{new_key_uuid}@{SERVER_IP}:{LIMITED_PORT}?security=reality&encryption=none&pbk={PUBLIC_KEY}&fp=randomized&type=tcp&flow=xtls-rprx-vision&sni={SERVER_NAME}&sid={SHORT_ID}#{key_tag}"
@@ -349,6 +393,10 @@ async def google_login(request: GoogleLoginRequest):
 
 @app.post("/api/auth/phone")
 async def phone_login(request: PhoneLoginRequest):
+    # Auto-provisioning writes the sing-box config (sudo cp + reload)
+    return await run_blocking(_phone_login, request)
+
+def _phone_login(request):
     try:
         phone = request.phone
         if not phone:
@@ -475,7 +523,7 @@ async def phone_login(request: PhoneLoginRequest):
             try:
                 import uuid as uuid_lib
                 from src.bot.config import SERVER_IP, PUBLIC_KEY, SHORT_ID, SERVER_NAME, LIMITED_PORT
-                from src.bot.config_manager import add_user_to_config
+                from src.bot.config_queue import add_user_to_config
                 
                 new_key_uuid = str(uuid_lib.uuid4())
                 key_uuid_to_return = new_key_uuid
@@ -487,7 +535,7 @@ async def phone_login(request: PhoneLoginRequest):
                 if add_user(new_key_uuid, 0, phone, 'vless_limited', 'en', False, speed_limit_mbps=12.0, data_limit_gb=3.0, phone=phone):
                     
                     # Add to Sing-Box Config
-                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=12.0)
+                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=12.0).result()
                     
                     # Generate Link
                     vpn_key_link = f"vless://{new_key_uuid}@{SERVER_IP}:{LIMITED_PORT}?security=reality&encryption=none&pbk={PUBLIC_KEY}&fp=randomized&type=tcp&flow=xtls-rprx-vision&sni={SERVER_NAME}&sid={SHORT_ID}#{key_tag}"
@@ -525,59 +573,39 @@ async def phone_login(request: PhoneLoginRequest):
 
 @app.get("/api/status/{user_uuid}")
 async def get_user_status(user_uuid: str):
-    print(f"\n========== STATUS API DEBUG ==========")
-    print(f"[1] Incoming UUID: {user_uuid}")
+    return await run_db(_get_user_status, user_uuid)
+
+def _get_user_status(user_uuid):
+    logger.debug(f"Status request for UUID: {user_uuid}")
     
     user = get_user(user_uuid)
     if not user:
-        print(f"[ERROR] User NOT FOUND in database")
+        logger.debug(f"User {user_uuid} not found in database")
         raise HTTPException(status_code=404, detail="User not found")
     
-    print(f"[2] User found: protocol={user['protocol']}, is_active={user['is_active']}")
+    logger.debug(f"User found: protocol={user['protocol']}, is_active={user['is_active']}")
     
-    # Calculate usage
-    # Calculate usage and aggregate limits/expiry from keys
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM vpn_keys WHERE user_uuid = ? AND is_active = 1", (user_uuid,))
-    linked_keys = cursor.fetchall()
-    conn.close()
-    
-    print(f"[3] Linked keys found: {len(linked_keys)}")
+    # Aggregate usage, limits and expiry across the account's active keys in one query
+    summary = get_account_usage(user_uuid)
+    linked_keys = summary['key_count']
     
-    daily_usage = 0
-    data_limit_gb = 0.0
-    max_expiry = None
+    logger.debug(f"Linked keys found: {linked_keys}")
     
     if linked_keys:
-        print(f"[4] Processing {len(linked_keys)} linked key(s)...")
-        for k in linked_keys:
-            daily_usage += get_daily_usage(k['key_uuid'])
-            
-            # Fetch key's data limit from users table (since keys are stored as users too)
-            # Or we can store it in vpn_keys? vpn_keys doesn't have data_limit.
-            # We need to fetch the "user" row corresponding to the key_uuid
-            key_user_row = get_user(k['key_uuid'])
-            if key_user_row:
-                data_limit_gb += key_user_row['data_limit_gb'] or 0.0
-            
-            # Calculate max expiry
-            key_expiry_str = k['expires_at']
-            if key_expiry_str:
-                try:
-                    from datetime import datetime
-                    key_expiry = datetime.fromisoformat(key_expiry_str)
-                    if max_expiry is None or key_expiry > max_expiry:
-                        max_expiry = key_expiry
-                except:
-                    pass
+        daily_usage = summary['daily_usage_bytes']
         
-        # If we found keys, use the aggregated values
         # If data_limit is still 0 (shouldn't be), fallback to user's
+        data_limit_gb = summary['data_limit_gb']
         if data_limit_gb == 0:
              data_limit_gb = user['data_limit_gb'] or 5.0
-             
+        
         # Format max_expiry
+        max_expiry = None
+        if summary['max_expires_at']:
+            try:
+                max_expiry = datetime.fromisoformat(summary['max_expires_at'])
+            except ValueError:
+                pass
         if max_expiry:
             expiry_date_str = max_expiry.isoformat()
         else:
@@ -602,18 +630,10 @@ async def get_user_status(user_uuid: str):
     if '.' in expiry_date_str:
         expiry_date_str = expiry_date_str.split('.')[0]
 
-    # Determine protocol to display
-    display_protocol = user['protocol']
-    if linked_keys:
-        # Use the protocol of the most recently created key (or just the first one found)
-        # Since we fetched all, let's pick the last one (assuming order or just picking one)
-        # Ideally we should sort by created_at, but for now picking the last one in the list is a safe bet for "latest"
-        display_protocol = linked_keys[-1]['protocol']
-        print(f"[5] Using protocol from linked key: {display_protocol}")
-    else:
-        print(f"[5] Using user's default protocol: {display_protocol}")
+    # Determine protocol to display: the most recently created linked key's
+    display_protocol = summary['latest_protocol'] if linked_keys else user['protocol']
     
-    print(f"[6] Aggregated stats: usage={daily_usage}, limit={data_limit_gb}GB, expiry={expiry_date_str}")
+    logger.debug(f"Aggregated stats: usage={daily_usage}, limit={data_limit_gb}GB, expiry={expiry_date_str}, protocol={display_protocol}")
     
     response_data = {
         "uuid": user['uuid'],
@@ -627,39 +647,49 @@ async def get_user_status(user_uuid: str):
         "graceRemainingHours": grace_remaining or 0
     }
     
-    print(f"[7] Returning response: {response_data}")
-    print(f"========================================\n")
     return response_data
 
-@app.post("/api/payment/verify")
+PAYMENT_PROTOCOLS = ('vless', 'vless_limited', 'ss', 'tuic', 'vlessplain', 'ss_legacy')
+
+@app.post("/api/payment/verify", status_code=202)
 async def verify_payment(
     file: UploadFile = File(...),
     uuid: str = Form(...),
     protocol: str = Form(...)
 ):
-    # 1. Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+    """Queue a payment slip for verification; poll /api/payment/jobs/{job_id} for the outcome."""
+    if protocol not in PAYMENT_PROTOCOLS:
+        raise HTTPException(status_code=400, detail="Invalid protocol")
+    if not await run_db(get_user, uuid):
+        raise HTTPException(status_code=404, detail="User not found")
 
+    image_bytes = await file.read()
+    # OCR runs in the job queue's worker processes; this only records the job
+    job_id = await run_db(payment_jobs.submit, uuid, protocol, image_bytes)
+    return {"job_id": job_id, "status": "queued", "status_url": f"/api/payment/jobs/{job_id}"}
+
+@app.get("/api/payment/jobs/{job_id}")
+async def get_payment_job_status(job_id: str):
+    job = await run_db(get_payment_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    response = {"job_id": job['id'], "status": job['status']}
+    if job['status'] == 'succeeded':
+        response.update(job['result'])
+    elif job['status'] == 'failed':
+        response.update({"success": False, "error": job['error'], "error_code": job['error_code']})
+    return response
+
+def _provision_payment(uuid, protocol, data):
+    """Record a validated payment and create the key (runs on one of the job queue's provisioning threads)."""
     try:
-        # 2. OCR & Validation
-        from src.services.ocr_service import ocr_service
-        from src.services.payment_validator import payment_validator, InvalidReceiptError
         from src.db.database import is_transaction_used, add_transaction, get_user, add_user, get_user_stats
-        
-        # Extract text
-        text_lines = ocr_service.extract_text(tmp_path)
-        if not text_lines:
-            raise HTTPException(status_code=400, detail="Could not read text from image")
 
-        # Validate receipt
-        data = payment_validator.validate_receipt(text_lines)
-        
         # Check for duplicates
         if is_transaction_used(data['transaction_id']):
              # Check if it's the test slip
-            if data['transaction_id'] != "01003984021770423212":
+            if data['transaction_id'] != TEST_SLIP_ID:
                 raise HTTPException(status_code=400, detail=f"Transaction {data['transaction_id']} already used")
 
         # Check amount
@@ -672,7 +702,10 @@ async def verify_payment(
         if not user_data:
              raise HTTPException(status_code=404, detail="User not found")
              
-        add_transaction(user_data['telegram_id'], data['provider'], data['transaction_id'], data['amount'])
+        # The UNIQUE transaction_id settles payments of the same slip provisioned concurrently
+        if not add_transaction(user_data['telegram_id'], data['provider'], data['transaction_id'], data['amount']):
+            if data['transaction_id'] != TEST_SLIP_ID:
+                raise HTTPException(status_code=400, detail=f"Transaction {data['transaction_id']} already used")
 
         # 4. Generate Key
         import uuid as uuid_lib
@@ -707,32 +740,32 @@ async def verify_payment(
             
             try:
                 if protocol == 'vless':
-                    from src.bot.config_manager import add_user_to_config
-                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=0)
+                    from src.bot.config_queue import add_user_to_config
+                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=0).result()
                     vpn_link = f"vless://{new_key_uuid}@{SERVER_IP}:{SERVER_PORT}?security=reality&encryption=none&pbk={PUBLIC_KEY}&fp=randomized&type=tcp&flow=xtls-rprx-vision&sni={SERVER_NAME}&sid={SHORT_ID}#{key_tag}"
                 
                 elif protocol == 'vless_limited':
-                    from src.bot.config_manager import add_user_to_config
-                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=12.0)
+                    from src.bot.config_queue import add_user_to_config
+                    add_user_to_config(new_key_uuid, key_tag, limit_mbps=12.0).result()
                     # Use LIMITED_PORT (10001) for the link
                     vpn_link = f"vless://{new_key_uuid}@{SERVER_IP}:{LIMITED_PORT}?security=reality&encryption=none&pbk={PUBLIC_KEY}&fp=randomized&type=tcp&flow=xtls-rprx-vision&sni={SERVER_NAME}&sid={SHORT_ID}#{key_tag}"
                     
                 elif protocol == 'ss':
-                    from src.bot.config_manager import add_ss_user
-                    add_ss_user(new_key_uuid, key_tag)
+                    from src.bot.config_queue import add_ss_user
+                    add_ss_user(new_key_uuid, key_tag).result()
                     import base64
                     ss_credential = f"{SS_METHOD}:{new_key_uuid}"
                     ss_encoded = base64.b64encode(ss_credential.encode()).decode()
                     vpn_link = f"ss://{ss_encoded}@{SS_SERVER}:{SS_PORT}#{key_tag}"
                     
                 elif protocol == 'tuic':
-                    from src.bot.config_manager import add_tuic_user
-                    add_tuic_user(new_key_uuid, key_tag)
+                    from src.bot.config_queue import add_tuic_user
+                    add_tuic_user(new_key_uuid, key_tag).result()
                     vpn_link = f"tuic://{new_key_uuid}:{new_key_uuid}@{SERVER_IP}:{TUIC_PORT}?congestion_control=bbr&alpn=h3&sni=www.microsoft.com&allow_insecure=1#{key_tag}"
 
                 elif protocol == 'vlessplain':
-                    from src.bot.config_manager import add_vless_plain_user
-                    add_vless_plain_user(new_key_uuid, key_tag)
+                    from src.bot.config_queue import add_vless_plain_user
+                    add_vless_plain_user(new_key_uuid, key_tag).result()
                     vpn_link = f"vless://{new_key_uuid}@{SERVER_IP}:{VLESS_PLAIN_PORT}?security=tls&encryption=none&type=tcp&sni=www.microsoft.com&allowInsecure=1#{key_tag}"
                 
                 elif protocol == 'ss_legacy':
@@ -785,16 +818,13 @@ async def verify_payment(
         else:
              raise HTTPException(status_code=500, detail="Database error")
 
-    except InvalidReceiptError as e:
-        raise HTTPException(status_code=400, detail=f"Invalid Receipt: {str(e)}")
     except HTTPException as e:
         raise e
     except Exception as e:
         print(f"Verification error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+
+payment_jobs = OCRJobQueue(provision=_provision_payment)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,139 @@
+"""
+Fragment layout for the sing-box config (CONFIG_LAYOUT=fragments).
+
+With the single config.json, every key purchase rewrote the whole config.
+In the fragment layout, sing-box runs with `-C CONFIG_FRAGMENT_DIR`, or one
+`-c` per file. It merges these files in name order:
+
+    00-base.json            everything static: log, dns, outbounds, route,
+                            and the inbounds that are not managed
+    10-<tag>.json           one per managed inbound: {"inbounds": [inbound]}
+    90-experimental.json    {"experimental": ...}: the v2ray_api stats users
+
+sing-box's merge appends arrays rather than matching inbounds by tag. So
+each inbound fragment holds its complete inbound, settings and users, not
+just a users list. The settings are a few hundred bytes; the users are the
+size.
+
+A mutation rewrites and hashes only the fragments it touched. This uses
+SingboxConfig.changed_tags and stats_changed. For example, an SS purchase
+writes 10-ss-in.json and a VLESS purchase writes 10-vless-in.json plus
+90-experimental.json. The write is proportional to one inbound's users
+instead of the whole config. Reads still merge every fragment: moves and
+removals can span inbounds.
+
+scripts/split_config.py converts a single config.json into this layout.
+"""
+import glob
+import json
+import os
+
+try:
+    from .config_writer import serialize, write_bytes
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from bot.config_writer import serialize, write_bytes
+
+CONFIG_LAYOUT = os.getenv("CONFIG_LAYOUT", "single")
+CONFIG_FRAGMENT_DIR = os.getenv("CONFIG_FRAGMENT_DIR", "/etc/sing-box/conf.d")
+
+FRAGMENT_TAGS = ('vless-in', 'vless-limited-in', 'ss-in', 'tuic-in', 'vless-plain-in')
+BASE_FRAGMENT = '00-base.json'
+EXPERIMENTAL_FRAGMENT = '90-experimental.json'
+
+
+def enabled():
+    return CONFIG_LAYOUT == 'fragments'
+
+
+def inbound_fragment(tag):
+    """File name of a managed inbound's fragment."""
+    return f"10-{tag}.json"
+
+
+def merge(destination, source):
+    """
+    Merge a fragment into a config the way sing-box does: objects merge
+    recursively, arrays are appended, anything else is replaced.
+
+    Returns:
+        dict: destination, modified in place
+    """
+    for key, value in source.items():
+        current = destination.get(key)
+        if isinstance(current, list) and isinstance(value, list):
+            destination[key] = current + value
+        elif isinstance(current, dict) and isinstance(value, dict):
+            merge(current, value)
+        else:
+            destination[key] = value
+    return destination
+
+
+def load_fragments(directory=None):
+    """
+    Read and merge every *.json fragment, in name order.
+
+    Raises:
+        FileNotFoundError: The directory holds no fragments
+    """
+    directory = directory or CONFIG_FRAGMENT_DIR
+    paths = sorted(glob.glob(os.path.join(directory, '*.json')))
+    if not paths:
+        raise FileNotFoundError(f"No config fragments in {directory}")
+    config = {}
+    for path in paths:
+        with open(path) as f:
+            merge(config, json.load(f))
+    return config
+
+
+def split(config):
+    """
+    Cut a config into fragments.
+
+    Returns:
+        dict: file name -> fragment document
+    """
+    base = {k: v for k, v in config.items() if k not in ('inbounds', 'experimental')}
+    base['inbounds'] = [i for i in config.get('inbounds', []) if i.get('tag') not in FRAGMENT_TAGS]
+    fragments = {BASE_FRAGMENT: base}
+    for inbound in config.get('inbounds', []):
+        if inbound.get('tag') in FRAGMENT_TAGS:
+            fragments[inbound_fragment(inbound['tag'])] = {"inbounds": [inbound]}
+    if 'experimental' in config:
+        fragments[EXPERIMENTAL_FRAGMENT] = {"experimental": config['experimental']}
+    return fragments
+
+
+def changed_fragments(config):
+    """
+    The fragments a SingboxConfig's mutations touched.
+
+    Args:
+        config: SingboxConfig
+
+    Returns:
+        dict: file name -> fragment document
+    """
+    fragments = {}
+    if config.changed_tags - set(FRAGMENT_TAGS):
+        # Users of an unmanaged inbound live in the base file
+        fragments[BASE_FRAGMENT] = split(config.to_dict())[BASE_FRAGMENT]
+    for tag in config.changed_tags & set(FRAGMENT_TAGS):
+        fragments[inbound_fragment(tag)] = {"inbounds": [config.inbound(tag).to_dict()]}
+    if config.stats_changed:
+        fragments[EXPERIMENTAL_FRAGMENT] = {"experimental": config.experimental()}
+    return fragments
+
+
+def write_fragments(fragments, directory=None, mode=None):
+    """
+    Write fragments atomically, each on its own (see config_writer).
+
+    Returns:
+        dict: file name -> hex SHA-256 of the written file
+    """
+    directory = directory or CONFIG_FRAGMENT_DIR
+    return {name: write_bytes(os.path.join(directory, name), serialize(fragment), mode)
+            for name, fragment in fragments.items()}
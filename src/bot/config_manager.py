@@ -1,9 +1,12 @@
 import json
 import subprocess
-import os
 import fcntl
 import time
 from src.bot.config import SINGBOX_CONFIG_PATH
+from src.bot.config_model import SingboxConfig
+from src.bot.config_writer import write_config, ConfigWriteError
+from src.bot import config_fragments
+from src.bot import live_users
 
 LOCK_FILE = "/tmp/singbox_config.lock"
 
@@ -32,7 +35,10 @@ class FileLock:
             self.fd.close()
 
 def load_config():
+    """The whole config; merged from the fragments in the fragment layout."""
     try:
+        if config_fragments.enabled():
+            return config_fragments.load_fragments()
         with open(SINGBOX_CONFIG_PATH, 'r') as f:
             return json.load(f)
     except FileNotFoundError:
@@ -40,377 +46,208 @@ def load_config():
         return {"inbounds": [{"users": []}]}
 
 def save_config(config):
-    # Write to a temporary file first
-    temp_path = "/tmp/singbox_config.json"
+    """
+    Write the config atomically (see config_writer).
+
+    In the fragment layout, every fragment is rewritten; save_model writes
+    only what changed.
+
+    Returns:
+        str: SHA-256 of the written file; it is the verification that the
+        exact serialized config is in place, so nothing is re-read.
+        dict of fragment name -> SHA-256 in the fragment layout.
+    """
+    if config_fragments.enabled():
+        return _save_fragments(config_fragments.split(config))
     try:
-        with open(temp_path, 'w') as f:
-            json.dump(config, f, indent=2)
-        
-        # Move to actual location with sudo (bot runs as ubuntu user, not root)
-        result = subprocess.run(["sudo", "cp", temp_path, SINGBOX_CONFIG_PATH], 
-                                check=True, timeout=5, capture_output=True)
-        print(f"Config saved successfully to {SINGBOX_CONFIG_PATH}")
-        subprocess.run(["rm", temp_path], check=True, timeout=5)
-        return True
-    except (subprocess.CalledProcessError, PermissionError, subprocess.TimeoutExpired) as e:
-        error_msg = f"CRITICAL: Failed to save config to {SINGBOX_CONFIG_PATH}: {e}"
-        print(error_msg)
-        # Log to a file for debugging
-        try:
-            with open('/tmp/config_manager_errors.log', 'a') as log:
-                import datetime
-                log.write(f"{datetime.datetime.now()}: {error_msg}\n")
-        except:
-            pass
+        digest = write_config(SINGBOX_CONFIG_PATH, config)
+        print(f"Config saved successfully to {SINGBOX_CONFIG_PATH} ({digest[:12]})")
+        return digest
+    except ConfigWriteError as e:
+        _log_error(f"CRITICAL: Failed to save config to {SINGBOX_CONFIG_PATH}: {e}")
         raise  # Re-raise to make errors visible
-    finally:
-        # Clean up temp file if it exists
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
 
+def save_model(config):
+    """
+    Save a mutated SingboxConfig: the whole file, or in the fragment layout
+    only the fragments its mutations touched.
 
+    Returns:
+        str or dict: As save_config
+    """
+    if config_fragments.enabled():
+        return _save_fragments(config_fragments.changed_fragments(config))
+    return save_config(config.to_dict())
 
-def add_user_to_config(uuid, email, limit_mbps=0):
-    """Wrapper to handle locking and reloading separately."""
-    should_reload = False
-    with FileLock():
-        should_reload = _add_user_to_config_internal(uuid, email, limit_mbps)
-    
-    if should_reload:
-        reload_service()
-        return True
-    return False
+def _save_fragments(fragments):
+    try:
+        digests = config_fragments.write_fragments(fragments)
+        saved = ', '.join(f"{name} ({digest[:12]})" for name, digest in digests.items())
+        print(f"Config saved successfully to {config_fragments.CONFIG_FRAGMENT_DIR}: {saved}")
+        return digests
+    except ConfigWriteError as e:
+        _log_error(f"CRITICAL: Failed to save config fragments to {config_fragments.CONFIG_FRAGMENT_DIR}: {e}")
+        raise  # Re-raise to make errors visible
 
-def _add_user_to_config_internal(uuid, email, limit_mbps=0):
-    config = load_config()
-    
-    # Determine target inbound based on limit
-    # Default to main inbound (vless-in)
-    target_tag = "vless-in"
-    
-    # If limit is set (e.g. 12 Mbps), use limited inbound
-    if limit_mbps > 0 and limit_mbps <= 12.0: 
-        target_tag = "vless-limited-in"
-        
+def _log_error(error_msg):
+    print(error_msg)
+    try:
+        with open('/tmp/config_manager_errors.log', 'a') as log:
+            import datetime
+            log.write(f"{datetime.datetime.now()}: {error_msg}\n")
+    except:
+        pass
+
+# --- Config mutations -------------------------------------------------------
+# Each _apply_* changes a SingboxConfig in place and returns True if sing-box
+# needs a reload. They never load, save or reload; apply_ops does that once
+# per batch.
+
+def _vless_target_tag(limit_mbps):
+    # Default to main inbound (vless-in); limited users (e.g. 12 Mbps) go to the limited inbound
+    if limit_mbps > 0 and limit_mbps <= 12.0:
+        return "vless-limited-in"
+    return "vless-in"
+
+def _apply_add_vless(config, uuid, email, limit_mbps=0):
+    target_tag = _vless_target_tag(limit_mbps)
     print(f"Adding user {email} to inbound: {target_tag} (Limit: {limit_mbps} Mbps)")
 
-    # Find the target inbound
-    target_inbound = None
-    for inbound in config['inbounds']:
-        if inbound.get('tag') == target_tag:
-            target_inbound = inbound
-            break
-            
     # Fallback to first VLESS if tag not found (backward compatibility)
-    if not target_inbound:
+    if not config.inbound(target_tag):
         print(f"Warning: Inbound with tag '{target_tag}' not found. Falling back to first VLESS inbound.")
-        for inbound in config['inbounds']:
-             if inbound['type'] == 'vless':
-                target_inbound = inbound
-                break
-    
-    if not target_inbound:
-        print("Error: No VLESS inbound found in config.")
-        return False
+        vless_inbounds = [i for i in config.inbounds_of_type('vless') if i.tag is not None]
+        if not vless_inbounds:
+            print("Error: No VLESS inbound found in config.")
+            return False
+        target_tag = vless_inbounds[0].tag
 
-    users = target_inbound.get('users', [])
-    
-    # Remove user from ALL VLESS inbounds to ensure they are only in the target one
-    # This handles moving users between limited and unlimited inbounds
-    for inbound in config['inbounds']:
-        if inbound['type'] == 'vless' and 'users' in inbound:
-            original_count = len(inbound['users'])
-            inbound['users'] = [u for u in inbound['users'] if u['uuid'] != uuid]
-            if len(inbound['users']) < original_count:
-                print(f"Removed user {uuid} from inbound {inbound.get('tag')} (Moving to {target_tag})")
-
-    # Check if user already exists in target (should be gone now, but safety check)
-    users = target_inbound.get('users', [])
-    for user in users:
-        if user['uuid'] == uuid:
-            # Should not happen due to removal above, but if it does, update name
-            user['name'] = email
-            save_config(config)
-            return True
-            
-    users.append({
+    # The user ends up in the target inbound only; this moves users between
+    # limited and unlimited inbounds
+    changes = len(config.journal)
+    moved_from = config.move_user(target_tag, {
         "uuid": uuid,
         "flow": "xtls-rprx-vision",
         "name": email
     })
-    target_inbound['users'] = users
-    
+    for tag in moved_from:
+        print(f"Removed user {uuid} from inbound {tag} (Moving to {target_tag})")
+
     # Add to API stats users if enabled
-    if 'experimental' in config and 'v2ray_api' in config['experimental']:
-        stats_users = config['experimental']['v2ray_api']['stats'].get('users', [])
-        if uuid not in stats_users:
-            stats_users.append(uuid)
-            config['experimental']['v2ray_api']['stats']['users'] = stats_users
-            
-    save_config(config)
-    
-    # VERIFY
-    verify_config = load_config()
-    found = False
-    for inbound in verify_config.get('inbounds', []):
-        if inbound.get('tag') == target_tag:
-            for user in inbound.get('users', []):
-                if user.get('uuid') == uuid:
-                    found = True
-                    break
-    
-    if not found:
-        error_msg = f"CRITICAL: VLESS user {email} NOT found in {target_tag} after save!"
-        print(error_msg)
-        return False
-    
-    print(f"✓ VLESS user {email} verified in {target_tag}")
-    return True
+    stats_added = config.add_stats_user(uuid)
+    # A user already in place (and tracked) is a no-op: no save, no reload
+    return len(config.journal) > changes or stats_added
 
-def add_ss_user(password, name):
-    """Add a Shadowsocks user with unique password for tracking."""
-    should_reload = False
-    with FileLock():
-        should_reload = _add_ss_user_internal(password, name)
-    
-    if should_reload:
-        reload_service()
-        return True
-    return False
 
-def _add_ss_user_internal(password, name):
-    config = load_config()
-    
-    try:
-        # Find Shadowsocks inbound (tag: ss-in)
-        ss_inbound = None
-        for inbound in config.get('inbounds', []):
-            if inbound.get('tag') == 'ss-in':
-                ss_inbound = inbound
-                break
-        
-        if not ss_inbound:
-            print("Warning: No Shadowsocks inbound found in config")
-            return False
-        
-        # Initialize users array if it doesn't exist
-        if 'users' not in ss_inbound:
-            ss_inbound['users'] = []
-        
-        users = ss_inbound['users']
-        
-        # Check if user already exists
-        for user in users:
-            if user.get('password') == password:
-                return False
-        
-        # Add new user
-        users.append({
-            "password": password,
-            "name": name
-        })
-        
-        save_config(config)
-        
-        # VERIFY the key was actually added by reading config back
-        verify_config = load_config()
-        found = False
-        for inbound in verify_config.get('inbounds', []):
-            if inbound.get('type') == 'shadowsocks':
-                for user in inbound.get('users', []):
-                    if user.get('password') == password:
-                        found = True
-                        break
-        
-        if not found:
-            error_msg = f"CRITICAL: SS user {name} was NOT found in config after save!"
-            print(error_msg)
-            with open('/tmp/config_manager_errors.log', 'a') as log:
-                import datetime
-                log.write(f"{datetime.datetime.now()}: {error_msg}\n")
-            return False
-        
-        print(f"✓ SS user {name} verified in config")
-        return True
-    except Exception as e:
-        error_msg = f"Error adding SS user {name}: {e}"
-        print(error_msg)
-        with open('/tmp/config_manager_errors.log', 'a') as log:
-            import datetime
-            log.write(f"{datetime.datetime.now()}: {error_msg}\n")
+def _apply_add_ss(config, password, name):
+    # Find Shadowsocks inbound (tag: ss-in)
+    if not config.inbound('ss-in'):
+        print("Warning: No Shadowsocks inbound found in config")
         return False
+    # False if the user already exists
+    return config.add_user('ss-in', {
+        "password": password,
+        "name": name
+    })
 
-def add_tuic_user(uuid, name):
-    """Add a user to the TUIC inbound."""
-    should_reload = False
-    with FileLock():
-        should_reload = _add_tuic_user_internal(uuid, name)
-    
-    if should_reload:
-        reload_service()
-        return True
-    return False
 
-def _add_tuic_user_internal(uuid, name):
-    config = load_config()
-    
-    try:
-        # Find TUIC inbound
-        for inbound in config['inbounds']:
-            if inbound.get('tag') == 'tuic-in': # Use .get() for safety
-                # Initialize users array if it doesn't exist
-                if 'users' not in inbound:
-                    inbound['users'] = []
-
-                # Check if user exists
-                for user in inbound['users']:
-                    if user['uuid'] == uuid:
-                        return False # User already exists
-                
-                # Add user
-                inbound['users'].append({
-                    "uuid": uuid,
-                    "password": uuid, # TUIC uses password field often same as UUID
-                    "name": name
-                })
-                save_config(config)
-                
-                # VERIFY the key was actually added
-                verify_config = load_config()
-                found = False
-                for inbound in verify_config.get('inbounds', []):
-                    if inbound.get('tag') == 'tuic-in':
-                        for user in inbound.get('users', []):
-                            if user.get('uuid') == uuid:
-                                found = True
-                                break
-                
-                if not found:
-                    error_msg = f"CRITICAL: TUIC user {name} NOT found in config after save!"
-                    print(error_msg)
-                    with open('/tmp/config_manager_errors.log', 'a') as log:
-                        import datetime
-                        log.write(f"{datetime.datetime.now()}: {error_msg}\n")
-                    return False
-                
-                print(f"✓ TUIC user {name} verified in config")
-                return True
+def _apply_add_tuic(config, uuid, name):
+    if not config.inbound('tuic-in'):
         print("Warning: No TUIC inbound with tag 'tuic-in' found in config")
         return False
-    except Exception as e:
-        error_msg = f"Error adding TUIC user {name}: {e}"
-        print(error_msg)
-        with open('/tmp/config_manager_errors.log', 'a') as log:
-            import datetime
-            log.write(f"{datetime.datetime.now()}: {error_msg}\n")
+    return config.add_user('tuic-in', {
+        "uuid": uuid,
+        "password": uuid, # TUIC uses password field often same as UUID
+        "name": name
+    })
+
+
+def _apply_add_vless_plain(config, uuid, name):
+    if not config.inbound('vless-plain-in'):
+        print("Warning: No Plain VLESS inbound with tag 'vless-plain-in' found in config")
         return False
+    return config.add_user('vless-plain-in', {
+        "uuid": uuid,
+        "name": name
+    })
 
-def add_vless_plain_user(uuid, name):
-    """Add a user to the Plain VLESS inbound."""
-    should_reload = False
+
+def _apply_remove_ss(config, password):
+    return config.remove_user('ss-in', password)
+
+def _apply_remove_vless(config, uuid):
+    # Whichever VLESS inbound(s) hold it
+    return bool(config.remove_user_everywhere('vless', uuid))
+
+# op name -> mutation
+OPERATIONS = {
+    'add_vless': _apply_add_vless,
+    'add_ss': _apply_add_ss,
+    'add_tuic': _apply_add_tuic,
+    'add_vless_plain': _apply_add_vless_plain,
+    'remove_ss': _apply_remove_ss,
+    'remove_vless': _apply_remove_vless,
+}
+
+def apply_ops(ops):
+    """
+    Apply a batch of config mutations with one locked read-modify-write,
+    one save and one sing-box reload (none if live_users applied the batch
+    through the core's handler API).
+
+    Args:
+        ops: List of (op, args) with op a key of OPERATIONS
+
+    Returns:
+        list: One bool per op, True if it changed the config (and the change
+        is live). An op that fails is logged and returns False without
+        affecting the others.
+
+    Raises:
+        Exception: save_config or reload_service failed; nothing in the batch
+        can be assumed live
+    """
+    results = []
     with FileLock():
-        should_reload = _add_vless_plain_user_internal(uuid, name)
-    
-    if should_reload:
+        config = SingboxConfig(load_config())
+        for op, args in ops:
+            mutate = OPERATIONS[op]
+            try:
+                results.append(bool(mutate(config, *args)))
+            except Exception as e:
+                _log_error(f"Error applying {op} to config: {e}")
+                results.append(False)
+
+        if any(results):
+            save_model(config)
+
+    if any(results) and not live_users.apply_live(config):
         reload_service()
-        return True
-    return False
+    return results
 
-def _add_vless_plain_user_internal(uuid, name):
-    config = load_config()
-    
-    try:
-        # Find Plain VLESS inbound
-        for inbound in config['inbounds']:
-            if inbound.get('tag') == 'vless-plain-in': # Use .get() for safety
-                # Initialize users array if it doesn't exist
-                if 'users' not in inbound:
-                    inbound['users'] = []
-
-                # Check if user exists
-                for user in inbound['users']:
-                    if user['uuid'] == uuid:
-                        return False # User already exists
-                
-                # Add user
-                inbound['users'].append({
-                    "uuid": uuid,
-                    "name": name
-                })
-                save_config(config)
-                
-                # VERIFY the key was actually added
-                verify_config = load_config()
-                found = False
-                for inbound in verify_config.get('inbounds', []):
-                    if inbound.get('tag') == 'vless-plain-in':
-                        for user in inbound.get('users', []):
-                            if user.get('uuid') == uuid:
-                                found = True
-                                break
-                
-                if not found:
-                    error_msg = f"CRITICAL: Plain VLESS user {name} NOT found in config after save!"
-                    print(error_msg)
-                    with open('/tmp/config_manager_errors.log', 'a') as log:
-                        import datetime
-                        log.write(f"{datetime.datetime.now()}: {error_msg}\n")
-                    return False
-                
-                print(f"✓ Plain VLESS user {name} verified in config")
-                return True
-        print("Warning: No Plain VLESS inbound with tag 'vless-plain-in' found in config")
-        return False
-    except Exception as e:
-        error_msg = f"Error adding Plain VLESS user {name}: {e}"
-        print(error_msg)
-        with open('/tmp/config_manager_errors.log', 'a') as log:
-            import datetime
-            log.write(f"{datetime.datetime.now()}: {error_msg}\n")
-        return False
+def add_user_to_config(uuid, email, limit_mbps=0):
+    """Add (or move) a VLESS user. True if the config changed and sing-box was reloaded."""
+    return apply_ops([('add_vless', (uuid, email, limit_mbps))])[0]
+
+def add_ss_user(password, name):
+    """Add a Shadowsocks user with unique password for tracking."""
+    return apply_ops([('add_ss', (password, name))])[0]
+
+def add_tuic_user(uuid, name):
+    """Add a user to the TUIC inbound."""
+    return apply_ops([('add_tuic', (uuid, name))])[0]
+
+def add_vless_plain_user(uuid, name):
+    """Add a user to the Plain VLESS inbound."""
+    return apply_ops([('add_vless_plain', (uuid, name))])[0]
 
 def remove_ss_user(password):
     """Remove a Shadowsocks user by password (UUID)."""
-    should_reload = False
-    with FileLock():
-        should_reload = _remove_ss_user_internal(password)
-    
-    if should_reload:
-        reload_service()
-        return True
-    return False
+    return apply_ops([('remove_ss', (password,))])[0]
 
-def _remove_ss_user_internal(password):
-    config = load_config()
-    
-    try:
-        # Find Shadowsocks inbound (tag: ss-in)
-        ss_inbound = None
-        for inbound in config.get('inbounds', []):
-            if inbound.get('tag') == 'ss-in':
-                ss_inbound = inbound
-                break
-        
-        if not ss_inbound or 'users' not in ss_inbound:
-            return False
-        
-        users = ss_inbound['users']
-        initial_count = len(users)
-        
-        # Filter out the user with matching password
-        ss_inbound['users'] = [u for u in users if u.get('password') != password]
-        
-        if len(ss_inbound['users']) < initial_count:
-            save_config(config)
-            return True
-            
-        return False
-    except Exception as e:
-        print(f"Error removing SS user: {e}")
-        return False
+def remove_vless_user(uuid):
+    """Remove a VLESS user by UUID."""
+    return apply_ops([('remove_vless', (uuid,))])[0]
 
 def reload_service():
     """Gracefully reload sing-box without dropping connections."""
@@ -429,36 +266,7 @@ def reload_service():
             print(f"Warning: Failed to reload/restart sing-box service: {e}")
             raise  # Re-raise to make errors visible
 
-def remove_vless_user(uuid):
-    """Remove a VLESS user by UUID."""
-    should_reload = False
-    with FileLock():
-        should_reload = _remove_vless_user_internal(uuid)
-    
-    if should_reload:
-        reload_service()
-        return True
-    return False
 
-def _remove_vless_user_internal(uuid):
-    config = load_config()
-    
-    try:
-        inbound = config['inbounds'][0] # Assuming first inbound is VLESS
-        users = inbound.get('users', [])
-        initial_count = len(users)
-        
-        # Filter out user
-        inbound['users'] = [u for u in users if u.get('uuid') != uuid]
-        
-        if len(inbound['users']) < initial_count:
-            save_config(config)
-            return True
-            
-        return False
-    except Exception as e:
-        print(f"Error removing VLESS user: {e}")
-        return False
 def add_admin_tuic_user(uuid, name):
     """Add a user to the Admin TUIC server (standalone)."""
     # Admin TUIC uses a separate config file and service
@@ -473,13 +281,8 @@ def add_admin_tuic_user(uuid, name):
         if uuid not in config['users']:
             config['users'][uuid] = uuid  # Password is same as UUID for simplicity
             
-            # Save config (requires sudo)
-            temp_path = "/tmp/tuic_server.json"
-            with open(temp_path, 'w') as f:
-                json.dump(config, f, indent=2)
-                
-            subprocess.run(["sudo", "cp", temp_path, TUIC_CONFIG_PATH], check=True)
-            subprocess.run(["rm", temp_path], check=True)
+            # Save config atomically (direct or through the helper, see config_writer)
+            write_config(TUIC_CONFIG_PATH, config)
             
             # Reload service
             print("Reloading Admin TUIC service...")
@@ -0,0 +1,234 @@
+"""
+Indexed in-memory model of a sing-box config.
+
+config.json keeps users as plain lists, so every lookup was a scan of
+config['inbounds'] followed by a scan of one inbound's users. Moving a VLESS
+user between inbounds even rebuilt every VLESS user list. SingboxConfig
+indexes the parsed document once:
+
+    inbounds by tag and by type
+    users per inbound by key (uuid for vless and tuic, password for
+        shadowsocks), kept in insertion order so the JSON round-trips
+        unchanged
+    which inbound of each type holds a key (for moves and removals)
+    the v2ray_api stats user set
+
+Membership, add, move and remove are O(1). to_dict() writes the document
+back in sing-box's JSON shape. Everything outside the user lists (TLS,
+REALITY, outbounds, route) is passed through untouched, and so are the user
+lists of inbound types without a known key (socks, trojan, hysteria2, ...),
+whose users have no uuid to index by. changed_tags and stats_changed
+record what the mutations touched, so the fragment layout (config_fragments)
+rewrites only those files. journal lists the user adds
+and removals in order, for the live applier (live_users).
+
+Duplicate keys within one inbound are collapsed to the first entry on load.
+sing-box would reject them anyway.
+"""
+import copy
+
+# Inbound types whose users are indexed, and the field holding their key
+USER_KEY_FIELDS = {
+    'vless': 'uuid',
+    'tuic': 'uuid',
+    'shadowsocks': 'password',
+}
+
+
+class Inbound:
+    """One inbound: its settings plus an ordered key -> user index."""
+
+    def __init__(self, settings):
+        """
+        :param settings: Inbound dict from config.json (its 'users' list is indexed, the rest kept as is)
+        """
+        # None for types without a known key: their users stay in settings, unindexed
+        self.key_field = USER_KEY_FIELDS.get(settings.get('type'))
+        self.users = {}
+        if self.key_field is None:
+            self.settings = settings
+            self.has_users_field = False
+            return
+        self.settings = {k: v for k, v in settings.items() if k != 'users'}
+        self.has_users_field = 'users' in settings
+        for user in settings.get('users') or []:
+            self.users.setdefault(user.get(self.key_field), user)
+
+    @property
+    def tag(self):
+        return self.settings.get('tag')
+
+    @property
+    def type(self):
+        return self.settings.get('type')
+
+    def to_dict(self):
+        inbound = dict(self.settings)
+        if self.users or self.has_users_field:
+            inbound['users'] = list(self.users.values())
+        return inbound
+
+
+class SingboxConfig:
+    def __init__(self, config):
+        """
+        :param config: Parsed config.json (not modified; to_dict returns a new document)
+        """
+        self._config = config
+        self.inbounds = [Inbound(inbound) for inbound in config.get('inbounds', [])]
+        self._by_tag = {}
+        self._by_type = {}
+        # type -> key -> tag of the inbound holding it
+        self._locations = {}
+        for inbound in self.inbounds:
+            if inbound.tag is not None:
+                self._by_tag.setdefault(inbound.tag, inbound)
+            self._by_type.setdefault(inbound.type, []).append(inbound)
+            located = self._locations.setdefault(inbound.type, {})
+            for key in inbound.users:
+                located.setdefault(key, inbound.tag)
+
+        # Inbound tags whose users changed, and whether the stats users did
+        self.changed_tags = set()
+        self.stats_changed = False
+        # ('add', tag, user) / ('remove', tag, key), in mutation order
+        self.journal = []
+
+        stats = config.get('experimental', {}).get('v2ray_api', {}).get('stats')
+        self._stats = None
+        if stats is not None:
+            # Ordered set: O(1) add and remove, so revoking thousands of
+            # users in one reconcile stays linear
+            self._stats = dict.fromkeys(stats.get('users', []))
+
+    # --- Lookup ---
+
+    def inbound(self, tag):
+        """Inbound with this tag, or None."""
+        return self._by_tag.get(tag)
+
+    def inbounds_of_type(self, inbound_type):
+        """Inbounds of a type ('vless', 'shadowsocks', ...), in config order."""
+        return self._by_type.get(inbound_type, [])
+
+    def has_user(self, tag, key):
+        inbound = self._by_tag.get(tag)
+        return inbound is not None and key in inbound.users
+
+    def locate(self, inbound_type, key):
+        """Tag of the inbound of this type holding key, or None."""
+        return self._locations.get(inbound_type, {}).get(key)
+
+    # --- Mutation ---
+
+    def add_user(self, tag, user):
+        """
+        Add a user to an inbound.
+
+        Returns:
+            bool: False if the inbound is missing, has no user index, or
+            already has the user's key
+        """
+        inbound = self._by_tag.get(tag)
+        if inbound is None or inbound.key_field is None:
+            return False
+        key = user.get(inbound.key_field)
+        if key in inbound.users:
+            return False
+        inbound.users[key] = user
+        self._locations.setdefault(inbound.type, {}).setdefault(key, tag)
+        self.changed_tags.add(tag)
+        self.journal.append(('add', tag, user))
+        return True
+
+    def remove_user(self, tag, key):
+        """
+        Remove a user from an inbound.
+
+        Returns:
+            bool: False if the inbound does not have the user
+        """
+        inbound = self._by_tag.get(tag)
+        if inbound is None or inbound.users.pop(key, None) is None:
+            return False
+        self.changed_tags.add(tag)
+        self.journal.append(('remove', tag, key))
+        located = self._locations.get(inbound.type, {})
+        if located.get(key) == tag:
+            del located[key]
+            # Another inbound of the same type may still hold it
+            for other in self._by_type[inbound.type]:
+                if key in other.users:
+                    located[key] = other.tag
+                    break
+        return True
+
+    def remove_user_everywhere(self, inbound_type, key):
+        """
+        Remove a key from every inbound of a type.
+
+        Returns:
+            list: Tags it was removed from
+        """
+        removed = []
+        while True:
+            tag = self.locate(inbound_type, key)
+            if tag is None or not self.remove_user(tag, key):
+                return removed
+            removed.append(tag)
+
+    def move_user(self, tag, user):
+        """
+        Make tag the only inbound of its type holding the user (add or move).
+        A user already only in tag is left as is.
+
+        Returns:
+            list: Tags the user was moved out of
+        """
+        inbound = self._by_tag[tag]
+        if inbound.key_field is None:
+            return []
+        key = user.get(inbound.key_field)
+        if key in inbound.users and not any(
+                key in other.users for other in self._by_type[inbound.type] if other is not inbound):
+            # Already only here: nothing to write, reload or apply live
+            return []
+        moved_from = [t for t in self.remove_user_everywhere(inbound.type, key) if t != tag]
+        self.add_user(tag, user)
+        return moved_from
+
+    def add_stats_user(self, name):
+        """Track a user in experimental.v2ray_api.stats, if the stats API is configured."""
+        if self._stats is None or name in self._stats:
+            return False
+        self._stats[name] = None
+        self.stats_changed = True
+        return True
+
+    def remove_stats_user(self, name):
+        """Stop tracking a user in experimental.v2ray_api.stats."""
+        if self._stats is None or name not in self._stats:
+            return False
+        del self._stats[name]
+        self.stats_changed = True
+        return True
+
+    # --- Serialization ---
+
+    def experimental(self):
+        """The experimental section with the current stats users (None if absent)."""
+        if 'experimental' not in self._config:
+            return None
+        if self._stats is None:
+            return self._config['experimental']
+        experimental = copy.deepcopy(self._config['experimental'])
+        experimental['v2ray_api']['stats']['users'] = list(self._stats)
+        return experimental
+
+    def to_dict(self):
+        """The config as a sing-box JSON document."""
+        config = dict(self._config)
+        config['inbounds'] = [inbound.to_dict() for inbound in self.inbounds]
+        if self._stats is not None:
+            config['experimental'] = self.experimental()
+        return config
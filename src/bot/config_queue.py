@@ -0,0 +1,171 @@
+"""
+Coalescing write queue for sing-box config changes.
+
+Every config_manager call is a full locked load, save, verify and
+`systemctl reload sing-box`. A burst of purchases therefore meant one reload
+each. Long-running processes (bot, API) submit changes here instead. A
+single writer thread collects everything submitted within
+CONFIG_WRITE_DEBOUNCE seconds of the last change (default: 1.0), capped at
+CONFIG_WRITE_MAX_DELAY after the first (default: 5.0). It applies the batch
+with config_manager.apply_ops: one locked read-modify-write, one save and
+one reload.
+
+Each submit returns a concurrent.futures.Future. It resolves, once the
+batch's reload is done, to what the matching config_manager function would
+have returned: True if the change is live, False if it was a no-op or failed
+on its own. If the save or reload fails, every future in the batch gets the
+exception. If the writer thread itself dies, its batch and everything queued
+behind it fail too, so no future.result() waits forever.
+
+Sync code blocks on future.result(); async code awaits
+asyncio.wrap_future(future). One-off scripts keep calling config_manager
+directly, since they have nothing to batch with.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from .config_manager import apply_ops, OPERATIONS
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from bot.config_manager import apply_ops, OPERATIONS
+
+logger = logging.getLogger(__name__)
+
+CONFIG_WRITE_DEBOUNCE = float(os.getenv("CONFIG_WRITE_DEBOUNCE", "1.0"))
+CONFIG_WRITE_MAX_DELAY = float(os.getenv("CONFIG_WRITE_MAX_DELAY", "5.0"))
+
+
+class ConfigWriteQueue:
+    def __init__(self, apply=apply_ops, debounce=None, max_delay=None):
+        """
+        :param apply: Batch writer, called with a list of (op, args) and returning one result per op
+        :param debounce: Quiet period that closes a batch (default: CONFIG_WRITE_DEBOUNCE)
+        :param max_delay: Longest a change waits for its batch to close (default: CONFIG_WRITE_MAX_DELAY)
+        """
+        self.apply = apply
+        self.debounce = CONFIG_WRITE_DEBOUNCE if debounce is None else debounce
+        self.max_delay = CONFIG_WRITE_MAX_DELAY if max_delay is None else max_delay
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+
+    def submit(self, op, *args):
+        """
+        Queue a config change.
+
+        Args:
+            op: Operation name (see config_manager.OPERATIONS)
+            *args: Its arguments, as for the config_manager function
+
+        Returns:
+            concurrent.futures.Future: Resolves when the change is live
+        """
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown config operation: {op}")
+        future = Future()
+        self._pending.put((op, args, future))
+        self._ensure_writer()
+        return future
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="config-writer", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for the first change, then gather the rest of its burst."""
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            timeout = min(self.debounce, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        # Anything queued meanwhile goes in too
+        while True:
+            try:
+                batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._collect()
+                self._apply_batch(batch)
+                batch = []
+        except BaseException as e:
+            # Nothing else would ever resolve these futures
+            logger.exception("Config writer thread died")
+            self._fail_pending(batch, e)
+
+    def _apply_batch(self, batch):
+        ops = [(op, args) for op, args, _ in batch]
+        self.batches += 1
+        try:
+            results = self.apply(ops)
+        except Exception as e:
+            logger.error(f"Config batch of {len(batch)} changes failed: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        logger.info(f"Applied {len(batch)} config changes in one write ({sum(results)} live)")
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _fail_pending(self, batch, error):
+        """Fail the dying writer's batch and everything queued behind it."""
+        with self._lock:
+            # The next submit starts a fresh writer
+            self._thread = None
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+        exception = RuntimeError(f"Config writer stopped: {error!r}")
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(exception)
+
+
+# Process-wide queue
+config_queue = ConfigWriteQueue()
+
+
+def add_user_to_config(uuid, email, limit_mbps=0):
+    """Queued config_manager.add_user_to_config; returns a Future."""
+    return config_queue.submit('add_vless', uuid, email, limit_mbps)
+
+def add_ss_user(password, name):
+    """Queued config_manager.add_ss_user; returns a Future."""
+    return config_queue.submit('add_ss', password, name)
+
+def add_tuic_user(uuid, name):
+    """Queued config_manager.add_tuic_user; returns a Future."""
+    return config_queue.submit('add_tuic', uuid, name)
+
+def add_vless_plain_user(uuid, name):
+    """Queued config_manager.add_vless_plain_user; returns a Future."""
+    return config_queue.submit('add_vless_plain', uuid, name)
+
+def remove_ss_user(password):
+    """Queued config_manager.remove_ss_user; returns a Future."""
+    return config_queue.submit('remove_ss', password)
+
+def remove_vless_user(uuid):
+    """Queued config_manager.remove_vless_user; returns a Future."""
+    return config_queue.submit('remove_vless', uuid)
@@ -0,0 +1,172 @@
+"""
+Streaming config generation from a template.
+
+A full rebuild used to mean json.load of the whole config, rebuilding the
+user lists, and json.dump(indent=2) of the whole document. At 100k+ users,
+that held the parsed config and its serialized text in memory at once.
+
+Here the static part of the config is a template. That part is the inbound
+TLS/REALITY settings, outbounds, route and so on: config.json with the
+managed inbounds' users and the v2ray_api stats users emptied. It lives at
+CONFIG_TEMPLATE_PATH and make_template() extracts it from a live config.
+render() serializes the template compactly and cuts it at those arrays. It
+then streams each array from a DB cursor (database.iter_provisioned_keys) in
+batches of CONFIG_STREAM_BATCH users, so memory stays at the template plus
+one batch whatever the user count. generate_config() pipes the chunks
+through config_writer.write_stream: atomic replace, digest computed while
+writing.
+
+The protocol -> inbound mapping and the user entries are the reconciler's
+(reconcile.PROTOCOL_TAGS, reconcile.user_entry), so a generated config is
+one reconcile() would leave unchanged.
+
+Usage: scripts/generate_config.py
+"""
+import copy
+import json
+import os
+import re
+
+try:
+    from ..db.database import iter_provisioned_keys
+    from . import config_manager
+    from .config_writer import write_config, write_stream
+    from .reconcile import PROTOCOL_TAGS, MANAGED_TAGS, STATS_TAGS, user_entry
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import iter_provisioned_keys
+    from bot import config_manager
+    from bot.config_writer import write_config, write_stream
+    from bot.reconcile import PROTOCOL_TAGS, MANAGED_TAGS, STATS_TAGS, user_entry
+
+CONFIG_TEMPLATE_PATH = os.getenv("CONFIG_TEMPLATE_PATH", "/etc/sing-box/config.template.json")
+CONFIG_STREAM_BATCH = int(os.getenv("CONFIG_STREAM_BATCH", "1000"))
+
+# tag -> protocols provisioned into it, in PROTOCOL_TAGS order
+TAG_PROTOCOLS = {tag: [p for p, t in PROTOCOL_TAGS.items() if t == tag] for tag in MANAGED_TAGS}
+
+# Stand-ins for the streamed arrays; NUL cannot occur in a real config, and
+# json escapes it, so the serialized template is split on `"\u0000users:tag"`
+_MARK = '\x00'
+_MARK_RE = re.compile(r'"\\u0000(users|stats):([^"]*)"')
+_SEPARATORS = (',', ':')
+
+
+def _stats(config):
+    return config.get('experimental', {}).get('v2ray_api', {}).get('stats')
+
+
+def make_template(config):
+    """
+    The static part of a config: managed inbounds' users and stats users emptied.
+
+    Args:
+        config: A parsed config.json (not modified)
+
+    Returns:
+        dict
+    """
+    template = copy.deepcopy(config)
+    for inbound in template.get('inbounds', []):
+        if inbound.get('tag') in MANAGED_TAGS:
+            inbound['users'] = []
+    stats = _stats(template)
+    if stats is not None and 'users' in stats:
+        stats['users'] = []
+    return template
+
+
+def load_template(path=None):
+    with open(path or CONFIG_TEMPLATE_PATH) as f:
+        return json.load(f)
+
+
+def save_template(config, path=None):
+    """Extract the template from a config and write it; returns its digest."""
+    return write_config(path or CONFIG_TEMPLATE_PATH, make_template(config))
+
+
+def _user_batches(tag, batch_size):
+    for protocol in TAG_PROTOCOLS[tag]:
+        for rows in iter_provisioned_keys(protocol, batch_size):
+            yield [user_entry(tag, key, username or f"User{telegram_id}")
+                   for key, username, telegram_id in rows]
+
+
+def _stats_batches(batch_size):
+    for tag in STATS_TAGS:
+        for protocol in TAG_PROTOCOLS[tag]:
+            for rows in iter_provisioned_keys(protocol, batch_size):
+                yield [row[0] for row in rows]
+
+
+def _stream_array(batches):
+    yield b'['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        # One C-encoder call per batch; strip its brackets to splice batches
+        text = json.dumps(batch, separators=_SEPARATORS)[1:-1]
+        yield text.encode() if first else b',' + text.encode()
+        first = False
+    yield b']'
+
+
+def render(template, batch_size=None):
+    """
+    Stream the full config: the template with its user arrays filled from the DB.
+
+    Args:
+        template: Config dict; managed inbounds' users and the stats users
+            are replaced whatever they hold
+        batch_size: Users per DB fetch and per encoded chunk
+
+    Yields:
+        bytes: Compact JSON chunks
+    """
+    batch_size = batch_size or CONFIG_STREAM_BATCH
+    doc = copy.deepcopy(template)
+    for inbound in doc.get('inbounds', []):
+        if inbound.get('tag') in MANAGED_TAGS:
+            inbound['users'] = f"{_MARK}users:{inbound['tag']}"
+    stats = _stats(doc)
+    if stats is not None and 'users' in stats:
+        stats['users'] = f"{_MARK}stats:"
+
+    parts = _MARK_RE.split(json.dumps(doc, separators=_SEPARATORS))
+    # parts: text, kind, tag, text, kind, tag, ..., text
+    yield parts[0].encode()
+    for i in range(1, len(parts), 3):
+        kind, tag, text = parts[i], parts[i + 1], parts[i + 2]
+        if kind == 'users':
+            yield from _stream_array(_user_batches(tag, batch_size))
+        else:
+            yield from _stream_array(_stats_batches(batch_size))
+        yield text.encode()
+
+
+def generate_config(path=None, template=None, mode=None):
+    """
+    Regenerate config.json from the template and the database.
+
+    Takes the config lock; the caller reloads sing-box.
+
+    Args:
+        path: Output file (default: SINGBOX_CONFIG_PATH)
+        template: Template dict (default: read CONFIG_TEMPLATE_PATH)
+        mode: CONFIG_WRITE_MODE override
+
+    Returns:
+        str: Hex SHA-256 of the written file. In the fragment layout (and no
+        path), dict of fragment name -> SHA-256, each fragment streamed on
+        its own.
+    """
+    if template is None:
+        template = load_template()
+    fragments = config_manager.config_fragments
+    with config_manager.FileLock():
+        if path is None and fragments.enabled():
+            return {name: write_stream(os.path.join(fragments.CONFIG_FRAGMENT_DIR, name), render(fragment), mode)
+                    for name, fragment in fragments.split(template).items()}
+        return write_stream(path or config_manager.SINGBOX_CONFIG_PATH, render(template), mode)
@@ -0,0 +1,186 @@
+"""
+Live user applier: push user adds and removals to the running core over its
+HandlerService API, instead of reloading it.
+
+Every config change used to end in `systemctl reload sing-box`, or a
+restart if that failed. That added reload latency to each purchase and
+dropped connections. A core exposing Xray's HandlerService.AlterInbound can
+take AddUser/RemoveUser live. Set LIVE_USERS_API to its gRPC address to use
+that.
+
+The config file is still written first; it remains the source of truth for
+the next start. apply_live() then replays the batch's SingboxConfig.journal
+as AlterInbound calls (src/v2ray-proto/handler_command.py). It returns False,
+and the caller reloads as before, when:
+    LIVE_USERS_API is unset (the default; sing-box's v2ray_api only has
+        the stats service)
+    the batch has more than LIVE_USERS_MAX_OPS changes (a reload is
+        cheaper than thousands of RPCs, e.g. a large reconcile)
+    an inbound type has no live account (tuic, ...), or any call fails
+
+A partial live apply followed by a reload is harmless: the reload loads the
+file, which already holds the whole batch.
+
+Users are registered under their key (VLESS UUID, Shadowsocks password) as
+the email. The key is the only per-inbound unique name, and it matches the
+uuid-keyed stats the watchdog reads.
+"""
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+LIVE_USERS_API = os.getenv("LIVE_USERS_API", "")  # e.g. 127.0.0.1:10085
+LIVE_USERS_TIMEOUT = float(os.getenv("LIVE_USERS_TIMEOUT", "2"))
+LIVE_USERS_MAX_OPS = int(os.getenv("LIVE_USERS_MAX_OPS", "100"))
+
+# Inbound types with a live account encoding (handler_command)
+LIVE_INBOUND_TYPES = ('vless', 'shadowsocks')
+
+PROTO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'v2ray-proto')
+
+
+def _handler_command():
+    # Imported like the stats stubs, with src/v2ray-proto on sys.path
+    if PROTO_DIR not in sys.path:
+        sys.path.insert(0, PROTO_DIR)
+    import handler_command
+    return handler_command
+
+
+class LiveApplyError(Exception):
+    """A change could not be applied live; the caller falls back to a reload."""
+
+
+class LiveUserApplier:
+    """AlterInbound client for one core API address; the channel is opened on first use."""
+
+    def __init__(self, address, timeout=None):
+        self.address = address
+        self.timeout = LIVE_USERS_TIMEOUT if timeout is None else timeout
+        self._stub = None
+        self._channel = None
+        self._lock = threading.Lock()
+
+    def _get_stub(self):
+        with self._lock:
+            if self._stub is None:
+                import grpc
+                self._channel = grpc.insecure_channel(self.address)
+                self._stub = _handler_command().HandlerServiceStub(self._channel)
+            return self._stub
+
+    def _call(self, request):
+        import grpc
+        try:
+            self._get_stub().AlterInbound(request, timeout=self.timeout)
+        except grpc.RpcError as e:
+            raise LiveApplyError(f"AlterInbound failed: {e.code()} - {e.details()}")
+
+    def add_user(self, inbound, user):
+        """
+        Add a config user entry to a running inbound.
+
+        Args:
+            inbound: config_model.Inbound the user was added to
+            user: The config user dict
+
+        Raises:
+            LiveApplyError
+        """
+        handler_command = _handler_command()
+        key = user.get(inbound.key_field)
+        if inbound.type == 'vless':
+            account = handler_command.vless_account(key, user.get('flow', ''))
+        elif inbound.type == 'shadowsocks':
+            try:
+                account = handler_command.shadowsocks_account(key, inbound.settings.get('method', ''))
+            except ValueError as e:
+                raise LiveApplyError(str(e))
+        else:
+            raise LiveApplyError(f"No live account for {inbound.type} inbounds")
+        self._call(handler_command.add_user_request(inbound.tag, key, account))
+
+    def remove_user(self, inbound, key):
+        """
+        Remove a user (by key) from a running inbound.
+
+        Raises:
+            LiveApplyError
+        """
+        handler_command = _handler_command()
+        if inbound.type not in LIVE_INBOUND_TYPES:
+            raise LiveApplyError(f"No live account for {inbound.type} inbounds")
+        self._call(handler_command.remove_user_request(inbound.tag, key))
+
+    def apply(self, config):
+        """
+        Replay a SingboxConfig's journal.
+
+        Returns:
+            bool: True if every change was applied live
+
+        Raises:
+            LiveApplyError: Nothing is sent if an inbound type has no live
+            account; otherwise the changes before the failing one are live
+        """
+        unsupported = {config.inbound(tag).type for _, tag, _ in config.journal} - set(LIVE_INBOUND_TYPES)
+        if unsupported:
+            raise LiveApplyError(f"No live account for {', '.join(sorted(map(str, unsupported)))} inbounds")
+        for action, tag, payload in config.journal:
+            inbound = config.inbound(tag)
+            if action == 'add':
+                self.add_user(inbound, payload)
+            else:
+                self.remove_user(inbound, payload)
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._channel is not None:
+                self._channel.close()
+            self._channel = self._stub = None
+
+
+_applier = None
+_applier_lock = threading.Lock()
+
+
+def get_applier():
+    """The process-wide applier for LIVE_USERS_API, or None if unset."""
+    global _applier
+    if not LIVE_USERS_API:
+        return None
+    with _applier_lock:
+        if _applier is None or _applier.address != LIVE_USERS_API:
+            if _applier is not None:
+                _applier.close()
+            _applier = LiveUserApplier(LIVE_USERS_API)
+        return _applier
+
+
+def apply_live(config):
+    """
+    Apply a saved batch to the running core without a reload, if possible.
+
+    Args:
+        config: The SingboxConfig the batch was applied to (and saved from)
+
+    Returns:
+        bool: True if the core has every change; False means reload
+    """
+    applier = get_applier()
+    if applier is None or not config.journal:
+        return False
+    if len(config.journal) > LIVE_USERS_MAX_OPS:
+        logger.info(f"{len(config.journal)} user changes, reloading instead of applying live")
+        return False
+    try:
+        applier.apply(config)
+    except (LiveApplyError, ImportError) as e:
+        logger.warning(f"Live user update failed, falling back to reload: {e}")
+        return False
+    logger.info(f"Applied {len(config.journal)} user changes live via {applier.address}")
+    return True
@@ -1,10 +1,8 @@
 import logging
 import uuid
-import qrcode
-import io
 import sys
 import os
-import tempfile
+import asyncio
 
 # Add parent directory to path to import db
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,6 +10,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from db.database import add_user, get_user, init_db, get_active_key_count, get_user_stats, get_all_users, delete_user, activate_user, deactivate_user
+from db.aio import run_db
+from services.nsfw_service import nsfw_service, NSFWQueueFull
+from bot.qr_cache import send_qr
 from bot.config import BOT_TOKEN, KBZ_PAY_NUMBER, WAVE_PAY_NUMBER, SERVER_IP, PUBLIC_KEY, SHORT_ID, SERVER_PORT, SERVER_NAME, SS_SERVER, SS_PORT, SS_METHOD, SS_PASSWORD, SS_LEGACY_PORT, SS_LEGACY_PASSWORD, TUIC_PORT, VLESS_PLAIN_PORT, MAX_KEYS_PER_USER, ADMIN_ID, ADMIN_PASSWORD, ADMIN_USERNAME
 
 # Enable logging
@@ -20,20 +21,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize NSFW detector (lazy load to avoid startup delay)
-nsfw_detector = None
-
 def get_nsfw_detector():
-    global nsfw_detector
-    if nsfw_detector is None:
-        try:
-            from nudenet import NudeDetector
-            nsfw_detector = NudeDetector()
-            logger.info("NudeNet detector initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize NudeNet: {e}")
-            nsfw_detector = False  # Mark as failed to avoid retrying
-    return nsfw_detector if nsfw_detector is not False else None
+    """The NSFW screening service, or None if its model failed to load."""
+    nsfw_service.start()
+    return nsfw_service if nsfw_service.state != 'failed' else None
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
@@ -146,18 +137,6 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
                 from bot.config_manager import add_admin_tuic_user
                 add_admin_tuic_user(user_uuid, key_tag)
                 
-                # Generate QR Code
-                import qrcode
-                import io
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data(vpn_link)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white")
-                
-                bio = io.BytesIO()
-                img.save(bio)
-                bio.seek(0)
-                
                 await update.message.reply_text(
                     f"✅ **Admin TUIC Key Generated!**\n\n"
                     f"🔐 **Thailand's Dedicated India Server**\n"
@@ -165,7 +144,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
                     f"[Tip] For personal use only!",
                     parse_mode="Markdown"
                 )
-                await update.message.reply_photo(bio, caption="Scan this QR to import")
+                await send_qr(update.message, vpn_link, caption="Scan this QR to import")
             else:
                 await update.message.reply_text("❌ Error generating key. Contact support.")
         else:
@@ -182,86 +161,152 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     # Handle other text messages (if any)
     await update.message.reply_text("Please use the /start command to see available options.")
 
+def slip_outcome_reply(entry):
+    """
+    Reply for a photo whose outcome was recorded by services.slip_files.
+
+    Returns:
+        tuple: (text, parse_mode)
+    """
+    outcome = entry['outcome']
+    if outcome == 'nsfw':
+        return "Inappropriate content detected.", "Markdown"
+    if outcome == 'invalid':
+        return (f"Invalid Receipt: {entry['detail']}\n\n"
+                "Please make sure to upload a valid KBZ Pay or Wave Pay slip."), None
+    if outcome == 'low_amount':
+        return f"Amount `{entry['detail']}` is less than required 3,000 MMK.", "Markdown"
+    # accepted or duplicate: the slip's transaction ID is spent
+    return f"Transaction ID `{entry['transaction_id']}` has already been used!", "Markdown"
+
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle payment screenshot."""
     user = update.effective_user
-    photo_file = await update.message.photo[-1].get_file()
-    
-    # Download image temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-        await photo_file.download_to_drive(tmp.name)
-        tmp_path = tmp.name
-        
+    photo = update.message.photo[-1]
+
+    from services.slip_cache import slip_digest, lookup_slip, store_slip
+    from services.slip_pipeline import decode_image, screen_and_read, run_blocking
+    from services import slip_hash, slip_files
+
+    # Forwarded/re-sent photo already judged: answer without downloading it
+    previous = await run_db(slip_files.lookup_file, photo.file_unique_id)
+    if previous:
+        logger.info(f"Slip file {photo.file_unique_id} from {user.id} already {previous['outcome']}")
+        text, parse_mode = slip_outcome_reply(previous)
+        await update.message.reply_text(text, parse_mode=parse_mode)
+        return
+
+    photo_file = await photo.get_file()
+
+    # Download into memory and decode once; nothing touches the filesystem
+    image_bytes = bytes(await photo_file.download_as_bytearray())
     try:
-        # 1. NSFW Detection
-        detector = get_nsfw_detector()
-        if detector:
-            try:
-                predictions = detector.detect(tmp_path)
-                nsfw_classes = ['EXPOSED_GENITALIA', 'EXPOSED_BREAST_F', 'EXPOSED_BUTTOCKS', 'EXPOSED_ANUS']
-                is_nsfw = any(
-                    pred['class'] in nsfw_classes and pred['score'] > 0.6
-                    for pred in predictions
-                )
-                if is_nsfw:
-                    await update.message.reply_text("Inappropriate content detected.", parse_mode="Markdown")
-                    return
-            except Exception as e:
-                logger.error(f"NSFW detection failed: {e}")
+        image = await run_blocking(decode_image, image_bytes)
+    except Exception as e:
+        logger.error(f"Could not decode photo from {user.id}: {e}")
+        await update.message.reply_text("Could not read text from image. Please send a clear screenshot.")
+        return
+
+    # Same screenshot sent again: reuse the earlier verdicts instead of re-running NSFW/OCR
+    digest = slip_digest(image_bytes)
+    cached = await run_db(lookup_slip, digest) or {}
+    if cached:
+        logger.info(f"Slip cache hit for {user.id}: {digest[:12]}")
 
-        # 2. OCR & Payment Validation
+    # Recompressed/resized copy of an accepted slip? (only with SLIP_HASH_ACTION set)
+    phash = await run_blocking(slip_hash.slip_hash, image) if slip_hash.enabled() else None
+    reused = await run_db(slip_hash.find_reused_slip, phash) if phash is not None and not cached else None
+    if reused:
+        logger.warning(f"Slip from {user.id} looks like accepted transaction {reused}")
+        if slip_hash.SLIP_HASH_ACTION == 'reject':
+            await run_db(slip_files.record_file, photo.file_unique_id, slip_files.DUPLICATE, reused)
+            await update.message.reply_text(f"Transaction ID `{reused}` has already been used!", parse_mode="Markdown")
+            return
+
+    # 1. NSFW Detection and OCR, concurrently (OCR is cancelled if the photo is flagged)
+    is_nsfw = cached.get('nsfw_verdict')
+    if is_nsfw:
+        # Known NSFW image: its OCR was never run, and must not be now
+        await run_db(slip_files.record_file, photo.file_unique_id, slip_files.NSFW)
+        await update.message.reply_text("Inappropriate content detected.", parse_mode="Markdown")
+        return
+    detector = get_nsfw_detector() if is_nsfw is None else None
+    text_lines = cached.get('text_lines')
+    read = text_lines is None
+    if read:
+        cached = {}
+    work = asyncio.ensure_future(screen_and_read(image, detector, read))
+    if read:
         await update.message.reply_text("Verifying payment slip... (this may take a few seconds)")
+    try:
+        screened, ocr_lines = await work
+    except NSFWQueueFull as e:
+        # Fail closed: an unscreened photo goes no further
+        logger.warning(f"Slip from {user.id} rejected, NSFW screening busy: {e} {nsfw_service.metrics()}")
+        await update.message.reply_text("We're receiving a lot of payment slips right now. Please send your screenshot again in a minute.")
+        return
+    if screened is not None:
+        is_nsfw = screened
+        await run_db(store_slip, digest, nsfw_verdict=is_nsfw)
+    if is_nsfw:
+        await run_db(slip_files.record_file, photo.file_unique_id, slip_files.NSFW)
+        await update.message.reply_text("Inappropriate content detected.", parse_mode="Markdown")
+        return
+    if read:
+        text_lines = ocr_lines
+
+    # 2. Payment Validation
+    from services.payment_validator import payment_validator, InvalidReceiptError, TEST_SLIP_ID
+    from db.database import is_transaction_used, add_transaction
+
+    if not text_lines:
+        await update.message.reply_text("Could not read text from image. Please send a clear screenshot.")
+        return
         
-        from services.ocr_service import ocr_service
-        from services.payment_validator import payment_validator, InvalidReceiptError
-        from db.database import is_transaction_used, add_transaction
+    # Validate receipt
+    try:
+        data = cached.get('validated_data')
+        if data is None:
+            try:
+                data = payment_validator.validate_receipt(text_lines)
+            finally:
+                if not cached:
+                    await run_db(store_slip, digest, text_lines=text_lines, validated_data=data)
         
-        # Extract text
-        text_lines = ocr_service.extract_text(tmp_path)
+        if data['transaction_id'] == TEST_SLIP_ID:
+            await update.message.reply_text(
+                f"The Test Banking Slip is being utilized.\n"
+                f"Transaction ID: {data['transaction_id']}\n"
+                f"User: {user.username or user.first_name}"
+            )
+        else:
+            # Check for duplicates
+            if await run_db(is_transaction_used, data['transaction_id']):
+                await run_db(slip_files.record_file, photo.file_unique_id, slip_files.DUPLICATE, data['transaction_id'])
+                await update.message.reply_text(f"Transaction ID `{data['transaction_id']}` has already been used!", parse_mode="Markdown")
+                return
+                
+            # Check amount (allow small margin of error or exact match)
+            if data['amount'] < 3000:
+                await run_db(slip_files.record_file, photo.file_unique_id, slip_files.LOW_AMOUNT, data['transaction_id'], data['amount'])
+                await update.message.reply_text(f"Amount `{data['amount']}` is less than required 3,000 MMK.", parse_mode="Markdown")
+                return
+                
+            # Success! Record transaction
+            await run_db(add_transaction, user.id, data['provider'], data['transaction_id'], data['amount'])
+            if phash is not None:
+                await run_db(slip_hash.remember_slip, phash, data['transaction_id'])
+            await run_db(slip_files.record_file, photo.file_unique_id, slip_files.ACCEPTED, data['transaction_id'])
+            await update.message.reply_text(f"Payment Verified!\nProvider: {data['provider']}\nTID: `{data['transaction_id']}`", parse_mode="Markdown")
         
-        if not text_lines:
-            await update.message.reply_text("Could not read text from image. Please send a clear screenshot.")
-            return
-            
-        # Validate receipt
-        try:
-            data = payment_validator.validate_receipt(text_lines)
-            
-            TEST_SLIP_ID = "01003984021770423212"
-            
-            if data['transaction_id'] == TEST_SLIP_ID:
-                await update.message.reply_text(
-                    f"The Test Banking Slip is being utilized.\n"
-                    f"Transaction ID: {data['transaction_id']}\n"
-                    f"User: {user.username or user.first_name}"
-                )
-            else:
-                # Check for duplicates
-                if is_transaction_used(data['transaction_id']):
-                    await update.message.reply_text(f"Transaction ID `{data['transaction_id']}` has already been used!", parse_mode="Markdown")
-                    return
-                    
-                # Check amount (allow small margin of error or exact match)
-                if data['amount'] < 3000:
-                    await update.message.reply_text(f"Amount `{data['amount']}` is less than required 3,000 MMK.", parse_mode="Markdown")
-                    return
-                    
-                # Success! Record transaction
-                add_transaction(user.id, data['provider'], data['transaction_id'], data['amount'])
-                await update.message.reply_text(f"Payment Verified!\nProvider: {data['provider']}\nTID: `{data['transaction_id']}`", parse_mode="Markdown")
-            
-        except InvalidReceiptError as e:
-            await update.message.reply_text(f"Invalid Receipt: {str(e)}\n\nPlease make sure to upload a valid KBZ Pay or Wave Pay slip.")
-            return
-        except Exception as e:
-            logger.error(f"Validation error: {e}")
-            await update.message.reply_text("Error verifying receipt. Please contact support.")
-            return
-
-    finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    except InvalidReceiptError as e:
+        await run_db(slip_files.record_file, photo.file_unique_id, slip_files.INVALID, detail=str(e))
+        await update.message.reply_text(f"Invalid Receipt: {str(e)}\n\nPlease make sure to upload a valid KBZ Pay or Wave Pay slip.")
+        return
+    except Exception as e:
+        logger.error(f"Validation error: {e}")
+        await update.message.reply_text("Error verifying receipt. Please contact support.")
+        return
     
     # Key limit removed - users can buy as many keys as they want with valid payments
     # Each payment must be unique (no duplicate transaction IDs)
@@ -270,7 +315,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_uuid = str(uuid.uuid4())
     
     # Calculate key index for tagging
-    current_stats = get_user_stats(user.id)
+    current_stats = await run_db(get_user_stats, user.id)
     key_index = len(current_stats) + 1
     
     # Sanitize name for tag (remove special chars) with proper fallback
@@ -285,39 +330,30 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     # Ensure username is never None (use fallback for DB storage)
     db_username = user.username or user.first_name or f"User{user.id}"
     
+    # Speed limit: unlimited for VLESS, 12 Mbps for VLESS Limited and the rest (add_user's default)
+    limit_mbps = 0 if protocol == 'vless' else 12.0
+
     # Add to DB
-    if add_user(user_uuid, user.id, db_username, protocol, user.language_code, user.is_premium):
+    if await run_db(add_user, user_uuid, user.id, db_username, protocol, user.language_code, user.is_premium,
+                    speed_limit_mbps=limit_mbps):
         # Update Sing-Box config based on protocol
         try:
             if protocol == 'vless' or protocol == 'vless_limited':
-                from bot.config_manager import add_user_to_config
-                from db.database import get_db_connection
-                
-                # Determine limit based on protocol
-                limit_mbps = 0
-                if protocol == 'vless_limited':
-                    limit_mbps = 12.0
-                
-                # Update DB with limit (since add_user uses default)
-                conn = get_db_connection()
-                c = conn.cursor()
-                c.execute("UPDATE users SET speed_limit_mbps = ? WHERE uuid = ?", (limit_mbps, user_uuid))
-                conn.commit()
-                conn.close()
-                
-                add_user_to_config(user_uuid, key_tag, limit_mbps)
+                from bot.config_queue import add_user_to_config
+                await asyncio.wrap_future(add_user_to_config(user_uuid, key_tag, limit_mbps))
             elif protocol == 'tuic':
-                from bot.config_manager import add_tuic_user
-                add_tuic_user(user_uuid, key_tag)
+                from bot.config_queue import add_tuic_user
+                await asyncio.wrap_future(add_tuic_user(user_uuid, key_tag))
             elif protocol == 'vlessplain':
-                from bot.config_manager import add_vless_plain_user
-                add_vless_plain_user(user_uuid, key_tag)
+                from bot.config_queue import add_vless_plain_user
+                await asyncio.wrap_future(add_vless_plain_user(user_uuid, key_tag))
             elif protocol == 'ss':
-                from bot.config_manager import add_ss_user
-                add_ss_user(user_uuid, key_tag)
+                from bot.config_queue import add_ss_user
+                await asyncio.wrap_future(add_ss_user(user_uuid, key_tag))
             elif protocol == 'admin_tuic':
                 from bot.config_manager import add_admin_tuic_user
-                add_admin_tuic_user(user_uuid, key_tag)
+                # Writes /etc/tuic/server.json and restarts tuic
+                await run_blocking(add_admin_tuic_user, user_uuid, key_tag)
             # SS Legacy uses shared password, no config update needed
         except Exception as e:
             logger.error(f"Failed to update config for {protocol}: {e}")
@@ -357,16 +393,6 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             vpn_link = f"vless://{user_uuid}@{SERVER_IP}:{SERVER_PORT}?security=reality&encryption=none&pbk={PUBLIC_KEY}&fp=randomized&type=tcp&flow=xtls-rprx-vision&sni={SERVER_NAME}&sid={SHORT_ID}#{key_tag}"
             protocol_name = "VLESS+REALITY"
         
-        # Generate QR Code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(vpn_link)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        bio = io.BytesIO()
-        img.save(bio)
-        bio.seek(0)
-        
         # Create Deep Link
         import urllib.parse
         encoded_link = urllib.parse.quote(vpn_link)
@@ -382,7 +408,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             f"[Tip] Only use on 1 device!",
             parse_mode="Markdown"
         )
-        await update.message.reply_photo(bio, caption="Scan this QR to import", reply_markup=reply_markup)
+        await send_qr(update.message, vpn_link, caption="Scan this QR to import", reply_markup=reply_markup)
         
     else:
         await update.message.reply_text("[X] Error generating key. Please contact support.")
@@ -400,7 +426,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /status command to show user stats."""
     user = update.effective_user
-    stats = get_user_stats(user.id)
+    stats = await run_db(get_user_stats, user.id)
     
     # Check if called from callback or command
     if update.callback_query:
@@ -0,0 +1,98 @@
+"""
+QR codes for VPN links, sent to Telegram at most once per link.
+
+The first send of a link renders the QR PNG (services.qr_render, on its
+thread pool) and uploads it. Telegram's file_id for the uploaded photo is
+stored in the qr_files table, keyed by the SHA-256 of the link (the link
+itself holds the key's UUID and is not stored). Later sends of the same link
+reuse the file_id: no rendering and no upload.
+
+Rendered PNGs are also kept in an in-process LRU (QR_PNG_CACHE_SIZE entries,
+default: 256), touched only from the event loop. It is used when a file_id
+is missing or Telegram rejects it.
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+try:
+    from ..db.database import get_qr_file_id, put_qr_file_id, delete_qr_file_id
+    from ..db.aio import run_db
+    from ..services.qr_render import render_png_async
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import get_qr_file_id, put_qr_file_id, delete_qr_file_id
+    from db.aio import run_db
+    from services.qr_render import render_png_async
+
+logger = logging.getLogger(__name__)
+
+QR_PNG_CACHE_SIZE = int(os.getenv("QR_PNG_CACHE_SIZE", "256"))
+
+_png_cache = OrderedDict()
+
+
+def link_hash(vpn_link):
+    """Hex SHA-256 of a VPN link."""
+    return hashlib.sha256(vpn_link.encode()).hexdigest()
+
+
+async def get_qr_png(vpn_link):
+    """QR code PNG bytes for a link, from the LRU or rendered off the event loop."""
+    key = link_hash(vpn_link)
+    png = _png_cache.get(key)
+    if png is not None:
+        _png_cache.move_to_end(key)
+        return png
+    png = await render_png_async(vpn_link)
+    if QR_PNG_CACHE_SIZE > 0:
+        _png_cache[key] = png
+        while len(_png_cache) > QR_PNG_CACHE_SIZE:
+            _png_cache.popitem(last=False)
+    return png
+
+
+def clear_png_cache():
+    _png_cache.clear()
+
+
+async def send_qr(message, vpn_link, **kwargs):
+    """
+    Reply to a message with the QR code for a VPN link.
+
+    Args:
+        message: telegram.Message to reply to
+        vpn_link: Link encoded in the QR code
+        **kwargs: Passed on to reply_photo (caption, reply_markup, ...)
+
+    Returns:
+        telegram.Message: The sent photo message
+    """
+    key = link_hash(vpn_link)
+    try:
+        file_id = await run_db(get_qr_file_id, key)
+    except Exception as e:
+        logger.error(f"QR file_id lookup failed: {e}")
+        file_id = None
+
+    if file_id:
+        try:
+            return await message.reply_photo(file_id, **kwargs)
+        except BadRequest as e:
+            # File expired or belongs to another bot token; upload again
+            logger.warning(f"Cached QR file_id rejected ({e}); re-uploading")
+            try:
+                await run_db(delete_qr_file_id, key)
+            except Exception as e:
+                logger.error(f"QR file_id delete failed: {e}")
+
+    sent = await message.reply_photo(await get_qr_png(vpn_link), **kwargs)
+    if sent and sent.photo:
+        try:
+            await run_db(put_qr_file_id, key, sent.photo[-1].file_id)
+        except Exception as e:
+            logger.error(f"QR file_id store failed: {e}")
+    return sent
@@ -0,0 +1,178 @@
+"""
+Declarative DB -> sing-box reconciler.
+
+The database says which keys should be live. A key is live if its users row
+is active and its vpn_keys row, if there is one, is active too.
+reconcile() works out the user set each managed inbound should have and
+diffs it against config.json with set operations. It applies only the delta,
+in one locked read-modify-write with one save and one reload. Nothing is
+written or reloaded when the config is already in sync.
+
+    protocol        inbound tag
+    vless           vless-in
+    vless_limited   vless-limited-in
+    ss              ss-in (the key UUID is the password)
+    tuic            tuic-in
+    admin_tuic      tuic-in
+    vlessplain      vless-plain-in
+    ss_legacy       - (shared password, nothing per key)
+
+Users in a managed inbound that the database does not want are removed,
+unless keep_extra is set. Inbounds outside the table are never touched.
+
+Used by scripts/reconcile_config.py (--dry-run prints the plan), and by
+sync_users.py, sync_keys_to_config.py and audit_keys.py.
+"""
+import logging
+
+try:
+    from ..db.database import get_provisioned_keys
+    from .config_manager import FileLock, load_config, save_model, reload_service
+    from .config_model import SingboxConfig
+    from .live_users import apply_live
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import get_provisioned_keys
+    from bot.config_manager import FileLock, load_config, save_model, reload_service
+    from bot.config_model import SingboxConfig
+    from bot.live_users import apply_live
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_TAGS = {
+    'vless': 'vless-in',
+    'vless_limited': 'vless-limited-in',
+    'ss': 'ss-in',
+    'tuic': 'tuic-in',
+    'admin_tuic': 'tuic-in',
+    'vlessplain': 'vless-plain-in',
+}
+MANAGED_TAGS = ('vless-in', 'vless-limited-in', 'ss-in', 'tuic-in', 'vless-plain-in')
+# Inbounds whose users are tracked by the v2ray_api stats service
+STATS_TAGS = ('vless-in', 'vless-limited-in')
+
+
+def user_entry(tag, key, name):
+    """The config entry for a key, as config_manager adds it."""
+    if tag == 'ss-in':
+        return {"password": key, "name": name}
+    if tag == 'tuic-in':
+        return {"uuid": key, "password": key, "name": name}
+    if tag == 'vless-plain-in':
+        return {"uuid": key, "name": name}
+    return {"uuid": key, "flow": "xtls-rprx-vision", "name": name}
+
+
+class ReconcilePlan:
+    """The delta between the database and the config."""
+
+    def __init__(self):
+        self.adds = {}              # tag -> [user entry]
+        self.removes = {}           # tag -> [key]
+        self.missing_inbounds = {}  # tag -> wanted key count, for tags absent from the config
+        self.applied = False
+
+    @property
+    def empty(self):
+        return not any(self.adds.values()) and not any(self.removes.values())
+
+    def counts(self):
+        """{tag: (adds, removes)} for tags with changes."""
+        return {tag: (len(self.adds.get(tag, [])), len(self.removes.get(tag, [])))
+                for tag in MANAGED_TAGS
+                if self.adds.get(tag) or self.removes.get(tag)}
+
+    def describe(self, verbose=False):
+        """Human-readable plan."""
+        lines = []
+        for tag, count in self.missing_inbounds.items():
+            lines.append(f"! {tag}: not in config, {count} keys cannot be provisioned")
+        for tag, (added, removed) in self.counts().items():
+            lines.append(f"{tag}: +{added} -{removed}")
+            if verbose:
+                lines.extend(f"  + {user.get('uuid') or user.get('password')} {user['name']}"
+                             for user in self.adds.get(tag, []))
+                lines.extend(f"  - {key}" for key in self.removes.get(tag, []))
+        if self.empty:
+            lines.append("In sync, nothing to do.")
+        return '\n'.join(lines)
+
+
+def compute_plan(config, keys, keep_extra=False):
+    """
+    Diff the wanted keys against a config.
+
+    Args:
+        config: SingboxConfig
+        keys: (uuid, protocol, username, telegram_id) rows (get_provisioned_keys)
+        keep_extra: Do not remove config users the database does not want
+
+    Returns:
+        ReconcilePlan
+    """
+    # tag -> key -> name, in DB order
+    desired = {tag: {} for tag in MANAGED_TAGS}
+    for uuid, protocol, username, telegram_id in keys:
+        tag = PROTOCOL_TAGS.get(protocol)
+        if tag is not None:
+            desired[tag][uuid] = username or f"User{telegram_id}"
+
+    plan = ReconcilePlan()
+    for tag, wanted in desired.items():
+        inbound = config.inbound(tag)
+        if inbound is None:
+            if wanted:
+                plan.missing_inbounds[tag] = len(wanted)
+            continue
+        current = inbound.users
+        plan.adds[tag] = [user_entry(tag, key, name) for key, name in wanted.items() if key not in current]
+        if not keep_extra:
+            plan.removes[tag] = [key for key in current if key not in wanted]
+    return plan
+
+
+def apply_plan(config, plan):
+    """Apply a plan to a SingboxConfig in memory."""
+    for tag, keys in plan.removes.items():
+        for key in keys:
+            config.remove_user(tag, key)
+    for tag, users in plan.adds.items():
+        for user in users:
+            config.add_user(tag, user)
+            if tag in STATS_TAGS:
+                config.add_stats_user(user['uuid'])
+    # Revoked keys leave the stats list too, unless another stats inbound
+    # still holds them (a move between vless-in and vless-limited-in)
+    for tag in STATS_TAGS:
+        for key in plan.removes.get(tag, []):
+            if not any(config.has_user(t, key) for t in STATS_TAGS):
+                config.remove_stats_user(key)
+
+
+def reconcile(dry_run=False, keep_extra=False, keys=None):
+    """
+    Bring config.json in line with the database.
+
+    Args:
+        dry_run: Only compute the plan
+        keep_extra: Do not remove config users the database does not want
+        keys: Rows as returned by get_provisioned_keys (default: query the DB)
+
+    Returns:
+        ReconcilePlan: applied is True if the config was written and reloaded
+        (or the delta applied live, see live_users)
+    """
+    if keys is None:
+        keys = get_provisioned_keys()
+    with FileLock():
+        config = SingboxConfig(load_config())
+        plan = compute_plan(config, keys, keep_extra)
+        if dry_run or plan.empty:
+            return plan
+        apply_plan(config, plan)
+        save_model(config)
+    logger.info(f"Reconciled config: {plan.counts()}")
+    if not apply_live(config):
+        reload_service()
+    plan.applied = True
+    return plan
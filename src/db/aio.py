@@ -0,0 +1,48 @@
+"""
+Async access to the blocking database layer.
+
+Runs database functions on a small, bounded thread pool so async callers
+(the FastAPI handlers, the bot) never block their event loop on SQLite.
+Each worker thread keeps its own pooled connection (see db.pool), so the
+pool size also bounds the number of open connections.
+
+    from src.db.aio import run_db
+    user = await run_db(get_user, uuid)
+
+Pool size: DB_EXECUTOR_WORKERS (default: 4).
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """Return the process-wide database executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database function on the database executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_db_executor(wait=True):
+    """Stop the database executor (application shutdown / tests)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
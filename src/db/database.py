@@ -1,152 +1,38 @@
 import sqlite3
 import datetime
+import json
 import os
 
+try:
+    from .pool import get_connection
+    from .migrations import migrate
+except ImportError:
+    # Run directly as a script (python src/db/database.py)
+    from pool import get_connection
+    from migrations import migrate
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'vpn_bot.db')
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    Get this thread's pooled connection to DB_PATH.
 
-def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Users table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            uuid TEXT PRIMARY KEY,
-            telegram_id INTEGER,
-            username TEXT,
-            protocol TEXT DEFAULT 'ss',
-            expiry_date TIMESTAMP,
-            data_limit_gb REAL DEFAULT 5.0,
-            speed_limit_mbps REAL DEFAULT 12.0,
-            is_active BOOLEAN DEFAULT 1,
-            language_code TEXT,
-            is_premium BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migration: Add protocol column if it doesn't exist (for existing databases)
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN protocol TEXT DEFAULT 'ss'")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Migration: Add language_code column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN language_code TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Migration: Add is_premium column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN is_premium BOOLEAN DEFAULT 0")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
+    The connection is persistent; calling close() on it only releases it
+    (rolling back anything left uncommitted) so the next call can reuse it.
+    """
+    return get_connection(DB_PATH)
 
-    # Migration: Add email column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN email TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Migration: Add grace_period_start for 24-hour grace period tracking
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN grace_period_start TIMESTAMP")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Migration: Add expiry_reason to track why a key expired
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN expiry_reason TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Migration: Add expired_at timestamp
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN expired_at TIMESTAMP")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Migration: Add data_warnings_sent to track which warning thresholds were triggered
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN data_warnings_sent TEXT DEFAULT ''")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
+def init_db():
+    """
+    Bring the schema up to date via the versioned migrations.
 
-    # Migration: Add phone column for SIM-based login
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN phone TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Usage logs table (daily usage)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS usage_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            uuid TEXT,
-            date DATE,
-            bytes_used INTEGER DEFAULT 0,
-            FOREIGN KEY (uuid) REFERENCES users (uuid),
-            UNIQUE(uuid, date)
-        )
-    ''')
-    
-    # Payment transactions table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS payment_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            provider TEXT,
-            transaction_id TEXT UNIQUE,
-            amount REAL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # VPN Keys table (for auto-provisioning)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS vpn_keys (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_uuid TEXT,
-            key_name TEXT,
-            protocol TEXT,
-            server_address TEXT,
-            server_port INTEGER,
-            key_uuid TEXT,
-            key_password TEXT,
-            config_link TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
+    An up-to-date database costs a single PRAGMA user_version read.
+    """
+    conn = get_db_connection()
+    applied = migrate(conn)
     conn.close()
+    for version, description in applied:
+        print(f"Applied migration {version}: {description}")
 
 def add_transaction(user_id, provider, transaction_id, amount, status='approved'):
     conn = get_db_connection()
@@ -204,6 +90,25 @@ def get_user_by_phone(phone):
     conn.close()
     return user
 
+def get_active_daily_usage(date=None):
+    """
+    Daily usage of every active user in one query (the watchdog's per-cycle read).
+
+    Returns:
+        dict: {uuid: bytes_used}; users without a usage row map to 0
+    """
+    if date is None:
+        date = datetime.date.today()
+
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT u.uuid, COALESCE(l.bytes_used, 0) FROM users u
+        LEFT JOIN usage_logs l ON l.uuid = u.uuid AND l.date = ?
+        WHERE u.is_active = 1
+    ''', (date,)).fetchall()
+    conn.close()
+    return {uuid: bytes_used for uuid, bytes_used in rows}
+
 def get_all_users():
     """Get all registered users."""
     conn = get_db_connection()
@@ -392,32 +297,79 @@ def deactivate_user(uuid):
     conn.close()
     return True
 
+# Every key of a Telegram user joined with that key's usage for one day.
+# ORDER BY rowid keeps key numbering stable now that telegram_id is indexed.
+USER_STATS_QUERY = '''
+    SELECT u.uuid,
+           COALESCE(NULLIF(u.protocol, ''), 'ss') AS protocol,
+           u.is_active,
+           u.data_limit_gb,
+           COALESCE(l.bytes_used, 0) AS daily_usage_bytes,
+           u.expiry_date
+    FROM users u
+    LEFT JOIN usage_logs l ON l.uuid = u.uuid AND l.date = ?
+    WHERE u.telegram_id = ?
+    ORDER BY u.rowid
+'''
+
+def query_user_stats(conn, telegram_id, date=None):
+    """
+    Run USER_STATS_QUERY on an existing connection.
+
+    Args:
+        conn: sqlite3 connection
+        telegram_id: Telegram user ID
+        date: Usage day (defaults to today)
+
+    Returns:
+        list: sqlite3.Row per key with uuid, protocol, is_active,
+        data_limit_gb, daily_usage_bytes and expiry_date
+    """
+    if date is None:
+        date = datetime.date.today()
+    return conn.execute(USER_STATS_QUERY, (date, telegram_id)).fetchall()
+
 def get_user_stats(telegram_id):
     """Get detailed stats for all keys of a Telegram user."""
     conn = get_db_connection()
-    users = conn.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,)).fetchall()
-    
-    stats = []
-    for user in users:
-        uuid = user['uuid']
-        daily_usage = get_daily_usage(uuid)
-        
-        # Handle protocol column safely (might not exist in older databases)
-        try:
-            protocol = user['protocol'] if user['protocol'] else 'ss'
-        except (KeyError, IndexError):
-            protocol = 'ss'  # Default to ss for backward compatibility
-        
-        stats.append({
-            'uuid': uuid,
-            'protocol': protocol,
-            'is_active': user['is_active'],
-            'data_limit_gb': user['data_limit_gb'],
-            'daily_usage_bytes': daily_usage,
-            'expiry_date': user['expiry_date']
-        })
+    rows = query_user_stats(conn, telegram_id)
     conn.close()
-    return stats
+    return [dict(row) for row in rows]
+
+# Aggregate usage, limits and expiry across an account's active keys
+# (vpn_keys rows linked to an account UUID) plus the newest key's protocol.
+ACCOUNT_USAGE_QUERY = '''
+    SELECT COUNT(k.id) AS key_count,
+           COALESCE(SUM(l.bytes_used), 0) AS daily_usage_bytes,
+           COALESCE(SUM(u.data_limit_gb), 0) AS data_limit_gb,
+           MAX(k.expires_at) AS max_expires_at,
+           (SELECT protocol FROM vpn_keys
+            WHERE user_uuid = ? AND is_active = 1
+            ORDER BY id DESC LIMIT 1) AS latest_protocol
+    FROM vpn_keys k
+    LEFT JOIN users u ON u.uuid = k.key_uuid
+    LEFT JOIN usage_logs l ON l.uuid = k.key_uuid AND l.date = ?
+    WHERE k.user_uuid = ? AND k.is_active = 1
+'''
+
+def get_account_usage(user_uuid, date=None):
+    """
+    Summarise an account's active keys in one query.
+
+    Args:
+        user_uuid: Account UUID the vpn_keys rows are linked to
+        date: Usage day (defaults to today)
+
+    Returns:
+        dict: key_count, daily_usage_bytes, data_limit_gb, max_expires_at
+        and latest_protocol (None values when the account has no keys)
+    """
+    if date is None:
+        date = datetime.date.today()
+    conn = get_db_connection()
+    row = conn.execute(ACCOUNT_USAGE_QUERY, (user_uuid, date, user_uuid)).fetchone()
+    conn.close()
+    return dict(row)
 
 def update_usage(uuid, bytes_added, date=None):
     if date is None:
@@ -442,6 +394,36 @@ def update_usage(uuid, bytes_added, date=None):
     conn.commit()
     conn.close()
 
+def update_usage_batch(usage, date=None):
+    """
+    Add a whole cycle's traffic deltas to the daily usage logs in one transaction.
+
+    Args:
+        usage: Dict of {uuid: bytes_added}; zero and negative deltas are skipped
+        date: Day to record against (fixed once for the whole batch, defaults to today)
+
+    Returns:
+        int: Number of users whose usage was updated
+    """
+    if date is None:
+        date = datetime.date.today()
+
+    rows = [(uuid, date, bytes_added) for uuid, bytes_added in usage.items() if bytes_added > 0]
+    if not rows:
+        return 0
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO usage_logs (uuid, date, bytes_used)
+                VALUES (?, ?, ?)
+                ON CONFLICT(uuid, date) DO UPDATE SET bytes_used = bytes_used + excluded.bytes_used
+            ''', rows)
+    finally:
+        conn.close()
+    return len(rows)
+
 def get_daily_usage(uuid, date=None):
     if date is None:
         date = datetime.date.today()
@@ -484,6 +466,273 @@ def activate_user(uuid):
     conn.close()
     return True
 
+# Payment job states; queued and provisioning are unfinished
+PAYMENT_JOB_UNFINISHED = ('queued', 'provisioning')
+
+def create_payment_job(job_id, user_uuid, protocol):
+    """Record a newly submitted payment verification job."""
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO payment_jobs (id, user_uuid, protocol, status)
+        VALUES (?, ?, ?, 'queued')
+    ''', (job_id, user_uuid, protocol))
+    conn.commit()
+    conn.close()
+
+def update_payment_job(job_id, status, result=None, error=None, error_code=None):
+    """
+    Move a payment job to a new state.
+
+    Args:
+        job_id: Job ID
+        status: 'queued', 'provisioning', 'succeeded' or 'failed'
+        result: JSON-serialisable result for succeeded jobs
+        error: Error message for failed jobs
+        error_code: HTTP status matching the error (e.g. 400 for a bad slip)
+    """
+    conn = get_db_connection()
+    conn.execute('''
+        UPDATE payment_jobs
+        SET status = ?, result = ?, error = ?, error_code = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (status, json.dumps(result) if result is not None else None, error, error_code, job_id))
+    conn.commit()
+    conn.close()
+
+def get_payment_job(job_id):
+    """
+    Get a payment job.
+
+    Returns:
+        dict: Job row with result decoded from JSON, or None if not found
+    """
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM payment_jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def fail_unfinished_payment_jobs(error='Interrupted by a server restart, please resubmit the slip'):
+    """
+    Mark jobs left queued/provisioning by a previous process as failed.
+
+    The uploaded slip only lives in memory, so these jobs cannot be resumed.
+
+    Returns:
+        int: Number of jobs marked failed
+    """
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        UPDATE payment_jobs
+        SET status = 'failed', error = ?, error_code = 503, updated_at = CURRENT_TIMESTAMP
+        WHERE status IN (?, ?)
+    ''', (error, *PAYMENT_JOB_UNFINISHED))
+    conn.commit()
+    count = cursor.rowcount
+    conn.close()
+    return count
+
+def get_provisioned_keys():
+    """
+    Get every key that should be live in sing-box: active users rows whose
+    vpn_keys row (if any) is active too.
+
+    Returns:
+        list: (uuid, protocol, username, telegram_id) tuples
+    """
+    conn = get_db_connection()
+    # Plain tuples: sqlite3.Row costs more than the query itself at 100k rows
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute('''
+        SELECT u.uuid, u.protocol, u.username, u.telegram_id FROM users u
+        WHERE u.is_active = 1
+        AND NOT EXISTS (SELECT 1 FROM vpn_keys k WHERE k.key_uuid = u.uuid AND k.is_active = 0)
+    ''').fetchall()
+    conn.close()
+    return rows
+
+def iter_provisioned_keys(protocol, batch_size=1000):
+    """
+    Stream the provisioned keys (see get_provisioned_keys) of one protocol.
+
+    Args:
+        protocol: users.protocol value
+        batch_size: Rows per fetchmany
+
+    Yields:
+        list: Batches of (uuid, username, telegram_id) tuples
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    try:
+        cursor.execute('''
+            SELECT u.uuid, u.username, u.telegram_id FROM users u
+            WHERE u.is_active = 1 AND u.protocol = ?
+            AND NOT EXISTS (SELECT 1 FROM vpn_keys k WHERE k.key_uuid = u.uuid AND k.is_active = 0)
+        ''', (protocol,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_slip_cache_entry(sha256, min_created_at):
+    """
+    Get a cached slip result.
+
+    Args:
+        sha256: Hex SHA-256 of the uploaded image
+        min_created_at: Unix time; older entries are treated as expired
+
+    Returns:
+        dict: 'nsfw_verdict' (True/False/None if unchecked), 'text_lines'
+        (list or None), 'validated_data' (dict or None), or None on a miss
+    """
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT * FROM slip_cache WHERE sha256 = ? AND created_at >= ?', (sha256, min_created_at)
+    ).fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {
+        'nsfw_verdict': None if row['nsfw_verdict'] is None else bool(row['nsfw_verdict']),
+        'text_lines': json.loads(row['text_lines']) if row['text_lines'] is not None else None,
+        'validated_data': json.loads(row['validated_data']) if row['validated_data'] else None,
+    }
+
+def put_slip_cache_entry(sha256, created_at, nsfw_verdict=None, text_lines=None, validated_data=None):
+    """
+    Cache what was learned about a slip. Fields passed as None keep any value
+    already cached (e.g. the bot adding an NSFW verdict to an API OCR result).
+    """
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO slip_cache (sha256, nsfw_verdict, text_lines, validated_data, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(sha256) DO UPDATE SET
+            nsfw_verdict = COALESCE(excluded.nsfw_verdict, nsfw_verdict),
+            text_lines = COALESCE(excluded.text_lines, text_lines),
+            validated_data = COALESCE(excluded.validated_data, validated_data)
+    ''', (
+        sha256, nsfw_verdict,
+        json.dumps(text_lines) if text_lines is not None else None,
+        json.dumps(validated_data) if validated_data is not None else None,
+        created_at
+    ))
+    conn.commit()
+    conn.close()
+
+def evict_slip_cache(min_created_at):
+    """
+    Delete cached slips created before min_created_at.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    conn = get_db_connection()
+    cursor = conn.execute('DELETE FROM slip_cache WHERE created_at < ?', (min_created_at,))
+    conn.commit()
+    count = cursor.rowcount
+    conn.close()
+    return count
+
+def add_slip_hash(transaction_id, phash):
+    """Store the perceptual hash (bytes) of an accepted slip."""
+    conn = get_db_connection()
+    conn.execute('INSERT INTO slip_hashes (transaction_id, phash) VALUES (?, ?)', (transaction_id, phash))
+    conn.commit()
+    conn.close()
+
+def get_slip_hashes(after_id=0):
+    """
+    Get stored slip hashes in insertion order.
+
+    Args:
+        after_id: Only return rows with a greater id (for incremental loading)
+
+    Returns:
+        list: (id, transaction_id, phash) tuples
+    """
+    conn = get_db_connection()
+    rows = conn.execute(
+        'SELECT id, transaction_id, phash FROM slip_hashes WHERE id > ? ORDER BY id', (after_id,)
+    ).fetchall()
+    conn.close()
+    return [tuple(row) for row in rows]
+
+def get_slip_file(file_unique_id, now):
+    """
+    Get the recorded verification outcome of a Telegram photo.
+
+    Args:
+        file_unique_id: Telegram file_unique_id of the photo
+        now: Unix time; outcomes that expired before it are ignored
+
+    Returns:
+        dict: 'outcome', 'transaction_id', 'detail', or None if unseen or expired
+    """
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT outcome, transaction_id, detail FROM slip_files
+        WHERE file_unique_id = ? AND (expires_at IS NULL OR expires_at >= ?)
+    ''', (file_unique_id, now)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def put_slip_file(file_unique_id, outcome, transaction_id=None, detail=None, expires_at=None):
+    """Record (or replace) the verification outcome of a Telegram photo; expires_at None keeps it forever."""
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO slip_files (file_unique_id, outcome, transaction_id, detail, expires_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (file_unique_id, outcome, transaction_id, detail, expires_at))
+    conn.commit()
+    conn.close()
+
+def evict_slip_files(now):
+    """
+    Delete recorded outcomes that expired before now.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    conn = get_db_connection()
+    cursor = conn.execute('DELETE FROM slip_files WHERE expires_at < ?', (now,))
+    conn.commit()
+    count = cursor.rowcount
+    conn.close()
+    return count
+
+def get_qr_file_id(link_hash):
+    """Get the Telegram file_id of an uploaded QR code, or None."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT file_id FROM qr_files WHERE link_hash = ?', (link_hash,)).fetchone()
+    conn.close()
+    return row['file_id'] if row else None
+
+def put_qr_file_id(link_hash, file_id):
+    """Remember the Telegram file_id of an uploaded QR code."""
+    conn = get_db_connection()
+    conn.execute('INSERT OR REPLACE INTO qr_files (link_hash, file_id) VALUES (?, ?)', (link_hash, file_id))
+    conn.commit()
+    conn.close()
+
+def delete_qr_file_id(link_hash):
+    """Forget a QR code file_id that Telegram no longer accepts."""
+    conn = get_db_connection()
+    conn.execute('DELETE FROM qr_files WHERE link_hash = ?', (link_hash,))
+    conn.commit()
+    conn.close()
+
 if __name__ == '__main__':
     init_db()
     print("Database initialized.")
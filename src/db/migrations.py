@@ -0,0 +1,299 @@
+"""
+Versioned schema migrations keyed on PRAGMA user_version.
+
+Each migration is an ordered, idempotent step. migrate() applies every step
+newer than the database's user_version in a single transaction and bumps the
+version as it goes, so an up-to-date database costs one PRAGMA read.
+
+CLI:
+    python3 src/db/migrations.py status [--db PATH]    # show current version and pending steps
+    python3 src/db/migrations.py upgrade [--db PATH]   # apply pending steps
+"""
+import argparse
+import os
+import sys
+
+try:
+    from .pool import get_connection
+except ImportError:
+    # Run directly as a script (python src/db/migrations.py)
+    from pool import get_connection
+
+
+# Columns added to users after the original schema, in the order they shipped
+USERS_ADDED_COLUMNS = [
+    ('protocol', "TEXT DEFAULT 'ss'"),
+    ('language_code', 'TEXT'),
+    ('is_premium', 'BOOLEAN DEFAULT 0'),
+    ('email', 'TEXT'),
+    ('grace_period_start', 'TIMESTAMP'),     # 24-hour grace period tracking
+    ('expiry_reason', 'TEXT'),               # Why a key expired
+    ('expired_at', 'TIMESTAMP'),
+    ('data_warnings_sent', "TEXT DEFAULT ''"),  # Warning thresholds already triggered
+    ('phone', 'TEXT'),                       # SIM-based login
+]
+
+# Secondary indexes backing the hot lookups (name, CREATE statement).
+# Keep in sync with the WHERE clauses in database.py and src/api/server.py;
+# scripts/check_query_plans.py fails if a query falls back to a table scan.
+INDEXES = [
+    # get_user_stats, get_active_key_count (telegram_id = ? [AND is_active = 1])
+    ('idx_users_telegram_id', 'CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users (telegram_id, is_active)'),
+    # get_user_by_email, Google login
+    ('idx_users_email', 'CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)'),
+    # get_user_by_phone, phone login
+    ('idx_users_phone', 'CREATE INDEX IF NOT EXISTS idx_users_phone ON users (phone)'),
+    # get_active_users, watchdog active user scan
+    ('idx_users_is_active', 'CREATE INDEX IF NOT EXISTS idx_users_is_active ON users (is_active)'),
+    # API key listing and status aggregation (user_uuid = ? AND is_active = 1)
+    ('idx_vpn_keys_user_active', 'CREATE INDEX IF NOT EXISTS idx_vpn_keys_user_active ON vpn_keys (user_uuid, is_active)'),
+    # Key lookups by the key's own UUID
+    ('idx_vpn_keys_key_uuid', 'CREATE INDEX IF NOT EXISTS idx_vpn_keys_key_uuid ON vpn_keys (key_uuid)'),
+]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def create_base_tables(conn):
+    # Users table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            uuid TEXT PRIMARY KEY,
+            telegram_id INTEGER,
+            username TEXT,
+            protocol TEXT DEFAULT 'ss',
+            expiry_date TIMESTAMP,
+            data_limit_gb REAL DEFAULT 5.0,
+            speed_limit_mbps REAL DEFAULT 12.0,
+            is_active BOOLEAN DEFAULT 1,
+            language_code TEXT,
+            is_premium BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Usage logs table (daily usage)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usage_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uuid TEXT,
+            date DATE,
+            bytes_used INTEGER DEFAULT 0,
+            FOREIGN KEY (uuid) REFERENCES users (uuid),
+            UNIQUE(uuid, date)
+        )
+    ''')
+
+    # Payment transactions table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payment_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            provider TEXT,
+            transaction_id TEXT UNIQUE,
+            amount REAL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # VPN Keys table (for auto-provisioning)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS vpn_keys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_uuid TEXT,
+            key_name TEXT,
+            protocol TEXT,
+            server_address TEXT,
+            server_port INTEGER,
+            key_uuid TEXT,
+            key_password TEXT,
+            config_link TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+
+
+def add_users_columns(conn):
+    existing = _columns(conn, 'users')
+    for name, definition in USERS_ADDED_COLUMNS:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE users ADD COLUMN {name} {definition}')
+
+
+def create_indexes(conn):
+    for _name, create_sql in INDEXES:
+        conn.execute(create_sql)
+
+
+def create_payment_jobs(conn):
+    # Background payment verifications (src/services/ocr_jobs.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payment_jobs (
+            id TEXT PRIMARY KEY,
+            user_uuid TEXT,
+            protocol TEXT,
+            status TEXT DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            error_code INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Startup recovery looks up unfinished jobs
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payment_jobs_status ON payment_jobs (status)')
+
+
+def create_slip_cache(conn):
+    # OCR/NSFW results keyed by the SHA-256 of the uploaded image (src/services/slip_cache.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slip_cache (
+            sha256 TEXT PRIMARY KEY,
+            nsfw_verdict BOOLEAN,
+            text_lines TEXT,
+            validated_data TEXT,
+            created_at REAL
+        )
+    ''')
+    # TTL eviction
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_slip_cache_created_at ON slip_cache (created_at)')
+
+
+def create_slip_hashes(conn):
+    # Perceptual hashes of accepted slips (src/services/slip_hash.py); loaded
+    # incrementally by id, so AUTOINCREMENT keeps ids increasing
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slip_hashes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT,
+            phash BLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def create_slip_files(conn):
+    # Verification outcome per Telegram file_unique_id (src/services/slip_files.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slip_files (
+            file_unique_id TEXT PRIMARY KEY,
+            outcome TEXT,
+            transaction_id TEXT,
+            detail TEXT,
+            expires_at REAL
+        )
+    ''')
+    # Eviction; final outcomes never expire (NULL)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_slip_files_expires_at ON slip_files (expires_at)')
+
+
+def create_active_protocol_index(conn):
+    # iter_provisioned_keys, one protocol's active keys per config_stream array
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_active_protocol ON users (is_active, protocol)')
+
+
+def create_qr_files(conn):
+    # Telegram file_id of each uploaded QR code, keyed by SHA-256 of the link (src/bot/qr_cache.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS qr_files (
+            link_hash TEXT PRIMARY KEY,
+            file_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# Ordered list of (version, description, step). Append only; never renumber.
+MIGRATIONS = [
+    (1, 'Create base tables', create_base_tables),
+    (2, 'Add users columns (protocol ... phone)', add_users_columns),
+    (3, 'Create lookup indexes', create_indexes),
+    (4, 'Create payment_jobs table', create_payment_jobs),
+    (5, 'Create slip_cache table', create_slip_cache),
+    (6, 'Create slip_hashes table', create_slip_hashes),
+    (7, 'Create slip_files table', create_slip_files),
+    (8, 'Create qr_files table', create_qr_files),
+    (9, 'Create idx_users_active_protocol', create_active_protocol_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def pending_migrations(conn):
+    """Return the (version, description, step) entries not yet applied."""
+    current = get_version(conn)
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def migrate(conn):
+    """
+    Apply all pending migrations in one transaction.
+
+    Args:
+        conn: sqlite3 connection (not inside a transaction)
+
+    Returns:
+        list: (version, description) of the steps applied; empty if up to date
+    """
+    if get_version(conn) >= LATEST_VERSION:
+        return []
+
+    # Take the write lock up front, then re-check: another process (bot, API,
+    # watchdog) may have finished the same migration while we waited.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = get_version(conn)
+        applied = []
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            applied.append((version, description))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or apply database schema migrations.")
+    parser.add_argument('command', nargs='?', choices=['status', 'upgrade'], default='status')
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vpn_bot.db'),
+                        help="Database path (default: src/db/vpn_bot.db)")
+    args = parser.parse_args()
+
+    conn = get_connection(args.db)
+    current = get_version(conn)
+    pending = pending_migrations(conn)
+
+    print(f"Database: {args.db}")
+    print(f"Schema version: {current} (latest: {LATEST_VERSION})")
+
+    if args.command == 'status':
+        if not pending:
+            print("Up to date.")
+        for version, description, _step in pending:
+            print(f"  pending {version}: {description}")
+        return 1 if pending else 0
+
+    applied = migrate(conn)
+    for version, description in applied:
+        print(f"  applied {version}: {description}")
+    if not applied:
+        print("Nothing to do.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Shared SQLite connection pool.
+
+Every process (bot, API, watchdog, scripts) keeps one persistent connection per
+thread per database file instead of reconnecting on every query. Connections
+are opened in WAL mode with tuned pragmas so readers never block the writer.
+
+All settings can be overridden from the environment:
+    SQLITE_JOURNAL_MODE     (default: WAL)
+    SQLITE_SYNCHRONOUS      (default: NORMAL)
+    SQLITE_BUSY_TIMEOUT_MS  (default: 5000)
+    SQLITE_MMAP_SIZE        (default: 134217728, 128 MiB; 0 disables mmap)
+    SQLITE_CACHE_SIZE       (default: -20000, i.e. ~20 MB; negative = KiB)
+"""
+import os
+import sqlite3
+import threading
+import weakref
+
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection owned by a ConnectionPool.
+
+    close() releases the connection back to the pool: any uncommitted work is
+    rolled back (matching what a real close would do) but the underlying
+    handle stays open for the next caller on the same thread.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        """Really close the underlying SQLite handle."""
+        super().close()
+
+
+class ConnectionPool:
+    """Thread-local persistent connections to a single database file."""
+
+    def __init__(self, db_path, journal_mode=None, synchronous=None,
+                 busy_timeout_ms=None, mmap_size=None, cache_size=None):
+        self.db_path = db_path
+        self.journal_mode = journal_mode or JOURNAL_MODE
+        self.synchronous = synchronous or SYNCHRONOUS
+        self.busy_timeout_ms = BUSY_TIMEOUT_MS if busy_timeout_ms is None else busy_timeout_ms
+        self.mmap_size = MMAP_SIZE if mmap_size is None else mmap_size
+        self.cache_size = CACHE_SIZE if cache_size is None else cache_size
+
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        # A forked child (e.g. a ProcessPoolExecutor worker) must never reuse
+        # the parent's SQLite handle.
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            factory=PooledConnection
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def close_all(self):
+        """Close every connection this pool has handed out (all threads)."""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.dispose()
+            except sqlite3.ProgrammingError:
+                # Owned by another thread that is still alive; it will be
+                # closed when that thread's local storage is released.
+                pass
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """Return the process-wide pool for a database file, creating it if needed."""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                _pools[key] = pool
+    return pool
+
+
+def get_connection(db_path):
+    """Shortcut for get_pool(db_path).connection()."""
+    return get_pool(db_path).connection()
+
+
+def close_all_pools():
+    """Close every pooled connection in this process (shutdown / tests)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,160 @@
+"""
+Image preprocessing ahead of Tesseract.
+
+Tesseract's run time grows with pixel count, and phone screenshots
+(1080x2400 and up) carry far more pixels than it needs to read a slip. The
+pipeline, each step optional:
+
+    1. grayscale  - drop colour (Tesseract only uses luminance)
+    2. rescale    - resize to a nominal target DPI (down- or up-scaling)
+    3. crop       - trim uniform margins around the content
+    4. binarize   - global Otsu threshold; dark-background slips are inverted
+                    so text is always dark on light
+
+Screenshots carry no meaningful DPI, so the rescale step treats the image
+width as SLIP_WIDTH_IN inches: at the default 300 DPI a slip ends up 900 px
+wide, which keeps body text comfortably above Tesseract's minimum x-height.
+
+Defaults can be set from the environment:
+    OCR_PREPROCESS            (default: 0; set to 1 once
+                               scripts/bench/bench_ocr_preprocess.py has
+                               shown, with Tesseract installed, that the
+                               transaction ID and amount still come out of
+                               the sample slips)
+    OCR_TARGET_DPI            (default: 300)
+    OCR_PREPROCESS_BINARIZE   (default: 0; Tesseract already Otsu-thresholds
+                               internally, enable for noisy photos)
+"""
+import os
+
+import numpy as np
+from PIL import Image
+
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "0") == "1"
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+OCR_PREPROCESS_BINARIZE = os.getenv("OCR_PREPROCESS_BINARIZE", "0") == "1"
+
+# Nominal physical width of a slip screenshot (a phone screen), in inches
+SLIP_WIDTH_IN = 3.0
+# Leave images alone when they are already within this factor of the target
+RESCALE_TOLERANCE = 0.1
+# Gray levels a pixel must differ from the margin colour to count as content
+CROP_TOLERANCE = 32
+
+
+class PreprocessOptions:
+    """Which preprocessing steps to run, and their parameters."""
+
+    def __init__(self, grayscale=True, rescale=True, crop=True, binarize=OCR_PREPROCESS_BINARIZE,
+                 target_dpi=OCR_TARGET_DPI, slip_width_in=SLIP_WIDTH_IN, crop_padding=12):
+        self.grayscale = grayscale
+        self.rescale = rescale
+        self.crop = crop
+        self.binarize = binarize
+        self.target_dpi = target_dpi
+        self.slip_width_in = slip_width_in
+        self.crop_padding = crop_padding
+
+    @property
+    def target_width(self):
+        return int(round(self.target_dpi * self.slip_width_in))
+
+
+def to_grayscale(image):
+    return image if image.mode == 'L' else image.convert('L')
+
+
+def rescale_to_dpi(image, target_width):
+    """
+    Resize so the image is target_width pixels wide, keeping the aspect ratio.
+
+    Images already within RESCALE_TOLERANCE of the target are returned as-is.
+    """
+    scale = target_width / image.width
+    if abs(scale - 1) <= RESCALE_TOLERANCE:
+        return image
+    size = (target_width, max(1, int(round(image.height * scale))))
+    # Box filtering is cheap and alias-free when shrinking; Lanczos keeps edges sharp when enlarging
+    resample = Image.Resampling.BOX if scale < 1 else Image.Resampling.LANCZOS
+    return image.resize(size, resample)
+
+
+def crop_margins(image, padding=12, tolerance=CROP_TOLERANCE):
+    """
+    Trim the uniform border around the content.
+
+    The margin colour is the median of the outermost pixel ring; content is
+    anything that differs from it by more than tolerance gray levels.
+    """
+    gray = np.asarray(to_grayscale(image), dtype=np.int16)
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return image
+    ring = np.concatenate((gray[0], gray[-1], gray[1:-1, 0], gray[1:-1, -1]))
+    content = np.abs(gray - int(np.median(ring))) > tolerance
+
+    rows = np.flatnonzero(content.any(axis=1))
+    cols = np.flatnonzero(content.any(axis=0))
+    if rows.size == 0:
+        return image
+    box = (
+        max(0, cols[0] - padding),
+        max(0, rows[0] - padding),
+        min(image.width, cols[-1] + 1 + padding),
+        min(image.height, rows[-1] + 1 + padding),
+    )
+    if box == (0, 0, image.width, image.height):
+        return image
+    return image.crop(box)
+
+
+def otsu_threshold(gray):
+    """
+    Otsu's threshold for an 8-bit grayscale array.
+
+    Returns:
+        int: Gray level t separating the classes <= t and > t
+    """
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    if total == 0:
+        return 127
+    mean = np.cumsum(hist * np.arange(256))
+    # Between-class variance for every candidate threshold
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (mean[-1] * weight - mean * total) ** 2 / (weight * (total - weight))
+    variance = np.nan_to_num(variance, nan=0.0, posinf=0.0)
+    return int(np.argmax(variance))
+
+
+def binarize(image):
+    """Otsu-threshold to black text on white, inverting dark-mode slips."""
+    gray = np.asarray(to_grayscale(image))
+    bw = gray > otsu_threshold(gray)
+    # The background is the majority class; make it white
+    if bw.mean() < 0.5:
+        bw = ~bw
+    return Image.fromarray(np.where(bw, 255, 0).astype(np.uint8))
+
+
+def preprocess(image, options=None):
+    """
+    Run the enabled preprocessing steps.
+
+    Args:
+        image: PIL image
+        options: PreprocessOptions (default: all defaults)
+
+    Returns:
+        PIL.Image: Image ready for Tesseract (mode 'L' if grayscale or binarize is on)
+    """
+    options = options or PreprocessOptions()
+    if options.grayscale:
+        image = to_grayscale(image)
+    if options.rescale:
+        image = rescale_to_dpi(image, options.target_width)
+    if options.crop:
+        image = crop_margins(image, options.crop_padding)
+    if options.binarize:
+        image = binarize(image)
+    return image
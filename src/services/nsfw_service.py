@@ -0,0 +1,233 @@
+"""
+NudeNet screening of payment screenshots.
+
+The model is loaded in the background as soon as start() is called (the
+bot calls it when the first payment photo arrives), so the photo handler
+never blocks on it; a photo that arrives while it is still loading waits
+for the load.
+
+Inference runs on a dedicated thread pool (onnxruntime releases the GIL
+while it runs) fed through a bounded queue: NSFW_WORKERS images are screened
+at once and up to NSFW_QUEUE_SIZE more wait. A photo arriving when the queue
+is full raises NSFWQueueFull rather than letting a backlog build up. The
+bot fails closed on it: the photo is not processed and the user is asked to
+send it again in a minute.
+
+Images are shrunk to NSFW_INPUT_SIZE px on their longest side (NudeNet's
+inference resolution) before they reach the model, so a 1080x2400 screenshot
+is neither decoded nor handed over at full size.
+
+metrics() reports the model state, queue depth, in-flight and rejected
+counts, and inference latency percentiles over the last LATENCY_WINDOW runs.
+
+Settings: NSFW_WORKERS (default: 1), NSFW_QUEUE_SIZE (default: 8),
+NSFW_INPUT_SIZE (default: 320).
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+NSFW_WORKERS = int(os.getenv("NSFW_WORKERS", "1"))
+NSFW_QUEUE_SIZE = int(os.getenv("NSFW_QUEUE_SIZE", "8"))
+NSFW_INPUT_SIZE = int(os.getenv("NSFW_INPUT_SIZE", "320"))
+
+NSFW_CLASSES = ('EXPOSED_GENITALIA', 'EXPOSED_BREAST_F', 'EXPOSED_BUTTOCKS', 'EXPOSED_ANUS')
+NSFW_MIN_SCORE = 0.6
+LATENCY_WINDOW = 256
+
+
+class NSFWQueueFull(Exception):
+    """Too many photos are already waiting for screening."""
+
+
+class NSFWUnavailable(Exception):
+    """The NudeNet model could not be loaded."""
+
+
+def default_detector():
+    from nudenet import NudeDetector
+    return NudeDetector()
+
+
+def prepare_image(image, size=NSFW_INPUT_SIZE):
+    """
+    Shrink an image to the model's input size.
+
+    Args:
+        image: PIL Image or path
+        size: Longest side in pixels
+
+    Returns:
+        np.ndarray: BGR uint8 array (NudeNet reads images with OpenCV)
+    """
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as opened:
+            # JPEG: decode straight at (close to) the target size
+            opened.draft('RGB', (size, size))
+            return prepare_image(opened.convert('RGB'), size)
+    image = image.convert('RGB')
+    image.thumbnail((size, size), Image.Resampling.BILINEAR)
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+
+class NSFWService:
+    """Background-loaded NudeNet detector behind a bounded thread pool."""
+
+    def __init__(self, detector_factory=default_detector, workers=None, queue_size=None, input_size=None):
+        """
+        Args:
+            detector_factory: Callable building the detector (default: NudeDetector)
+            workers: Inference threads (default: NSFW_WORKERS)
+            queue_size: Photos that may wait for a thread (default: NSFW_QUEUE_SIZE)
+            input_size: Longest side handed to the model (default: NSFW_INPUT_SIZE)
+        """
+        self.detector_factory = detector_factory
+        self.workers = workers or NSFW_WORKERS
+        self.queue_size = NSFW_QUEUE_SIZE if queue_size is None else queue_size
+        self.input_size = input_size or NSFW_INPUT_SIZE
+        self.state = 'stopped'
+        self.load_seconds = None
+        self._executor = None
+        self._loaded = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._failed = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        """Start loading the model in the background (idempotent)."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nsfw")
+                self.state = 'loading'
+                self._loaded = self._executor.submit(self._load)
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            detector = self.detector_factory()
+        except Exception as e:
+            logger.error(f"Failed to initialize NudeNet: {e}")
+            self.state = 'failed'
+            return None
+        self.load_seconds = time.perf_counter() - start
+        self.state = 'ready'
+        logger.info(f"NudeNet detector loaded in {self.load_seconds:.1f}s")
+        return detector
+
+    async def screen(self, image):
+        """
+        Check a photo for explicit content.
+
+        Args:
+            image: PIL Image or path
+
+        Returns:
+            bool: True if any NSFW_CLASSES detection scores above NSFW_MIN_SCORE
+
+        Raises:
+            NSFWQueueFull: Screening queue is full
+            NSFWUnavailable: Model failed to load
+        """
+        self.start()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise NSFWQueueFull(f"{self.workers + self.queue_size} photos already queued for screening")
+        with self._lock:
+            self._queued += 1
+        try:
+            future = self._executor.submit(self._detect, image)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        # The slot is held until the inference itself is done, not just until
+        # this coroutine is; a cancelled caller must not free a slot whose
+        # inference is still running
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        if future.cancelled():
+            # Dropped from the queue before _detect ran
+            with self._lock:
+                self._queued -= 1
+        self._slots.release()
+
+    def _detect(self, image):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            detector = self._loaded.result()
+            if detector is None:
+                raise NSFWUnavailable("NudeNet model is not loaded")
+            start = time.perf_counter()
+            predictions = detector.detect(prepare_image(image, self.input_size))
+            latency = time.perf_counter() - start
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        with self._lock:
+            self._completed += 1
+            self._latencies.append(latency)
+        logger.debug(f"NSFW screening took {latency * 1000:.0f} ms")
+        return any(
+            pred['class'] in NSFW_CLASSES and pred['score'] > NSFW_MIN_SCORE
+            for pred in predictions
+        )
+
+    def metrics(self):
+        """
+        Current screening metrics.
+
+        Returns:
+            dict: state, load_seconds, queue_depth, in_flight, completed,
+            rejected, failed, latency_ms (p50/p95/max over recent runs, or None)
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            metrics = {
+                'state': self.state,
+                'load_seconds': self.load_seconds,
+                'queue_depth': self._queued,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'failed': self._failed,
+            }
+        metrics['latency_ms'] = {
+            'p50': latencies[len(latencies) // 2] * 1000,
+            'p95': latencies[int(len(latencies) * 0.95)] * 1000,
+            'max': latencies[-1] * 1000,
+        } if latencies else None
+        return metrics
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.state = 'stopped'
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+nsfw_service = NSFWService()
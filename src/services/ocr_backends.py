@@ -0,0 +1,237 @@
+"""
+OCR engines behind OCRService.
+
+    SpawnBackend      pytesseract: one `tesseract` process per call, language
+                      data reloaded every time. Always available; the fallback.
+    TesserocrBackend  In-process libtesseract via tesserocr. The engine (and its
+                      language data) is created once per thread and reused.
+    WarmPoolBackend   N long-lived worker processes, each holding its own
+                      in-process engine (tesserocr). Callers queue for a free
+                      worker; a job that exceeds its timeout or kills its worker
+                      fails, and the worker is replaced.
+
+make_backend() picks one from OCR_BACKEND:
+    auto   (default) warm pool if tesserocr is installed, otherwise spawn
+    warm   warm pool; without tesserocr this is logged and spawn is used, as
+           workers spawning tesseract would only add a pipe hop per slip
+    tesserocr, spawn
+
+Warm pool settings: OCR_WARM_WORKERS (default: 2), OCR_JOB_TIMEOUT seconds
+(default: 30), OCR_START_METHOD (default: spawn).
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+OCR_WARM_WORKERS = int(os.getenv("OCR_WARM_WORKERS", "2"))
+OCR_JOB_TIMEOUT = float(os.getenv("OCR_JOB_TIMEOUT", "30"))
+OCR_START_METHOD = os.getenv("OCR_START_METHOD", "spawn")
+
+
+class OCRWorkerError(Exception):
+    """A warm OCR worker crashed or timed out; it has been replaced."""
+
+
+class SpawnBackend:
+    """pytesseract: a fresh tesseract process per image."""
+
+    name = 'spawn'
+
+    def __init__(self, timeout=0):
+        # pytesseract kills the tesseract process after timeout seconds (0: no limit)
+        self.timeout = timeout
+
+    def image_to_string(self, image, lang='eng'):
+        return pytesseract.image_to_string(image, lang=lang, timeout=self.timeout)
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
+    """In-process libtesseract; one engine per thread (they are not thread-safe)."""
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @staticmethod
+    def available():
+        try:
+            import tesserocr  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def image_to_string(self, image, lang='eng'):
+        engines = getattr(self._local, 'engines', None)
+        if engines is None:
+            engines = self._local.engines = {}
+        api = engines.get(lang)
+        if api is None:
+            import tesserocr
+            api = engines[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+    def close(self):
+        for api in getattr(self._local, 'engines', {}).values():
+            api.End()
+        self._local = threading.local()
+
+
+def _worker_main(conn, engine_factory):
+    engine = engine_factory()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        image, lang = job
+        try:
+            conn.send(('ok', engine.image_to_string(image, lang)))
+        except Exception as e:
+            conn.send(('error', f"{e.__class__.__name__}: {e}"))
+    engine.close()
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class WarmPoolBackend:
+    """Long-lived OCR worker processes fed one job at a time."""
+
+    name = 'warm'
+
+    def __init__(self, workers=None, timeout=None, engine_factory=TesserocrBackend, start_method=None):
+        """
+        Args:
+            workers: Worker processes (default: OCR_WARM_WORKERS)
+            timeout: Seconds a job may take before its worker is killed (default: OCR_JOB_TIMEOUT)
+            engine_factory: Picklable callable building the in-process engine inside each worker
+            start_method: multiprocessing start method (default: OCR_START_METHOD)
+
+        Raises:
+            RuntimeError: engine_factory is TesserocrBackend and tesserocr is not installed
+        """
+        if engine_factory is TesserocrBackend and not TesserocrBackend.available():
+            raise RuntimeError("The warm OCR pool needs tesserocr")
+        self.workers = workers or OCR_WARM_WORKERS
+        self.timeout = OCR_JOB_TIMEOUT if timeout is None else timeout
+        self.engine_factory = engine_factory
+        self._context = multiprocessing.get_context(start_method or OCR_START_METHOD)
+        self._idle = None
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.engine_factory),
+            name="ocr-worker", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._all.append(worker)
+        return worker
+
+    def _retire(self, worker):
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+        worker.conn.close()
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join()
+
+    def _replace(self, worker):
+        self._retire(worker)
+        return self._spawn()
+
+    def start(self):
+        """
+        Start the workers (done lazily on the first job otherwise).
+
+        Returns:
+            queue.Queue: The idle-worker queue
+        """
+        with self._lock:
+            if self._idle is not None:
+                return self._idle
+            idle = self._idle = queue.Queue()
+        for _ in range(self.workers):
+            idle.put(self._spawn())
+        return idle
+
+    def image_to_string(self, image, lang='eng'):
+        idle = self.start()
+        # Waits for a free worker: the idle queue is the job queue
+        worker = idle.get()
+        if not worker.process.is_alive():
+            # Died while idle (e.g. OOM-killed); the job has not been sent yet
+            worker = self._replace(worker)
+        try:
+            worker.conn.send((image, lang))
+            if not worker.conn.poll(self.timeout):
+                worker = self._replace(worker)
+                raise OCRWorkerError(f"OCR job timed out after {self.timeout}s")
+            status, value = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            logger.error(f"OCR worker died: {e!r}")
+            worker = self._replace(worker)
+            raise OCRWorkerError("OCR worker crashed")
+        finally:
+            idle.put(worker)
+        if status == 'error':
+            raise RuntimeError(value)
+        return value
+
+    def close(self):
+        """Stop all workers."""
+        with self._lock:
+            workers, self._all = self._all, []
+            self._idle = None
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+
+
+def make_backend(name=None):
+    """Build the backend named by name (default: OCR_BACKEND)."""
+    name = name or OCR_BACKEND
+    if name == 'auto':
+        name = 'warm' if TesserocrBackend.available() else 'spawn'
+    if name == 'warm':
+        if not TesserocrBackend.available():
+            logger.error("OCR_BACKEND=warm needs tesserocr, which is not installed; "
+                         "warm pool disabled, spawning tesseract per slip")
+            return SpawnBackend()
+        return WarmPoolBackend()
+    if name == 'tesserocr':
+        return TesserocrBackend()
+    if name == 'spawn':
+        return SpawnBackend()
+    raise ValueError(f"Unknown OCR backend: {name}")
@@ -0,0 +1,274 @@
+"""
+Background payment slip verification.
+
+Slips are OCR'd and validated in a ProcessPoolExecutor so several can run at
+once on separate cores; the caller gets a job ID straight away and polls the
+job's state, which lives in the payment_jobs table so finished results
+survive a restart.
+
+Flow per job:
+    queued        -> hashed and looked up on an intake thread (submit() only
+                     records the job, so the caller's thread is not held)
+                  -> read_slip() in a worker process (Tesseract), skipped when
+                     the image is in the slip cache (services/slip_cache.py);
+                     with SLIP_HASH_ACTION set, near-duplicates of accepted
+                     slips are flagged or failed first (services/slip_hash.py)
+                  -> validate_slip() in this process
+    provisioning  -> provision(user_uuid, protocol, data) in this process
+    succeeded / failed
+
+Worker count: OCR_WORKERS (default: CPU count).
+Process start method: OCR_START_METHOD (default: spawn; the API process is
+multi-threaded, so forking it is unsafe).
+Provisioning threads: PROVISION_WORKERS (default: 8). provision() blocks on
+the config write queue (bot.config_queue), which serialises the config
+writes itself; several threads let payments that finish close together
+share one write and reload instead of queueing behind each other's debounce.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import uuid as uuid_lib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from ..db.database import create_payment_job, update_payment_job, fail_unfinished_payment_jobs
+    from .ocr_service import ocr_service
+    from .ocr_backends import TesserocrBackend
+    from .payment_validator import payment_validator, InvalidReceiptError, TEST_SLIP_ID
+    from .slip_cache import slip_digest, lookup_slip, store_slip
+    from . import slip_hash
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import create_payment_job, update_payment_job, fail_unfinished_payment_jobs
+    from services.ocr_service import ocr_service
+    from services.ocr_backends import TesserocrBackend
+    from services.payment_validator import payment_validator, InvalidReceiptError, TEST_SLIP_ID
+    from services.slip_cache import slip_digest, lookup_slip, store_slip
+    from services import slip_hash
+
+logger = logging.getLogger(__name__)
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+OCR_START_METHOD = os.getenv("OCR_START_METHOD", "spawn")
+PROVISION_WORKERS = int(os.getenv("PROVISION_WORKERS", "8"))
+
+
+class PaymentJobError(Exception):
+    """A job failure the client should see verbatim (unreadable slip, duplicate, ...)."""
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail, status_code)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _init_worker():
+    # One Tesseract thread per worker; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    # These workers are already long-lived: load the engine in-process, once,
+    # rather than feeding a second tier of warm OCR workers
+    if TesserocrBackend.available():
+        ocr_service.backend = TesserocrBackend()
+
+
+def read_slip(image_bytes):
+    """
+    OCR a payment slip. Runs in a worker process.
+
+    Args:
+        image_bytes: Raw uploaded image
+
+    Returns:
+        list: Non-empty lines of text (empty if nothing could be read)
+    """
+    return ocr_service.extract_text(io.BytesIO(image_bytes))
+
+
+def validate_slip(text_lines):
+    """
+    Validate OCR'd slip text.
+
+    Returns:
+        dict: Validated receipt data ('provider', 'transaction_id', 'amount')
+
+    Raises:
+        PaymentJobError: Slip unreadable or not a valid receipt
+    """
+    if not text_lines:
+        raise PaymentJobError("Could not read text from image")
+    try:
+        return payment_validator.validate_receipt(text_lines)
+    except InvalidReceiptError as e:
+        raise PaymentJobError(f"Invalid Receipt: {str(e)}")
+
+
+class OCRJobQueue:
+    """Process-pool OCR with persistent job state."""
+
+    def __init__(self, provision, workers=None, start_method=None, provision_workers=None):
+        """
+        Args:
+            provision: Callable (user_uuid, protocol, data) -> JSON-serialisable
+                result, run in this process once a slip validates. Exceptions
+                with .detail/.status_code (HTTPException, PaymentJobError) are
+                reported to the client as-is.
+            workers: OCR worker processes (default: OCR_WORKERS)
+            start_method: multiprocessing start method (default: OCR_START_METHOD)
+            provision_workers: Provisioning threads (default: PROVISION_WORKERS)
+        """
+        self.provision = provision
+        self.workers = workers or OCR_WORKERS
+        self.start_method = start_method or OCR_START_METHOD
+        self._pool = None
+        self._closed = False
+        self._lock = threading.Lock()
+        # Hashing and cache lookups, kept off the caller's (database) thread
+        self._intake = ThreadPoolExecutor(max_workers=2, thread_name_prefix="payment-intake")
+        # Config writes are serialised and batched by the config write queue;
+        # provisioning threads only wait on it
+        self._provisioner = ThreadPoolExecutor(max_workers=provision_workers or PROVISION_WORKERS,
+                                               thread_name_prefix="payment-provision")
+
+    def start(self):
+        """
+        Recover from a previous run and start the worker processes.
+
+        Returns:
+            int: Number of interrupted jobs marked failed
+        """
+        interrupted = fail_unfinished_payment_jobs()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} interrupted payment job(s) as failed")
+        self._get_pool()
+        return interrupted
+
+    def _get_pool(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Payment job queue is shut down")
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker
+                )
+            return self._pool
+
+    def submit(self, user_uuid, protocol, image_bytes):
+        """
+        Queue a slip for verification. Only records the job; hashing, the
+        cache lookups and the OCR dispatch run on the queue's intake thread.
+
+        Returns:
+            str: Job ID
+        """
+        job_id = uuid_lib.uuid4().hex
+        create_payment_job(job_id, user_uuid, protocol)
+        self._dispatch(self._intake, job_id, self._start, job_id, user_uuid, protocol, image_bytes)
+        return job_id
+
+    def _dispatch(self, executor, job_id, step, *args):
+        """Run a job step on an executor; fail the job if it cannot be queued (shut down)."""
+        try:
+            executor.submit(self._guarded, job_id, step, *args)
+        except Exception as e:
+            logger.error(f"Payment job {job_id} could not be queued: {e}")
+            update_payment_job(job_id, 'failed', error="Slip could not be processed, please try again", error_code=503)
+
+    def _guarded(self, job_id, step, *args):
+        # Steps run on executor threads, where an exception would vanish and
+        # leave the job queued forever
+        try:
+            step(*args)
+        except Exception as e:
+            logger.exception(f"Payment job {job_id} failed")
+            try:
+                update_payment_job(job_id, 'failed', error=str(e) or e.__class__.__name__, error_code=500)
+            except Exception:
+                logger.exception(f"Could not mark payment job {job_id} failed")
+
+    def _start(self, job_id, user_uuid, protocol, image_bytes):
+        digest = slip_digest(image_bytes)
+        phash = slip_hash.load_slip_hash(io.BytesIO(image_bytes)) if slip_hash.enabled() else None
+        cached = lookup_slip(digest)
+        if cached and cached['text_lines'] is not None:
+            # Same image seen before: no OCR, straight to validation and the duplicate check
+            logger.info(f"Payment job {job_id}: slip cache hit")
+            self._dispatch(self._provisioner, job_id, self._complete, job_id, user_uuid, protocol, phash,
+                           cached['text_lines'], cached['validated_data'])
+            return
+        reused = slip_hash.find_reused_slip(phash) if phash is not None else None
+        if reused:
+            logger.warning(f"Payment job {job_id}: slip looks like accepted transaction {reused}")
+            if slip_hash.SLIP_HASH_ACTION == 'reject':
+                update_payment_job(job_id, 'failed', error=f"Transaction {reused} already used", error_code=400)
+                return
+        pool = self._get_pool()
+        future = pool.submit(read_slip, image_bytes)
+        future.add_done_callback(
+            lambda f: self._dispatch(self._provisioner, job_id, self._finish,
+                                     job_id, user_uuid, protocol, digest, phash, f, pool)
+        )
+
+    def _discard_pool(self, pool):
+        # A worker died (OOM, segfault): the pool is unusable, start a fresh one on next submit
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _finish(self, job_id, user_uuid, protocol, digest, phash, future, pool):
+        try:
+            text_lines = future.result()
+        except BrokenProcessPool:
+            logger.error(f"OCR worker crashed while processing payment job {job_id}")
+            self._discard_pool(pool)
+            update_payment_job(job_id, 'failed', error="Slip could not be processed, please try again", error_code=503)
+            return
+        except Exception as e:
+            logger.exception(f"Payment job {job_id} failed")
+            update_payment_job(job_id, 'failed', error=str(e) or e.__class__.__name__, error_code=500)
+            return
+        data = None
+        try:
+            data = validate_slip(text_lines)
+        except PaymentJobError:
+            pass
+        store_slip(digest, text_lines=text_lines, validated_data=data)
+        self._complete(job_id, user_uuid, protocol, phash, text_lines, data)
+
+    def _complete(self, job_id, user_uuid, protocol, phash, text_lines, data=None):
+        try:
+            if data is None:
+                data = validate_slip(text_lines)
+            update_payment_job(job_id, 'provisioning')
+            result = self.provision(user_uuid, protocol, data)
+        except Exception as e:
+            detail = getattr(e, 'detail', None)
+            if detail is None:
+                logger.exception(f"Payment job {job_id} failed")
+                detail = str(e) or e.__class__.__name__
+            update_payment_job(job_id, 'failed', error=detail, error_code=getattr(e, 'status_code', 500))
+            return
+        if phash is not None and data['transaction_id'] != TEST_SLIP_ID:
+            try:
+                slip_hash.remember_slip(phash, data['transaction_id'])
+            except Exception:
+                # The key exists; the job must not be reported as failed
+                logger.exception(f"Payment job {job_id}: could not remember slip hash")
+        update_payment_job(job_id, 'succeeded', result=result)
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes; with wait, let queued jobs finish first."""
+        # In pipeline order, so each stage has drained into the next
+        self._intake.shutdown(wait=wait, cancel_futures=not wait)
+        with self._lock:
+            self._closed = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+        self._provisioner.shutdown(wait=wait)
@@ -1,25 +1,43 @@
-import pytesseract
 from PIL import Image
 import logging
 import os
 
+try:
+    from .image_preprocess import preprocess, PreprocessOptions, OCR_PREPROCESS
+    from .ocr_backends import make_backend
+except ImportError:
+    from services.image_preprocess import preprocess, PreprocessOptions, OCR_PREPROCESS
+    from services.ocr_backends import make_backend
+
 logger = logging.getLogger(__name__)
 
 class OCRService:
-    def __init__(self, languages='eng'):
+    def __init__(self, languages='eng', preprocess_options=None, backend=None):
+        """
+        :param languages: Tesseract language(s)
+        :param preprocess_options: PreprocessOptions to run before OCR, or None to OCR the raw image
+        :param backend: OCR engine from ocr_backends (default: make_backend(), per OCR_BACKEND)
+        """
         self.languages = languages
+        self.preprocess_options = preprocess_options
+        self.backend = backend or make_backend()
 
     def extract_text(self, image_path):
         """
-        Extracts text from an image file using Tesseract.
+        Extracts text from an image using Tesseract.
+        :param image_path: Path, file object, or an already decoded PIL Image
         Returns a list of strings (lines).
         """
         try:
-            # Open image with Pillow
-            img = Image.open(image_path)
+            # Open image with Pillow (unless the caller already decoded it)
+            img = image_path if isinstance(image_path, Image.Image) else Image.open(image_path)
+
+            # Shrink/clean the image first; Tesseract time scales with pixel count
+            if self.preprocess_options:
+                img = preprocess(img, self.preprocess_options)
             
             # Extract text
-            text = pytesseract.image_to_string(img, lang=self.languages)
+            text = self.backend.image_to_string(img, lang=self.languages)
             
             # Split into lines and filter empty ones
             lines = [line.strip() for line in text.split('\n') if line.strip()]
@@ -29,4 +47,4 @@ class OCRService:
             return []
 
 # Singleton instance
-ocr_service = OCRService()
+ocr_service = OCRService(preprocess_options=PreprocessOptions() if OCR_PREPROCESS else None)
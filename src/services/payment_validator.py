@@ -3,6 +3,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# The sample slip (tests/KBZ-Pay-Slip-Sample.jpeg) may be used any number of times
+TEST_SLIP_ID = "01003984021770423212"
+
 class InvalidReceiptError(Exception):
     pass
 
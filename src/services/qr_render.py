@@ -0,0 +1,103 @@
+"""
+Compact QR code rendering for VPN links.
+
+The old renderer used version=1 with fit=True, box_size=10, border=5 and the
+library's default error correction (M), saved through the qrcode PIL factory.
+This renderer:
+
+    - picks the smallest QR version that holds the link at level L, then the
+      strongest error correction (H, Q, M, L) that still fits that version,
+      so extra robustness never costs extra modules
+    - draws modules as a 2-colour palette image, scaled with nearest-neighbour
+      resampling, and saves it as a 1-bit optimized PNG
+    - uses the standard 4-module quiet zone (QR_BORDER) and QR_BOX_SIZE pixels
+      per module (default: 8)
+
+Rendering is CPU-bound, so the bot calls render_png_async, which runs it on
+a small thread pool (QR_RENDER_WORKERS, default: 1) instead of the event loop.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import qrcode
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+from PIL import Image
+
+QR_BOX_SIZE = int(os.getenv("QR_BOX_SIZE", "8"))
+QR_BORDER = int(os.getenv("QR_BORDER", "4"))
+QR_RENDER_WORKERS = int(os.getenv("QR_RENDER_WORKERS", "1"))
+
+# Strongest first
+ERROR_CORRECTION_LEVELS = (ERROR_CORRECT_H, ERROR_CORRECT_Q, ERROR_CORRECT_M, ERROR_CORRECT_L)
+
+# Palette index 0 = dark module, 1 = light
+PALETTE = [0, 0, 0, 255, 255, 255]
+
+_executor = None
+
+
+def make_qr(data):
+    """
+    Encode data in the smallest QR version, with the strongest error correction that fits it.
+
+    Returns:
+        qrcode.QRCode: Encoded symbol (border 0)
+    """
+    version = None
+    for level in reversed(ERROR_CORRECTION_LEVELS):
+        qr = qrcode.QRCode(error_correction=level, border=0)
+        qr.add_data(data)
+        # best_fit only sizes the data; make() (mask selection) is the expensive part
+        fitted = qr.best_fit()
+        if version is None:
+            version = fitted
+        elif fitted > version:
+            break
+        best = qr
+    best.make(fit=False)
+    return best
+
+
+def render_png(data, box_size=None, border=None):
+    """
+    Render data as a 1-bit palette PNG.
+
+    Args:
+        data: Text to encode (a VPN link)
+        box_size: Pixels per module (default: QR_BOX_SIZE)
+        border: Quiet zone in modules (default: QR_BORDER)
+
+    Returns:
+        bytes: PNG image
+    """
+    box_size = QR_BOX_SIZE if box_size is None else box_size
+    border = QR_BORDER if border is None else border
+
+    modules = np.array(make_qr(data).modules, dtype=bool)
+    pixels = np.pad(np.where(modules, 0, 1).astype(np.uint8), border, constant_values=1)
+
+    img = Image.fromarray(pixels, 'P')
+    img.putpalette(PALETTE)
+    if box_size > 1:
+        img = img.resize((img.width * box_size, img.height * box_size), Image.Resampling.NEAREST)
+
+    bio = io.BytesIO()
+    img.save(bio, 'PNG', optimize=True, bits=1)
+    return bio.getvalue()
+
+
+def get_executor():
+    """Thread pool for QR rendering (created on first use)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=QR_RENDER_WORKERS, thread_name_prefix="qr")
+    return _executor
+
+
+async def render_png_async(data):
+    """render_png on the rendering thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), render_png, data)
@@ -0,0 +1,64 @@
+"""
+Result cache for payment slip uploads, keyed by the SHA-256 of the image bytes.
+
+Users resend the same screenshot when verification is slow. Both the bot's
+handle_photo and the API's payment jobs look the digest up before running
+NSFW detection and OCR; on a hit they go straight to the duplicate-TID check.
+
+Cached per image:
+    nsfw_verdict    True/False, or None when not checked (the API skips NSFW)
+    text_lines      OCR output; never cached empty, so an OCR failure is retried
+    validated_data  PaymentValidator result, or None if the receipt was invalid
+                    (re-validating the cached text reproduces the error message)
+
+Entries expire SLIP_CACHE_TTL seconds after they are first stored
+(default: 86400). Expired entries are ignored on lookup and deleted on store.
+"""
+import hashlib
+import logging
+import os
+import time
+
+try:
+    from ..db.database import get_slip_cache_entry, put_slip_cache_entry, evict_slip_cache
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import get_slip_cache_entry, put_slip_cache_entry, evict_slip_cache
+
+logger = logging.getLogger(__name__)
+
+SLIP_CACHE_TTL = float(os.getenv("SLIP_CACHE_TTL", "86400"))
+
+
+def slip_digest(image_bytes):
+    """Hex SHA-256 of the uploaded image."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def lookup_slip(digest):
+    """
+    Get the cached result for an image.
+
+    Returns:
+        dict: See get_slip_cache_entry, or None on a miss or expired entry
+    """
+    try:
+        return get_slip_cache_entry(digest, time.time() - SLIP_CACHE_TTL)
+    except Exception as e:
+        # The cache is an optimisation; never fail a payment because of it
+        logger.error(f"Slip cache lookup failed: {e}")
+        return None
+
+
+def store_slip(digest, nsfw_verdict=None, text_lines=None, validated_data=None):
+    """Cache a slip result and evict expired entries. Empty OCR output is not cached."""
+    if not text_lines:
+        text_lines = None
+    if nsfw_verdict is None and text_lines is None:
+        return
+    now = time.time()
+    try:
+        put_slip_cache_entry(digest, now, nsfw_verdict, text_lines, validated_data)
+        evict_slip_cache(now - SLIP_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Slip cache store failed: {e}")
@@ -0,0 +1,71 @@
+"""
+Verification outcome of each payment photo, keyed by Telegram's file_unique_id.
+
+Telegram gives every distinct file a stable file_unique_id, the same for a
+forward or a re-send of the same photo. handle_photo looks it up before
+get_file(), so a slip the bot has already judged is answered from the
+recorded outcome without downloading, decoding, screening or OCR.
+
+Outcomes:
+    accepted    payment recorded for transaction_id; a re-send is a reused TID
+    duplicate   transaction_id was already used
+    nsfw        flagged by NSFW screening
+    invalid     rejected by PaymentValidator; detail is the error message
+    low_amount  amount below the minimum; detail is the amount
+
+accepted, duplicate and nsfw are final and kept forever. invalid and
+low_amount depend on validator rules that may change, so they expire after
+SLIP_CACHE_TTL like the slip_cache entries. Unreadable photos and internal
+errors are never recorded, so they are retried.
+"""
+import logging
+import time
+
+try:
+    from ..db.database import get_slip_file, put_slip_file, evict_slip_files
+    from .slip_cache import SLIP_CACHE_TTL
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import get_slip_file, put_slip_file, evict_slip_files
+    from services.slip_cache import SLIP_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+NSFW = 'nsfw'
+INVALID = 'invalid'
+LOW_AMOUNT = 'low_amount'
+
+FINAL_OUTCOMES = (ACCEPTED, DUPLICATE, NSFW)
+
+
+def lookup_file(file_unique_id):
+    """
+    Get the recorded outcome for a photo.
+
+    Returns:
+        dict: 'outcome', 'transaction_id', 'detail', or None if the photo is
+        unseen, its outcome expired, or the lookup failed
+    """
+    if not file_unique_id:
+        return None
+    try:
+        return get_slip_file(file_unique_id, time.time())
+    except Exception as e:
+        # An optimisation only; fall back to processing the photo
+        logger.error(f"Slip file lookup failed: {e}")
+        return None
+
+
+def record_file(file_unique_id, outcome, transaction_id=None, detail=None):
+    """Record a photo's outcome and evict expired outcomes."""
+    if not file_unique_id:
+        return
+    now = time.time()
+    expires_at = None if outcome in FINAL_OUTCOMES else now + SLIP_CACHE_TTL
+    try:
+        put_slip_file(file_unique_id, outcome, transaction_id, None if detail is None else str(detail), expires_at)
+        evict_slip_files(now)
+    except Exception as e:
+        logger.error(f"Slip file store failed: {e}")
@@ -0,0 +1,265 @@
+"""
+Perceptual hashes of accepted payment slips, to catch a reused slip before
+it reaches OCR.
+
+A recompressed, rescaled or re-bordered copy of a slip has different bytes
+(so the SHA-256 slip cache misses) but looks the same. Every accepted slip's
+hash is stored with its transaction ID; a new upload whose hash is within
+SLIP_HASH_MAX_DISTANCE of a stored one is flagged as a likely reuse.
+
+The hash is a dHash per horizontal strip: the margin-cropped grayscale
+image is shrunk to (STRIP_COLS + 1) x (STRIPS * STRIP_ROWS) and each strip
+yields STRIP_COLS * STRIP_ROWS = 64 bits (is each pixel darker than its
+right neighbour by more than DHASH_MIN_STEP, which keeps JPEG noise in flat
+areas from flipping bits). Two slips match when *every* strip is within the
+distance, so a difference confined to one line of text is not averaged away
+by the identical layout around it.
+
+Slips from the same app still differ only in a few lines of small text, and
+at this resolution two different transaction IDs hash alike: on rendered
+same-template slips scripts/bench/bench_slip_hash.py measures 191 of 200
+distinct slips matching another one. The check is therefore off by default
+(SLIP_HASH_ACTION=off: nothing is hashed, looked up or stored).
+SLIP_HASH_ACTION=flag logs matches and still sends the slip through OCR and
+the TID check, which remains the authority; SLIP_HASH_ACTION=reject turns
+matches away before OCR. Run the benchmark with --slip-dir on real slips
+before enabling either.
+
+Lookup is a multi-index Hamming search: each 64-bit strip is split into
+BANDS 16-bit bands, and a strip within distance < BANDS of the query must
+match it exactly on at least one band. Per (strip, band) the index keeps a
+sorted array of band values; a query picks the strip whose bands have the
+fewest exact matches and verifies only those candidates.
+
+Hashes live in the slip_hashes table; each process loads them into memory
+and picks up rows added by other processes (bot/API) on every lookup.
+
+Settings: SLIP_HASH_MAX_DISTANCE bits per strip (default: 2, at most 3),
+SLIP_HASH_ACTION: off, flag or reject (default: off).
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+try:
+    from ..db.database import add_slip_hash, get_slip_hashes
+    from .image_preprocess import to_grayscale, crop_margins
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from db.database import add_slip_hash, get_slip_hashes
+    from services.image_preprocess import to_grayscale, crop_margins
+
+logger = logging.getLogger(__name__)
+
+STRIPS = 8
+STRIP_COLS = 16
+STRIP_ROWS = 4
+DHASH_MIN_STEP = 2
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# New hashes are searched linearly until this many have piled up, then the sorted index is rebuilt
+REBUILD_EVERY = 1024
+# Candidates verified in the first step of a lookup
+VERIFY_CHUNK = 256
+
+SLIP_HASH_MAX_DISTANCE = min(int(os.getenv("SLIP_HASH_MAX_DISTANCE", "2")), BANDS - 1)
+SLIP_HASH_ACTION = os.getenv("SLIP_HASH_ACTION", "off")
+
+
+def enabled():
+    return SLIP_HASH_ACTION in ('flag', 'reject')
+
+
+def slip_hash(image):
+    """
+    Perceptual hash of a slip image.
+
+    Args:
+        image: PIL Image
+
+    Returns:
+        np.ndarray: STRIPS uint64 values
+    """
+    gray = crop_margins(to_grayscale(image), padding=0)
+    pixels = np.asarray(
+        gray.resize((STRIP_COLS + 1, STRIPS * STRIP_ROWS), Image.Resampling.BOX), dtype=np.int16
+    )
+    bits = (pixels[:, 1:] - pixels[:, :-1] > DHASH_MIN_STEP).reshape(STRIPS, STRIP_ROWS * STRIP_COLS)
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def load_slip_hash(fp):
+    """
+    slip_hash() of an image file.
+
+    Args:
+        fp: Path or file object
+
+    Returns:
+        np.ndarray: The hash, or None if the file is not a readable image
+    """
+    try:
+        # Full decode: JPEG draft (DCT-scaled) decoding is faster but its
+        # thumbnails differ enough between sizes to miss rescaled copies
+        with Image.open(fp) as image:
+            return slip_hash(image)
+    except Exception as e:
+        logger.warning(f"Could not hash slip image: {e}")
+        return None
+
+
+def _popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    # numpy < 2.0
+    return np.unpackbits(values.view(np.uint8), axis=-1).reshape(*values.shape, 64).sum(axis=-1)
+
+
+class SlipHashIndex:
+    """In-memory multi-index over slip hashes."""
+
+    def __init__(self, max_distance=None):
+        """
+        Args:
+            max_distance: Bits each strip may differ by (default: SLIP_HASH_MAX_DISTANCE, below BANDS)
+        """
+        self.max_distance = SLIP_HASH_MAX_DISTANCE if max_distance is None else max_distance
+        if not 0 <= self.max_distance < BANDS:
+            raise ValueError(f"max_distance must be between 0 and {BANDS - 1}")
+        self._hashes = np.empty((1024, STRIPS), dtype=np.uint64)
+        self.transaction_ids = []
+        # (sorted band values, row numbers) per strip and band, covering rows [0, _indexed)
+        self._tables = []
+        self._indexed = 0
+
+    def __len__(self):
+        return len(self.transaction_ids)
+
+    def add(self, phash, transaction_id):
+        count = len(self.transaction_ids)
+        if count == len(self._hashes):
+            grown = np.empty((count * 2, STRIPS), dtype=np.uint64)
+            grown[:count] = self._hashes[:count]
+            self._hashes = grown
+        self._hashes[count] = phash
+        self.transaction_ids.append(transaction_id)
+
+    def _rebuild(self):
+        count = len(self.transaction_ids)
+        hashes = self._hashes[:count]
+        tables = []
+        for strip in range(STRIPS):
+            bands = []
+            for band in range(BANDS):
+                values = ((hashes[:, strip] >> np.uint64(band * BAND_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+                order = np.argsort(values, kind='stable').astype(np.int32)
+                bands.append((values[order], order))
+            tables.append(bands)
+        self._tables = tables
+        self._indexed = count
+
+    def _candidates(self, phash):
+        # Row numbers sharing at least one band with the query's most selective strip,
+        # then rows added since the last rebuild (rows may repeat)
+        best = None
+        for strip, bands in enumerate(self._tables):
+            ranges = []
+            total = 0
+            for band, (values, order) in enumerate(bands):
+                # Same dtype as values, or numpy converts the whole array per search
+                key = np.uint16((int(phash[strip]) >> (band * BAND_BITS)) & 0xFFFF)
+                lo = values.searchsorted(key, 'left')
+                hi = values.searchsorted(key, 'right')
+                ranges.append(order[lo:hi])
+                total += hi - lo
+            if best is None or total < best[0]:
+                best = (total, ranges)
+                if total == 0:
+                    break
+        ranges = best[1] if best else []
+        ranges.append(np.arange(self._indexed, len(self.transaction_ids)))
+        return np.concatenate(ranges)
+
+    def find(self, phash):
+        """
+        Find a stored slip with every strip within max_distance.
+
+        Candidates are verified a chunk at a time and the search stops at the
+        first chunk with a match, so when many stored slips are within reach
+        the result is the closest in that chunk rather than overall.
+
+        Args:
+            phash: slip_hash() of the query
+
+        Returns:
+            tuple: (transaction_id, max strip distance), or None
+        """
+        if len(self.transaction_ids) - self._indexed > REBUILD_EVERY:
+            self._rebuild()
+        candidates = self._candidates(phash)
+        start, chunk = 0, VERIFY_CHUNK
+        while start < len(candidates):
+            rows = candidates[start:start + chunk]
+            distances = _popcount(self._hashes[rows] ^ phash).max(axis=1)
+            best = int(distances.argmin())
+            if distances[best] <= self.max_distance:
+                return self.transaction_ids[rows[best]], int(distances[best])
+            # Grow the chunk: small first (early exit), few steps when nothing matches
+            start, chunk = start + chunk, chunk * 4
+        return None
+
+
+_index = SlipHashIndex()
+_last_id = 0
+_lock = threading.Lock()
+
+
+def _sync():
+    # Pick up hashes stored since the last lookup, by this or another process
+    global _last_id
+    for row_id, transaction_id, phash in get_slip_hashes(_last_id):
+        _index.add(np.frombuffer(phash, dtype=np.uint64), transaction_id)
+        _last_id = row_id
+
+
+def find_reused_slip(phash):
+    """
+    Check an upload against every accepted slip.
+
+    Args:
+        phash: slip_hash() of the upload
+
+    Returns:
+        str: Transaction ID of the slip it duplicates, or None
+    """
+    try:
+        with _lock:
+            _sync()
+            match = _index.find(phash)
+    except Exception as e:
+        # Only an early warning; never fail a payment because of it
+        logger.error(f"Slip hash lookup failed: {e}")
+        return None
+    if match:
+        logger.info(f"Upload matches accepted slip {match[0]} (distance {match[1]})")
+        return match[0]
+    return None
+
+
+def remember_slip(phash, transaction_id):
+    """Store the hash of an accepted slip."""
+    try:
+        add_slip_hash(transaction_id, np.asarray(phash, dtype=np.uint64).tobytes())
+    except Exception as e:
+        logger.error(f"Slip hash store failed: {e}")
+
+
+def reset_index():
+    """Forget the in-memory index (it is reloaded from the database on the next lookup)."""
+    global _index, _last_id
+    with _lock:
+        _index = SlipHashIndex()
+        _last_id = 0
@@ -0,0 +1,103 @@
+"""
+Staged processing of a payment photo for the bot.
+
+    1. download into memory, decode once with Pillow (no temp files)
+    2. NSFW screening and OCR of the same decoded image, concurrently
+    3. validation and the duplicate-TID check (handle_photo)
+
+NSFW screening and OCR do not depend on each other, so a slip takes about as
+long as the slower of the two instead of their sum. If screening flags the
+photo the OCR is cancelled: dropped if it has not started yet; a Tesseract
+run already in progress finishes on its thread and its result is discarded.
+
+Decoding and OCR run on a dedicated thread pool (SLIP_PIPELINE_WORKERS,
+default: 2) so they never block the bot's event loop; NSFW screening runs on
+nsfw_service's own pool.
+"""
+import asyncio
+import functools
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+try:
+    from .ocr_service import ocr_service
+    from .nsfw_service import NSFWQueueFull
+except ImportError:
+    # Imported with src/ on sys.path (bot, scripts)
+    from services.ocr_service import ocr_service
+    from services.nsfw_service import NSFWQueueFull
+
+logger = logging.getLogger(__name__)
+
+SLIP_PIPELINE_WORKERS = int(os.getenv("SLIP_PIPELINE_WORKERS", "2"))
+
+_executor = None
+
+
+def get_executor():
+    """Thread pool for decoding and OCR (created on first use)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SLIP_PIPELINE_WORKERS, thread_name_prefix="slip")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the pipeline's thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def decode_image(image_bytes):
+    """
+    Decode an uploaded photo.
+
+    Returns:
+        PIL.Image.Image: Fully loaded image, safe to read from several threads
+
+    Raises:
+        OSError: Not a readable image
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    return image
+
+
+async def screen_and_read(image, detector=None, read=True):
+    """
+    NSFW-screen and OCR a decoded photo concurrently.
+
+    Args:
+        image: Decoded PIL Image
+        detector: nsfw_service (or None to skip screening)
+        read: Whether to OCR the image (False when its text is already cached)
+
+    Returns:
+        tuple: (is_nsfw, text_lines). is_nsfw is None if the photo was not
+        screened (no detector or detector error); text_lines is None if OCR
+        was not requested or was cancelled because the photo was flagged.
+
+    Raises:
+        NSFWQueueFull: Screening queue is full. The OCR is cancelled too: a
+        photo is never passed on unscreened just because the bot is busy.
+    """
+    ocr = asyncio.ensure_future(run_blocking(ocr_service.extract_text, image)) if read else None
+    is_nsfw = None
+    if detector:
+        try:
+            is_nsfw = await detector.screen(image)
+        except NSFWQueueFull:
+            if ocr:
+                ocr.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"NSFW detection failed: {e}")
+    if is_nsfw:
+        if ocr:
+            ocr.cancel()
+        return True, None
+    return is_nsfw, (await ocr if ocr else None)
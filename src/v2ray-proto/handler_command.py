@@ -0,0 +1,223 @@
+"""
+Hand-encoded client/server helpers for Xray's HandlerService.AlterInbound.
+
+Xray-compatible cores add and remove inbound users at runtime with
+xray.app.proxyman.command.HandlerService/AlterInbound. The request carries an
+AddUserOperation or RemoveUserOperation wrapped in a TypedMessage. Generating
+stubs for it would pull in Xray's whole proto tree, including
+common/protocol, common/serial and each proxy's account. So the few messages
+needed are encoded by hand here, next to the protoc-generated stats stubs.
+Field numbers are from xray-core:
+
+    app/proxyman/command/command.proto
+        AlterInboundRequest  { string tag = 1; TypedMessage operation = 2; }
+        AddUserOperation     { User user = 1; }
+        RemoveUserOperation  { string email = 1; }
+    common/serial/typed_message.proto
+        TypedMessage         { string type = 1; bytes value = 2; }
+    common/protocol/user.proto
+        User                 { uint32 level = 1; string email = 2; TypedMessage account = 3; }
+    proxy/vless/account.proto
+        Account              { string id = 1; string flow = 2; string encryption = 3; }
+    proxy/shadowsocks/config.proto
+        Account              { string password = 1; CipherType cipher_type = 2; bool iv_check = 3; }
+    proxy/shadowsocks_2022/config.proto
+        Account              { string key = 1; }
+
+v2fly's v2ray-core uses the v2ray.core.* names and a different CipherType
+numbering; it is not supported.
+
+Import like the stats stubs, with src/v2ray-proto on sys.path:
+
+    import handler_command
+    stub = handler_command.HandlerServiceStub(channel)
+    stub.AlterInbound(handler_command.add_user_request('ss-in', email, account), timeout=2)
+"""
+import grpc
+
+SERVICE = 'xray.app.proxyman.command.HandlerService'
+ADD_USER_OPERATION = 'xray.app.proxyman.command.AddUserOperation'
+REMOVE_USER_OPERATION = 'xray.app.proxyman.command.RemoveUserOperation'
+VLESS_ACCOUNT = 'xray.proxy.vless.Account'
+SHADOWSOCKS_ACCOUNT = 'xray.proxy.shadowsocks.Account'
+SHADOWSOCKS_2022_ACCOUNT = 'xray.proxy.shadowsocks_2022.Account'
+
+# proxy/shadowsocks CipherType
+CIPHER_TYPES = {
+    'aes-128-gcm': 5,
+    'aes-256-gcm': 6,
+    'chacha20-poly1305': 7,
+    'chacha20-ietf-poly1305': 7,
+    'xchacha20-poly1305': 8,
+    'xchacha20-ietf-poly1305': 8,
+    'none': 9,
+    'plain': 9,
+}
+
+_VARINT = 0
+_LENGTH_DELIMITED = 2
+
+
+# --- Encoding ---------------------------------------------------------------
+# proto3: fields holding their default value are omitted
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _bytes_field(number, data):
+    if not data:
+        return b''
+    return _varint(number << 3 | _LENGTH_DELIMITED) + _varint(len(data)) + data
+
+
+def _string_field(number, text):
+    return _bytes_field(number, text.encode()) if text else b''
+
+
+def _uint_field(number, value):
+    if not value:
+        return b''
+    return _varint(number << 3 | _VARINT) + _varint(value)
+
+
+def typed_message(type_name, value):
+    return _string_field(1, type_name) + _bytes_field(2, value)
+
+
+def vless_account(uuid, flow=''):
+    """TypedMessage of a VLESS account."""
+    return typed_message(VLESS_ACCOUNT, _string_field(1, uuid) + _string_field(2, flow) + _string_field(3, 'none'))
+
+
+def shadowsocks_account(password, method):
+    """
+    TypedMessage of a Shadowsocks account for the inbound's method.
+
+    Raises:
+        ValueError: Unsupported method
+    """
+    if method.startswith('2022-'):
+        return typed_message(SHADOWSOCKS_2022_ACCOUNT, _string_field(1, password))
+    if method not in CIPHER_TYPES:
+        raise ValueError(f"Unsupported Shadowsocks method: {method}")
+    return typed_message(SHADOWSOCKS_ACCOUNT, _string_field(1, password) + _uint_field(2, CIPHER_TYPES[method]))
+
+
+def user(email, account, level=0):
+    """A common.protocol.User; account is a TypedMessage (vless_account, ...)."""
+    return _uint_field(1, level) + _string_field(2, email) + _bytes_field(3, account)
+
+
+def alter_inbound_request(tag, operation):
+    return _string_field(1, tag) + _bytes_field(2, operation)
+
+
+def add_user_request(tag, email, account, level=0):
+    """Encoded AlterInboundRequest adding a user to the inbound tag."""
+    operation = _bytes_field(1, user(email, account, level))
+    return alter_inbound_request(tag, typed_message(ADD_USER_OPERATION, operation))
+
+
+def remove_user_request(tag, email):
+    """Encoded AlterInboundRequest removing the user with this email from the inbound tag."""
+    return alter_inbound_request(tag, typed_message(REMOVE_USER_OPERATION, _string_field(1, email)))
+
+
+# --- Decoding (fake servers, tests) -----------------------------------------
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def decode_fields(data):
+    """
+    Split a message into its fields.
+
+    Returns:
+        dict: field number -> last value (int for varints, bytes otherwise)
+    """
+    fields = {}
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == _VARINT:
+            fields[number], pos = _read_varint(data, pos)
+        elif wire_type == _LENGTH_DELIMITED:
+            length, pos = _read_varint(data, pos)
+            fields[number] = data[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+    return fields
+
+
+def _decode_typed(data):
+    fields = decode_fields(data)
+    return fields.get(1, b'').decode(), fields.get(2, b'')
+
+
+def decode_alter_inbound_request(data):
+    """
+    Decode an AlterInboundRequest built by this module.
+
+    Returns:
+        dict: tag, operation (type name), email, and for adds level,
+        account_type and account (its decoded fields)
+    """
+    fields = decode_fields(data)
+    operation, value = _decode_typed(fields.get(2, b''))
+    request = {'tag': fields.get(1, b'').decode(), 'operation': operation}
+    op_fields = decode_fields(value)
+    if operation == REMOVE_USER_OPERATION:
+        request['email'] = op_fields.get(1, b'').decode()
+    elif operation == ADD_USER_OPERATION:
+        user_fields = decode_fields(op_fields.get(1, b''))
+        account_type, account = _decode_typed(user_fields.get(3, b''))
+        request.update(email=user_fields.get(2, b'').decode(), level=user_fields.get(1, 0),
+                       account_type=account_type, account=decode_fields(account))
+    return request
+
+
+# --- gRPC -------------------------------------------------------------------
+
+class HandlerServiceStub(object):
+    """AlterInbound only; takes the encoded request bytes."""
+
+    def __init__(self, channel):
+        self.AlterInbound = channel.unary_unary(
+                f'/{SERVICE}/AlterInbound',
+                request_serializer=None,
+                response_deserializer=None)
+
+
+def add_HandlerServiceServicer_to_server(servicer, server):
+    """
+    Serve servicer.AlterInbound(request, context), where request is a
+    decode_alter_inbound_request dict; its return value is ignored (the
+    response message is empty).
+    """
+    rpc_method_handlers = {
+            'AlterInbound': grpc.unary_unary_rpc_method_handler(
+                    servicer.AlterInbound,
+                    request_deserializer=decode_alter_inbound_request,
+                    response_serializer=lambda _response: b''),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(SERVICE, rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
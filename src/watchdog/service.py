@@ -18,16 +18,17 @@ except ImportError as e:
     sys.exit(1)
 
 from db.database import (
-    get_db_connection, update_usage, get_daily_usage, 
+    get_db_connection, update_usage_batch, get_active_daily_usage,
     expire_user, start_grace_period, end_grace_period,
     is_in_grace_period, get_grace_period_remaining,
     update_data_warning, has_warning_been_sent
 )
-from bot.config_manager import remove_vless_user
+from bot.config_queue import remove_vless_user
 from bot.notifications import (
     notify_data_warning, notify_grace_period_start,
     notify_grace_period_ending, notify_key_expired
 )
+from traffic_collector import collect_user_traffic, traffic_deltas
 
 # Configuration
 API_ENDPOINT = "127.0.0.1:10085"
@@ -46,25 +47,6 @@ def get_all_users():
     conn.close()
     return users
 
-def query_stats(stub, uuid, direction):
-    try:
-        pattern = f"user>>>{uuid}>>>traffic>>>{direction}"
-        request = command_pb2.QueryStatsRequest(
-            pattern=pattern,
-            reset=True  # Reset stats after reading to get delta
-        )
-        response = stub.QueryStats(request, timeout=5)
-        for stat in response.stat:
-            if direction in stat.name:
-                return stat.value
-        return 0
-    except grpc.RpcError as e:
-        # It's normal to not find stats if user hasn't connected
-        return 0
-    except Exception as e:
-        logger.error(f"Error querying {uuid} {direction}: {e}")
-        return 0
-
 def check_vless_limited_user(user, daily_gb):
     """
     Check and handle VLESS Limited user data usage with warnings and grace period.
@@ -100,6 +82,7 @@ def check_vless_limited_user(user, daily_gb):
             # Grace period expired
             logger.warning(f"User {uuid} grace period ended, expiring key")
             end_grace_period(uuid)
+            # Queued: expiries found in the same check share one config write and reload
             remove_vless_user(uuid)
             notify_key_expired(telegram_id, reason='grace_period_ended')
             return False
@@ -138,28 +121,35 @@ def main():
         logger.fatal(f"Failed to connect to API: {e}")
         return
 
+    previous = None  # Counter totals from the last successful read
     while True:
         try:
             users = get_all_users()
             logger.debug(f"Checking {len(users)} active users")
             
+            # Read every user's traffic counters in one RPC; diff against the last read
+            traffic = collect_user_traffic(stub)
+            if traffic is not None:
+                deltas = traffic_deltas(previous, traffic)
+                previous = traffic
+
+                # Record the active users' deltas in a single transaction. Counters
+                # of other users are not reset, so nothing of theirs is lost.
+                active = {user_row['uuid'] for user_row in users}
+                deltas = {uuid: total for uuid, total in deltas.items() if uuid in active}
+                for uuid, total_bytes in deltas.items():
+                    logger.debug(f"User {uuid} traffic: +{total_bytes/1024/1024:.2f} MB")
+                update_usage_batch(deltas)
+
+            # Every active user's daily usage in one query
+            daily_usage = get_active_daily_usage()
+
             for user_row in users:
                 user = dict(user_row)
                 uuid = user['uuid']
                 protocol = user.get('protocol', 'ss')
-                
-                # Get traffic delta
-                down = query_stats(stub, uuid, "downlink")
-                up = query_stats(stub, uuid, "uplink")
-                total_bytes = down + up
-                
-                if total_bytes > 0:
-                    update_usage(uuid, total_bytes)
-                    logger.debug(f"User {uuid} traffic: +{total_bytes/1024/1024:.2f} MB")
-                    
-                # Get daily usage
-                daily_usage = get_daily_usage(uuid)
-                daily_gb = daily_usage / (1024**3)
+
+                daily_gb = daily_usage.get(uuid, 0) / (1024**3)
                 
                 # Only monitor VLESS Limited keys with data limits
                 if protocol == 'vless_limited':
@@ -0,0 +1,114 @@
+"""
+Bulk traffic collection for the watchdog.
+
+Pulls every per-user traffic counter from the core's StatsService in a single
+QueryStats call instead of two calls (uplink + downlink) per user.
+
+Counters are read without resetting them. A reset would also zero the
+counters of users the cycle does not record (inactive or unknown keys), and
+their traffic would be lost. traffic_deltas() diffs each read against the
+previous one instead. A counter that went down was recreated by a core
+restart or reload, so its whole value is new traffic. The first read after
+the watchdog starts is only a baseline: counting it would record again
+traffic the previous run already logged.
+"""
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger("Watchdog")
+
+# Matches every "user>>>{uuid}>>>traffic>>>{direction}" counter
+USER_STATS_PATTERN = "user>>>"
+STAT_SEPARATOR = ">>>"
+DIRECTIONS = ("uplink", "downlink")
+
+
+def parse_stat_name(name):
+    """
+    Split a stat counter name into its user and direction.
+
+    Args:
+        name: Counter name, e.g. "user>>>{uuid}>>>traffic>>>downlink"
+
+    Returns:
+        tuple: (uuid, direction), or None if the name is not a user traffic counter
+    """
+    parts = name.split(STAT_SEPARATOR)
+    if len(parts) != 4 or parts[0] != "user" or parts[2] != "traffic":
+        return None
+    if parts[3] not in DIRECTIONS or not parts[1]:
+        return None
+    return parts[1], parts[3]
+
+
+def parse_user_stats(stats):
+    """
+    Fold a QueryStats response into a per-user traffic map.
+
+    Args:
+        stats: Iterable of Stat messages (anything with .name and .value)
+
+    Returns:
+        dict: {uuid: {'uplink': bytes, 'downlink': bytes}}
+    """
+    traffic = defaultdict(lambda: {"uplink": 0, "downlink": 0})
+    for stat in stats:
+        parsed = parse_stat_name(stat.name)
+        if parsed is None:
+            continue
+        uuid, direction = parsed
+        traffic[uuid][direction] += stat.value
+    return dict(traffic)
+
+
+def collect_user_traffic(stub, timeout=10):
+    """
+    Read all user traffic counters with one RPC (totals, not reset).
+
+    Args:
+        stub: StatsServiceStub connected to the core API
+        timeout: RPC deadline in seconds
+
+    Returns:
+        dict: {uuid: {'uplink': bytes, 'downlink': bytes}}, or None if the
+        query fails, so a bad cycle never blocks the watchdog loop.
+    """
+    import grpc
+    import command_pb2
+
+    request = command_pb2.QueryStatsRequest(
+        pattern=USER_STATS_PATTERN,
+        reset=False  # Deltas come from traffic_deltas(); see the module docstring
+    )
+    try:
+        response = stub.QueryStats(request, timeout=timeout)
+    except grpc.RpcError as e:
+        logger.error(f"Bulk stats query failed: {e.code()} - {e.details()}")
+        return None
+    return parse_user_stats(response.stat)
+
+
+def traffic_deltas(previous, current):
+    """
+    Traffic since the previous read, per user.
+
+    Args:
+        previous: Counter totals from the previous read (None on the first)
+        current: Counter totals from this read (collect_user_traffic)
+
+    Returns:
+        dict: {uuid: bytes} of users with new traffic; empty on the first read
+    """
+    if previous is None:
+        return {}
+    deltas = {}
+    for uuid, counters in current.items():
+        before = previous.get(uuid, {})
+        total = 0
+        for direction in DIRECTIONS:
+            now, then = counters[direction], before.get(direction, 0)
+            # A lower value means the counter was recreated (core restart/reload)
+            total += now - then if now >= then else now
+        if total > 0:
+            deltas[uuid] = total
+    return deltas
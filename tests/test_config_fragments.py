@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import hashlib
+import json
+import tempfile
+from unittest import mock
+
+# Add project root (config_manager imports src.bot.config) and src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from bot import config_manager
+from bot.config_model import SingboxConfig
+
+# The module config_manager reads CONFIG_LAYOUT from
+config_fragments = config_manager.config_fragments
+
+CONFIG = {
+    "log": {"level": "warn"},
+    "inbounds": [
+        {"type": "vless", "tag": "vless-in", "listen_port": 8443,
+         "users": [{"uuid": "u-1", "flow": "xtls-rprx-vision", "name": "User1"}],
+         "tls": {"enabled": True, "reality": {"enabled": True, "short_id": ["6ba85179e30d4fc2"]}}},
+        {"type": "vless", "tag": "vless-limited-in", "users": []},
+        {"type": "shadowsocks", "tag": "ss-in", "users": [{"password": "p-1", "name": "User2"}]},
+        {"type": "shadowsocks", "tag": "ss-legacy-in", "password": "shared"},
+    ],
+    "outbounds": [{"type": "direct", "tag": "direct"}],
+    "experimental": {"v2ray_api": {"listen": "127.0.0.1:10085", "stats": {"enabled": True, "users": ["u-1"]}}},
+}
+
+def by_tag(config):
+    return {inbound['tag']: inbound for inbound in config['inbounds']}
+
+class TestConfigFragments(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.dir = self.tmpdir.name
+        for patch in (mock.patch.object(config_fragments, 'CONFIG_LAYOUT', 'fragments'),
+                      mock.patch.object(config_fragments, 'CONFIG_FRAGMENT_DIR', self.dir),
+                      mock.patch.object(config_manager, 'reload_service'),
+                      mock.patch('builtins.print')):
+            patch.start()
+            self.addCleanup(patch.stop)
+        config_fragments.write_fragments(config_fragments.split(CONFIG))
+
+    def read(self, name):
+        with open(os.path.join(self.dir, name), 'rb') as f:
+            return f.read()
+
+    def test_split_round_trip(self):
+        self.assertEqual(sorted(os.listdir(self.dir)), [
+            '00-base.json', '10-ss-in.json', '10-vless-in.json', '10-vless-limited-in.json', '90-experimental.json'])
+        self.assertEqual(json.loads(self.read('00-base.json'))['inbounds'], [CONFIG['inbounds'][3]])
+        merged = config_manager.load_config()
+        self.assertEqual(by_tag(merged), by_tag(CONFIG))
+        self.assertEqual({k: v for k, v in merged.items() if k != 'inbounds'},
+                         {k: v for k, v in CONFIG.items() if k != 'inbounds'})
+
+    def test_merge(self):
+        merged = config_fragments.merge({"a": [1], "b": {"x": 1, "y": 1}, "c": 1},
+                                        {"a": [2], "b": {"y": 2}, "c": 2, "d": 3})
+        self.assertEqual(merged, {"a": [1, 2], "b": {"x": 1, "y": 2}, "c": 2, "d": 3})
+
+    def test_mutation_writes_only_its_fragment(self):
+        before = {name: self.read(name) for name in os.listdir(self.dir)}
+        with mock.patch.object(config_fragments, 'write_bytes', wraps=config_fragments.write_bytes) as write:
+            self.assertTrue(config_manager.add_ss_user('p-2', 'User3'))
+        self.assertEqual([os.path.basename(c.args[0]) for c in write.call_args_list], ['10-ss-in.json'])
+        for name, data in before.items():
+            if name != '10-ss-in.json':
+                self.assertEqual(self.read(name), data)
+        users = json.loads(self.read('10-ss-in.json'))['inbounds'][0]['users']
+        self.assertEqual([u['password'] for u in users], ['p-1', 'p-2'])
+        config_manager.reload_service.assert_called_once()
+
+    def test_vless_add_writes_inbound_and_stats(self):
+        with mock.patch.object(config_fragments, 'write_bytes', wraps=config_fragments.write_bytes) as write:
+            config_manager.add_user_to_config('u-2', 'User4', limit_mbps=12)
+        self.assertEqual(sorted(os.path.basename(c.args[0]) for c in write.call_args_list),
+                         ['10-vless-limited-in.json', '90-experimental.json'])
+        stats = json.loads(self.read('90-experimental.json'))['experimental']['v2ray_api']['stats']['users']
+        self.assertEqual(stats, ['u-1', 'u-2'])
+
+    def test_save_model_digests(self):
+        config = SingboxConfig(config_manager.load_config())
+        config.remove_user('vless-in', 'u-1')
+        digests = config_manager.save_model(config)
+        self.assertEqual(list(digests), ['10-vless-in.json'])
+        self.assertEqual(digests['10-vless-in.json'], hashlib.sha256(self.read('10-vless-in.json')).hexdigest())
+
+    def test_unchanged_model_writes_nothing(self):
+        self.assertEqual(config_manager.save_model(SingboxConfig(config_manager.load_config())), {})
+
+if __name__ == '__main__':
+    unittest.main()
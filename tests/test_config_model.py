@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os
+import copy
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from bot.config_model import SingboxConfig
+
+CONFIG = {
+    "log": {"level": "warn"},
+    "inbounds": [
+        {"type": "vless", "tag": "vless-in", "listen_port": 8443,
+         "users": [{"uuid": "u-1", "flow": "xtls-rprx-vision", "name": "User1"}],
+         "tls": {"enabled": True, "reality": {"enabled": True, "short_id": ["6ba85179e30d4fc2"]}}},
+        {"type": "vless", "tag": "vless-limited-in", "users": []},
+        {"type": "shadowsocks", "tag": "ss-in", "method": "chacha20-ietf-poly1305",
+         "users": [{"password": "p-1", "name": "User2"}]},
+        {"type": "tuic", "tag": "tuic-in"},
+    ],
+    "outbounds": [{"type": "direct", "tag": "direct"}],
+    "experimental": {"v2ray_api": {"listen": "127.0.0.1:10085", "stats": {"enabled": True, "users": ["u-1"]}}},
+}
+
+class TestSingboxConfig(unittest.TestCase):
+    def setUp(self):
+        self.original = copy.deepcopy(CONFIG)
+        self.config = SingboxConfig(CONFIG)
+
+    def tearDown(self):
+        # The parsed document is never modified in place
+        self.assertEqual(CONFIG, self.original)
+
+    def test_round_trip(self):
+        self.assertEqual(self.config.to_dict(), CONFIG)
+
+    def test_lookup(self):
+        self.assertEqual(self.config.inbound('ss-in').key_field, 'password')
+        self.assertEqual([i.tag for i in self.config.inbounds_of_type('vless')], ['vless-in', 'vless-limited-in'])
+        self.assertTrue(self.config.has_user('ss-in', 'p-1'))
+        self.assertFalse(self.config.has_user('ss-in', 'u-1'))
+        self.assertEqual(self.config.locate('vless', 'u-1'), 'vless-in')
+        self.assertIsNone(self.config.inbound('missing'))
+
+    def test_add_and_remove(self):
+        self.assertTrue(self.config.add_user('tuic-in', {"uuid": "u-2", "password": "u-2", "name": "User3"}))
+        self.assertFalse(self.config.add_user('tuic-in', {"uuid": "u-2", "password": "u-2", "name": "Again"}))
+        self.assertFalse(self.config.add_user('missing', {"uuid": "u-2"}))
+        self.assertTrue(self.config.remove_user('ss-in', 'p-1'))
+        self.assertFalse(self.config.remove_user('ss-in', 'p-1'))
+
+        inbounds = {i['tag']: i for i in self.config.to_dict()['inbounds']}
+        self.assertEqual(inbounds['tuic-in']['users'], [{"uuid": "u-2", "password": "u-2", "name": "User3"}])
+        self.assertEqual(inbounds['ss-in']['users'], [])
+
+    def test_move(self):
+        user = {"uuid": "u-1", "flow": "xtls-rprx-vision", "name": "User1-limited"}
+        self.assertEqual(self.config.move_user('vless-limited-in', user), ['vless-in'])
+        self.assertEqual(self.config.locate('vless', 'u-1'), 'vless-limited-in')
+        self.assertFalse(self.config.has_user('vless-in', 'u-1'))
+        # Moving to where it already is just replaces the entry
+        self.assertEqual(self.config.move_user('vless-limited-in', user), [])
+        self.assertEqual(self.config.remove_user_everywhere('vless', 'u-1'), ['vless-limited-in'])
+        self.assertIsNone(self.config.locate('vless', 'u-1'))
+
+    def test_move_to_current_inbound_is_a_no_op(self):
+        user = {"uuid": "u-1", "flow": "xtls-rprx-vision", "name": "User1"}
+        self.assertEqual(self.config.move_user('vless-in', user), [])
+        self.assertEqual(self.config.changed_tags, set())
+        self.assertEqual(self.config.journal, [])
+        self.assertEqual(self.config.to_dict(), CONFIG)
+
+    def test_key_in_two_inbounds(self):
+        config = copy.deepcopy(CONFIG)
+        config['inbounds'][1]['users'] = [{"uuid": "u-1", "name": "Stale"}]
+        model = SingboxConfig(config)
+        self.assertEqual(model.remove_user_everywhere('vless', 'u-1'), ['vless-in', 'vless-limited-in'])
+
+    def test_stats_users(self):
+        self.assertFalse(self.config.add_stats_user('u-1'))
+        self.assertTrue(self.config.add_stats_user('u-2'))
+        self.assertEqual(self.config.to_dict()['experimental']['v2ray_api']['stats']['users'], ['u-1', 'u-2'])
+        self.assertFalse(SingboxConfig({"inbounds": []}).add_stats_user('u-2'))
+        self.assertTrue(self.config.remove_stats_user('u-1'))
+        self.assertFalse(self.config.remove_stats_user('u-1'))
+        self.assertEqual(self.config.to_dict()['experimental']['v2ray_api']['stats']['users'], ['u-2'])
+
+if __name__ == '__main__':
+    unittest.main()
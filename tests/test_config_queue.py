@@ -0,0 +1,165 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
+
+# Add project root (config_manager imports src.bot.config) and src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from bot import config_manager
+from bot.config_queue import ConfigWriteQueue
+
+BASE_CONFIG = {
+    "inbounds": [
+        {"type": "vless", "tag": "vless-in", "users": [{"uuid": "u-0", "flow": "xtls-rprx-vision", "name": "User0"}]},
+        {"type": "vless", "tag": "vless-limited-in", "users": []},
+        {"type": "shadowsocks", "tag": "ss-in", "users": []},
+        {"type": "tuic", "tag": "tuic-in", "users": []},
+    ]
+}
+
+class TestApplyOps(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'config.json')
+        with open(self.path, 'w') as f:
+            json.dump(BASE_CONFIG, f)
+
+        def save_config(config):
+            with open(self.path, 'w') as f:
+                json.dump(config, f)
+            return True
+
+        patches = [
+            mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', self.path),
+            mock.patch.object(config_manager, 'save_config', side_effect=save_config),
+            mock.patch.object(config_manager, 'reload_service'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def load(self):
+        with open(self.path) as f:
+            return {inbound['tag']: inbound['users'] for inbound in json.load(f)['inbounds']}
+
+    def test_batch_is_one_save_and_one_reload(self):
+        results = config_manager.apply_ops([
+            ('add_vless', ('u-1', 'User1', 12.0)),
+            ('add_ss', ('p-1', 'User2')),
+            ('add_ss', ('p-1', 'User2')),          # already there
+            ('add_vless', ('u-0', 'User0', 12.0)),  # moves to the limited inbound
+            ('add_vless_plain', ('u-3', 'User3')),  # no such inbound
+        ])
+        self.assertEqual(results, [True, True, False, True, False])
+        self.assertEqual(config_manager.save_config.call_count, 1)
+        self.assertEqual(config_manager.reload_service.call_count, 1)
+
+        users = self.load()
+        self.assertEqual(users['vless-in'], [])
+        self.assertEqual([u['uuid'] for u in users['vless-limited-in']], ['u-1', 'u-0'])
+        self.assertEqual(users['ss-in'], [{'password': 'p-1', 'name': 'User2'}])
+
+    def test_no_change_no_write(self):
+        self.assertEqual(config_manager.add_tuic_user('u-0', 'User0'), True)
+        self.assertEqual(config_manager.add_tuic_user('u-0', 'User0'), False)
+        self.assertEqual(config_manager.remove_ss_user('missing'), False)
+        self.assertEqual(config_manager.add_user_to_config('u-0', 'User0'), False)
+        self.assertEqual(config_manager.save_config.call_count, 1)
+        self.assertEqual(config_manager.reload_service.call_count, 1)
+
+    def test_unmanaged_inbound_users_survive_a_save(self):
+        # socks/trojan users have no uuid; they must not collapse to one entry
+        socks = [{"username": "a", "password": "pa"}, {"username": "b", "password": "pb"}]
+        trojan = [{"name": "t1", "password": "x"}, {"name": "t2", "password": "y"}]
+        config = dict(BASE_CONFIG, inbounds=BASE_CONFIG['inbounds'] + [
+            {"type": "socks", "tag": "socks-in", "users": socks},
+            {"type": "trojan", "tag": "trojan-in", "users": trojan},
+        ])
+        with open(self.path, 'w') as f:
+            json.dump(config, f)
+
+        self.assertTrue(config_manager.add_ss_user('p-1', 'User2'))
+        users = self.load()
+        self.assertEqual(users['socks-in'], socks)
+        self.assertEqual(users['trojan-in'], trojan)
+
+class TestConfigWriteQueue(unittest.TestCase):
+    def test_burst_is_one_batch(self):
+        batches = []
+
+        def apply(ops):
+            batches.append(ops)
+            return [op == 'add_ss' for op, _ in ops]
+
+        writes = ConfigWriteQueue(apply=apply, debounce=0.2)
+        futures = []
+
+        def purchase(i):
+            futures.append(writes.submit('add_ss' if i % 2 else 'remove_ss', f'p-{i}', f'User{i}'))
+
+        threads = [threading.Thread(target=purchase, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results = [f.result(timeout=5) for f in futures]
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 10)
+        self.assertEqual(sorted(results), [False] * 5 + [True] * 5)
+
+    def test_max_delay_closes_a_busy_batch(self):
+        writes = ConfigWriteQueue(apply=lambda ops: [True] * len(ops), debounce=0.2, max_delay=0.3)
+        futures = []
+        for i in range(8):
+            futures.append(writes.submit('remove_vless', f'u-{i}'))
+            time.sleep(0.1)
+        for future in futures:
+            self.assertTrue(future.result(timeout=5))
+        self.assertGreater(writes.batches, 1)
+
+    def test_failed_write_fails_the_whole_batch(self):
+        def apply(ops):
+            raise TimeoutError("Could not acquire lock")
+
+        writes = ConfigWriteQueue(apply=apply, debounce=0.05)
+        futures = [writes.submit('add_tuic', f'u-{i}', f'User{i}') for i in range(3)]
+        for future in futures:
+            with self.assertRaises(TimeoutError):
+                future.result(timeout=5)
+
+        with self.assertRaises(ValueError):
+            writes.submit('drop_everything')
+
+    def test_dead_writer_fails_pending_futures(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def apply(ops):
+            started.set()
+            release.wait(5)
+            raise SystemExit
+
+        writes = ConfigWriteQueue(apply=apply, debounce=0.05)
+        first = writes.submit('add_tuic', 'u-1', 'User1')
+        self.assertTrue(started.wait(5))
+        queued = writes.submit('add_tuic', 'u-2', 'User2')
+        release.set()
+        for future in (first, queued):
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+        # A fresh writer picks up later changes
+        writes.apply = lambda ops: [True] * len(ops)
+        self.assertTrue(writes.submit('add_tuic', 'u-3', 'User3').result(timeout=5))
+
+if __name__ == '__main__':
+    unittest.main()
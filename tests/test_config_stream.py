@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import copy
+import hashlib
+import json
+import tempfile
+from unittest import mock
+
+# Add project root (config_manager imports src.bot.config) and src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from bot import config_manager, config_stream, config_writer, reconcile
+from bot.config_model import SingboxConfig
+
+CONFIG = {
+    "log": {"level": "warn"},
+    "inbounds": [
+        {"type": "vless", "tag": "vless-in", "listen_port": 8443,
+         "users": [{"uuid": "old", "flow": "xtls-rprx-vision", "name": "old"}],
+         "tls": {"enabled": True, "server_name": "www.example.com",
+                 "reality": {"enabled": True, "short_id": ["6ba85179e30d4fc2"]}}},
+        {"type": "vless", "tag": "vless-limited-in", "users": []},
+        {"type": "shadowsocks", "tag": "ss-in", "method": "chacha20-ietf-poly1305", "users": []},
+        {"type": "tuic", "tag": "tuic-in", "users": []},
+        {"type": "shadowsocks", "tag": "ss-legacy-in", "password": "shared"},
+    ],
+    "outbounds": [{"type": "direct", "tag": "direct"}],
+    "route": {"rules": [{"inbound": ["vless-limited-in"], "outbound": "direct"}]},
+    "experimental": {"v2ray_api": {"listen": "127.0.0.1:10085", "stats": {"enabled": True, "users": ["old"]}}},
+}
+
+class TestConfigStream(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        with mock.patch('builtins.print'):
+            database.init_db()
+            database.add_user('v-1', 1, 'alice', protocol='vless')
+            database.add_user('v-2', 2, 'bob "quoted"', protocol='vless')
+            database.add_user('l-1', 3, None, protocol='vless_limited')
+            database.add_user('s-1', 4, 'carol', protocol='ss')
+            database.add_user('t-1', 5, 'dave', protocol='tuic')
+            database.add_user('t-2', 6, 'erin', protocol='admin_tuic')
+            database.add_user('off', 7, 'frank', protocol='ss')
+            database.deactivate_user('off')
+        self.path = os.path.join(self.tmpdir.name, 'config.json')
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_template_keeps_static_parts(self):
+        template = config_stream.make_template(CONFIG)
+        self.assertEqual(template['inbounds'][0]['users'], [])
+        self.assertEqual(template['inbounds'][0]['tls'], CONFIG['inbounds'][0]['tls'])
+        self.assertEqual(template['inbounds'][4], CONFIG['inbounds'][4])
+        self.assertEqual(template['experimental']['v2ray_api']['stats'], {"enabled": True, "users": []})
+        self.assertEqual(CONFIG['inbounds'][0]['users'][0]['uuid'], 'old')
+
+    def test_render(self):
+        # Small batches to exercise batch splicing
+        data = b''.join(config_stream.render(config_stream.make_template(CONFIG), batch_size=1))
+        config = json.loads(data)
+
+        expected = copy.deepcopy(CONFIG)
+        expected['inbounds'][0]['users'] = [
+            {"uuid": "v-1", "flow": "xtls-rprx-vision", "name": "alice"},
+            {"uuid": "v-2", "flow": "xtls-rprx-vision", "name": 'bob "quoted"'}]
+        expected['inbounds'][1]['users'] = [{"uuid": "l-1", "flow": "xtls-rprx-vision", "name": "User3"}]
+        expected['inbounds'][2]['users'] = [{"password": "s-1", "name": "carol"}]
+        expected['inbounds'][3]['users'] = [{"uuid": "t-1", "password": "t-1", "name": "dave"},
+                                            {"uuid": "t-2", "password": "t-2", "name": "erin"}]
+        expected['experimental']['v2ray_api']['stats']['users'] = ['v-1', 'v-2', 'l-1']
+        self.assertEqual(config, expected)
+        # Compact output, same bytes as serializing the whole document
+        self.assertEqual(data, json.dumps(expected, separators=(',', ':')).encode())
+
+        # The reconciler finds nothing to change
+        plan = reconcile.compute_plan(SingboxConfig(config), database.get_provisioned_keys())
+        self.assertTrue(plan.empty)
+
+    def test_generate_config(self):
+        template_path = os.path.join(self.tmpdir.name, 'config.template.json')
+        config_stream.save_template(CONFIG, template_path)
+        with mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', self.path), \
+             mock.patch.object(config_stream, 'CONFIG_TEMPLATE_PATH', template_path), \
+             mock.patch.object(config_manager, 'FileLock', lambda: mock.MagicMock()):
+            digest = config_stream.generate_config(mode='direct')
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(len(json.loads(data)['inbounds'][3]['users']), 2)
+
+    def test_failed_stream_keeps_old_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{}')
+
+        def chunks():
+            yield b'{"inbounds":['
+            raise RuntimeError("cursor died")
+
+        with self.assertRaises(RuntimeError):
+            config_writer.write_stream(self.path, chunks(), mode='direct')
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '{}')
+        # No temp file left behind
+        self.assertFalse([n for n in os.listdir(self.tmpdir.name) if n.startswith('.config.json')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import sys
+import os
+import hashlib
+import json
+import subprocess
+import tempfile
+from unittest import mock
+
+# Add project root (config_manager imports src.bot.config) and src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from bot import config_manager, config_writer
+from bot.config_writer import write_config, write_bytes, ConfigWriteError
+
+HELPER = os.path.join(project_root, 'scripts', 'singbox_config_write.py')
+CONFIG = {"inbounds": [{"type": "shadowsocks", "tag": "ss-in", "users": []}]}
+
+class TestConfigWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'config.json')
+
+    def test_atomic_write(self):
+        with open(self.path, 'w') as f:
+            f.write('{}')
+        os.chmod(self.path, 0o640)
+
+        digest = write_config(self.path, CONFIG, mode='direct')
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(json.loads(data), CONFIG)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        # No temp files left behind
+        self.assertEqual(os.listdir(self.tmpdir.name), ['config.json'])
+
+    def test_indented_unless_compact_is_chosen(self):
+        self.assertEqual(config_writer.serialize(CONFIG), json.dumps(CONFIG, indent=2).encode())
+        with mock.patch.object(config_writer, 'CONFIG_JSON_INDENT', 0):
+            self.assertEqual(config_writer.serialize(CONFIG), json.dumps(CONFIG, separators=(',', ':')).encode())
+
+    def test_failed_write_keeps_old_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{}')
+        with mock.patch.object(config_writer.os, 'replace', side_effect=OSError("disk full")):
+            with self.assertRaises(ConfigWriteError):
+                write_bytes(self.path, b'{"inbounds": []}', mode='direct')
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '{}')
+        self.assertEqual(os.listdir(self.tmpdir.name), ['config.json'])
+
+    def test_helper_digest_must_match(self):
+        data = b'{"inbounds": []}'
+        digest = hashlib.sha256(data).hexdigest()
+        ok = subprocess.CompletedProcess([], 0, stdout=f"{digest}\n".encode(), stderr=b'')
+        with mock.patch.object(config_writer.subprocess, 'run', return_value=ok) as run:
+            self.assertEqual(write_bytes(self.path, data, mode='helper'), digest)
+        self.assertEqual(run.call_args.args[0], ["sudo", "-n", config_writer.CONFIG_WRITE_HELPER, self.path])
+        self.assertEqual(run.call_args.kwargs['input'], data)
+
+        bad = subprocess.CompletedProcess([], 0, stdout=b"0" * 64, stderr=b'')
+        with mock.patch.object(config_writer.subprocess, 'run', return_value=bad):
+            with self.assertRaises(ConfigWriteError):
+                write_bytes(self.path, data, mode='helper')
+
+    def test_helper_refuses_other_directories(self):
+        result = subprocess.run([sys.executable, HELPER, self.path], input=b'{}', capture_output=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn(b'refusing', result.stderr)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_save_config_returns_digest(self):
+        with mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', self.path), \
+             mock.patch.object(config_writer, 'CONFIG_WRITE_MODE', 'auto'):
+            digest = config_manager.save_config(CONFIG)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(digest, hashlib.sha256(f.read()).hexdigest())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import asyncio
+import sys
+import os
+import threading
+import time
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db.aio import run_db, shutdown_db_executor
+
+class TestRunDb(unittest.TestCase):
+    def tearDown(self):
+        shutdown_db_executor()
+
+    def test_runs_off_the_event_loop_thread(self):
+        async def main():
+            return await run_db(lambda a, b=0: (threading.get_ident(), a + b), 1, b=2)
+
+        ident, value = asyncio.run(main())
+        self.assertEqual(value, 3)
+        self.assertNotEqual(ident, threading.get_ident())
+
+    def test_exceptions_propagate(self):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run_db(fail))
+
+    def test_loop_stays_responsive(self):
+        async def main():
+            slow = asyncio.ensure_future(run_db(time.sleep, 0.3))
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            ticked = time.perf_counter() - start
+            await slow
+            return ticked
+
+        self.assertLess(asyncio.run(main()), 0.2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db.pool import ConnectionPool, get_pool, close_all_pools
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'pool.db')
+
+    def tearDown(self):
+        close_all_pools()
+        self.tmpdir.cleanup()
+
+    def test_pragmas_applied(self):
+        pool = ConnectionPool(self.db_path, synchronous='NORMAL', busy_timeout_ms=1234, cache_size=-1000)
+        conn = pool.connection()
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+        self.assertEqual(conn.execute('PRAGMA busy_timeout').fetchone()[0], 1234)
+        self.assertEqual(conn.execute('PRAGMA cache_size').fetchone()[0], -1000)
+        pool.close_all()
+
+    def test_connection_reused_per_thread(self):
+        pool = get_pool(self.db_path)
+        conn = pool.connection()
+        conn.close()
+        self.assertIs(pool.connection(), conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_close_rolls_back_uncommitted_work(self):
+        pool = get_pool(self.db_path)
+        conn = pool.connection()
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.execute('INSERT INTO t VALUES (1)')
+        conn.close()
+
+        conn = pool.connection()
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM t').fetchone()[0], 0)
+        conn.execute('INSERT INTO t VALUES (2)')
+        conn.commit()
+        conn.close()
+        self.assertEqual(pool.connection().execute('SELECT COUNT(*) FROM t').fetchone()[0], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from services.image_preprocess import (
+    PreprocessOptions, preprocess, rescale_to_dpi, crop_margins, otsu_threshold, binarize
+)
+
+def slip(size=(1080, 2400), background='white', ink='black'):
+    image = Image.new('RGB', size, background)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((200, 300, 880, 900), fill=ink)
+    return image
+
+class TestImagePreprocess(unittest.TestCase):
+    def test_rescale_targets_nominal_dpi(self):
+        image = rescale_to_dpi(slip(), PreprocessOptions(target_dpi=300).target_width)
+        self.assertEqual(image.size, (900, 2000))
+        # Small images are enlarged
+        self.assertEqual(rescale_to_dpi(slip((450, 800)), 900).size, (900, 1600))
+        # Close enough: untouched
+        original = slip((880, 1000))
+        self.assertIs(rescale_to_dpi(original, 900), original)
+
+    def test_crop_margins(self):
+        cropped = crop_margins(slip(), padding=10)
+        self.assertEqual(cropped.size, (681 + 20, 601 + 20))
+        # Nothing but background: untouched
+        blank = Image.new('L', (100, 100), 255)
+        self.assertIs(crop_margins(blank), blank)
+
+    def test_otsu_separates_two_levels(self):
+        gray = np.array([[30] * 50 + [200] * 50], dtype=np.uint8)
+        threshold = otsu_threshold(gray)
+        self.assertTrue(30 <= threshold < 200)
+        self.assertEqual(otsu_threshold(np.full((4, 4), 128, dtype=np.uint8)), 0)
+
+    def test_binarize_makes_text_dark_on_light(self):
+        for background, ink in (('white', 'black'), ('black', 'white'), ((40, 40, 40), (190, 190, 190))):
+            result = np.asarray(binarize(slip((400, 1000), background, ink)))
+            self.assertEqual(set(np.unique(result)), {0, 255})
+            self.assertEqual(result[0, 0], 255)
+            self.assertEqual(result[500, 300], 0)
+
+    def test_steps_are_toggleable(self):
+        image = slip()
+        self.assertEqual(preprocess(image, PreprocessOptions(grayscale=False, rescale=False, crop=False)).mode, 'RGB')
+        self.assertEqual(preprocess(image, PreprocessOptions(rescale=False, crop=False)).size, image.size)
+        self.assertEqual(preprocess(image, PreprocessOptions(crop=False)).size, (900, 2000))
+
+        result = preprocess(image, PreprocessOptions(binarize=True))
+        self.assertEqual(result.mode, 'L')
+        self.assertLess(result.width * result.height, image.width * image.height / 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from concurrent import futures
+from unittest import mock
+
+import grpc
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+# Add project root (config_manager imports src.bot.config), src and the proto stubs to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'src'))
+sys.path.insert(0, os.path.join(project_root, 'src', 'v2ray-proto'))
+
+import handler_command
+from bot import config_manager
+from bot.config_model import SingboxConfig
+
+live_users = config_manager.live_users
+
+CONFIG = {
+    "inbounds": [
+        {"type": "vless", "tag": "vless-in", "users": [{"uuid": "u-1", "flow": "xtls-rprx-vision", "name": "User1"}]},
+        {"type": "vless", "tag": "vless-limited-in", "users": []},
+        {"type": "shadowsocks", "tag": "ss-in", "method": "chacha20-ietf-poly1305", "users": []},
+        {"type": "tuic", "tag": "tuic-in", "users": []},
+    ],
+}
+
+class FakeHandlerService:
+    """Records AlterInbound calls; rejects adds of emails in self.reject."""
+
+    def __init__(self):
+        self.requests = []
+        self.reject = set()
+
+    def AlterInbound(self, request, context):
+        self.requests.append(request)
+        if request.get('email') in self.reject:
+            context.abort(grpc.StatusCode.UNKNOWN, f"User {request['email']} already exists.")
+        return None
+
+def xray_messages():
+    """The Xray messages used here, built from descriptors to cross-check the hand encoding."""
+    def message(name, *fields):
+        proto = descriptor_pb2.DescriptorProto(name=name)
+        for number, field_name, field_type, type_name in fields:
+            field = proto.field.add(name=field_name, number=number, type=field_type,
+                                    label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL)
+            if type_name:
+                field.type_name = type_name
+        return proto
+
+    T = descriptor_pb2.FieldDescriptorProto
+    file_proto = descriptor_pb2.FileDescriptorProto(name='xray_test.proto', package='xray', syntax='proto3')
+    file_proto.message_type.extend([
+        message('TypedMessage', (1, 'type', T.TYPE_STRING, None), (2, 'value', T.TYPE_BYTES, None)),
+        message('User', (1, 'level', T.TYPE_UINT32, None), (2, 'email', T.TYPE_STRING, None),
+                (3, 'account', T.TYPE_MESSAGE, '.xray.TypedMessage')),
+        message('AddUserOperation', (1, 'user', T.TYPE_MESSAGE, '.xray.User')),
+        message('AlterInboundRequest', (1, 'tag', T.TYPE_STRING, None),
+                (2, 'operation', T.TYPE_MESSAGE, '.xray.TypedMessage')),
+        # cipher_type is an enum in Xray; uint32 decodes the same varint
+        message('ShadowsocksAccount', (1, 'password', T.TYPE_STRING, None), (2, 'cipher_type', T.TYPE_UINT32, None)),
+    ])
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return {name: message_factory.GetMessageClass(pool.FindMessageTypeByName(f'xray.{name}'))
+            for name in ('TypedMessage', 'User', 'AddUserOperation', 'AlterInboundRequest', 'ShadowsocksAccount')}
+
+class TestHandlerCommand(unittest.TestCase):
+    def test_encoding_matches_protobuf(self):
+        messages = xray_messages()
+        account = handler_command.shadowsocks_account('p-1', 'chacha20-ietf-poly1305')
+        data = handler_command.add_user_request('ss-in', 'p-1', account)
+
+        request = messages['AlterInboundRequest'].FromString(data)
+        self.assertEqual(request.tag, 'ss-in')
+        self.assertEqual(request.operation.type, 'xray.app.proxyman.command.AddUserOperation')
+        user = messages['AddUserOperation'].FromString(request.operation.value).user
+        self.assertEqual((user.level, user.email), (0, 'p-1'))
+        self.assertEqual(user.account.type, 'xray.proxy.shadowsocks.Account')
+        ss = messages['ShadowsocksAccount'].FromString(user.account.value)
+        self.assertEqual((ss.password, ss.cipher_type), ('p-1', 7))
+
+    def test_decode_round_trip(self):
+        uuid = 'b831381d-6324-4d53-ad4f-8cda48b30811'
+        data = handler_command.add_user_request('vless-in', uuid, handler_command.vless_account(uuid, 'xtls-rprx-vision'), level=300)
+        request = handler_command.decode_alter_inbound_request(data)
+        self.assertEqual(request['account_type'], 'xray.proxy.vless.Account')
+        self.assertEqual(request['level'], 300)
+        self.assertEqual(request['account'], {1: uuid.encode(), 2: b'xtls-rprx-vision', 3: b'none'})
+
+        request = handler_command.decode_alter_inbound_request(handler_command.remove_user_request('vless-in', uuid))
+        self.assertEqual(request, {'tag': 'vless-in', 'operation': handler_command.REMOVE_USER_OPERATION, 'email': uuid})
+
+    def test_shadowsocks_2022(self):
+        account = handler_command.shadowsocks_account('a2V5', '2022-blake3-aes-128-gcm')
+        self.assertEqual(handler_command._decode_typed(account)[0], 'xray.proxy.shadowsocks_2022.Account')
+        with self.assertRaises(ValueError):
+            handler_command.shadowsocks_account('p', 'rc4-md5')
+
+class TestLiveUsers(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeHandlerService()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        handler_command.add_HandlerServiceServicer_to_server(self.service, self.server)
+        port = self.server.add_insecure_port('127.0.0.1:0')
+        self.server.start()
+        self.addCleanup(self.server.stop, None)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'config.json')
+        with open(self.path, 'w') as f:
+            json.dump(CONFIG, f)
+
+        for patch in (mock.patch.object(live_users, 'LIVE_USERS_API', f'127.0.0.1:{port}'),
+                      mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', self.path),
+                      mock.patch('builtins.print')):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.reload = mock.patch.object(config_manager, 'reload_service').start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(lambda: live_users._applier and live_users._applier.close())
+
+    def test_add_is_live_without_reload(self):
+        self.assertTrue(config_manager.add_ss_user('p-1', 'User2'))
+        self.reload.assert_not_called()
+        request, = self.service.requests
+        self.assertEqual(request['tag'], 'ss-in')
+        self.assertEqual(request['operation'], handler_command.ADD_USER_OPERATION)
+        self.assertEqual(request['email'], 'p-1')
+        self.assertEqual(request['account'], {1: b'p-1', 2: 7})
+        # The file is still written
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['inbounds'][2]['users'], [{"password": "p-1", "name": "User2"}])
+
+    def test_move_is_remove_then_add(self):
+        config_manager.add_user_to_config('u-1', 'User1', limit_mbps=12)
+        self.reload.assert_not_called()
+        self.assertEqual([(r['operation'].rsplit('.', 1)[1], r['tag']) for r in self.service.requests],
+                         [('RemoveUserOperation', 'vless-in'), ('AddUserOperation', 'vless-limited-in')])
+
+    def test_rpc_failure_falls_back_to_reload(self):
+        self.service.reject.add('p-1')
+        self.assertTrue(config_manager.add_ss_user('p-1', 'User2'))
+        self.reload.assert_called_once()
+
+    def test_unsupported_inbound_reloads_without_rpc(self):
+        config_manager.apply_ops([('add_ss', ('p-1', 'User2')), ('add_tuic', ('t-1', 'User3'))])
+        self.assertEqual(self.service.requests, [])
+        self.reload.assert_called_once()
+
+    def test_unreachable_api_reloads(self):
+        with mock.patch.object(live_users, 'LIVE_USERS_API', '127.0.0.1:1'), \
+             mock.patch.object(live_users, 'LIVE_USERS_TIMEOUT', 0.5):
+            self.assertTrue(config_manager.add_ss_user('p-1', 'User2'))
+        self.reload.assert_called_once()
+
+    def test_large_batch_reloads(self):
+        config = SingboxConfig(CONFIG)
+        for i in range(3):
+            config.add_user('ss-in', {"password": f"p-{i}", "name": f"User{i}"})
+        with mock.patch.object(live_users, 'LIVE_USERS_MAX_OPS', 2):
+            self.assertFalse(live_users.apply_live(config))
+        self.assertEqual(self.service.requests, [])
+
+    def test_disabled_by_default(self):
+        with mock.patch.object(live_users, 'LIVE_USERS_API', ''):
+            self.assertTrue(config_manager.add_ss_user('p-1', 'User2'))
+        self.reload.assert_called_once()
+        self.assertEqual(self.service.requests, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db.migrations import migrate, pending_migrations, get_version, LATEST_VERSION, USERS_ADDED_COLUMNS, INDEXES
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'test.db'))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def columns(self, table):
+        return {row[1] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+
+    def test_fresh_database(self):
+        applied = migrate(self.conn)
+        self.assertEqual([v for v, _ in applied], list(range(1, LATEST_VERSION + 1)))
+        self.assertEqual(get_version(self.conn), LATEST_VERSION)
+        self.assertTrue({name for name, _ in USERS_ADDED_COLUMNS} <= self.columns('users'))
+        indexes = {r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({name for name, _ in INDEXES} <= indexes)
+        self.assertIn('idx_users_active_protocol', indexes)
+
+    def test_legacy_database_upgraded(self):
+        # Pre-migration database: original users table, user_version 0
+        self.conn.execute('''
+            CREATE TABLE users (
+                uuid TEXT PRIMARY KEY, telegram_id INTEGER, username TEXT, expiry_date TIMESTAMP,
+                data_limit_gb REAL DEFAULT 5.0, speed_limit_mbps REAL DEFAULT 12.0,
+                is_active BOOLEAN DEFAULT 1, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.execute("INSERT INTO users (uuid, telegram_id, username) VALUES ('u1', 1, 'old')")
+        self.conn.commit()
+
+        self.assertEqual(len(pending_migrations(self.conn)), LATEST_VERSION)
+        migrate(self.conn)
+
+        self.assertIn('phone', self.columns('users'))
+        self.assertIn('vpn_keys', {r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")})
+        self.assertEqual(self.conn.execute("SELECT username FROM users WHERE uuid = 'u1'").fetchone()[0], 'old')
+
+    def test_up_to_date_costs_one_pragma(self):
+        migrate(self.conn)
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        self.assertEqual(migrate(self.conn), [])
+        self.conn.set_trace_callback(None)
+        self.assertEqual(statements, ['PRAGMA user_version'])
+        self.assertEqual(pending_migrations(self.conn), [])
+
+if __name__ == '__main__':
+    unittest.main()
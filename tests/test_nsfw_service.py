@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import asyncio
+import threading
+
+from PIL import Image
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from services.nsfw_service import NSFWService, NSFWQueueFull, NSFWUnavailable, prepare_image
+
+SAMPLE_SLIP = os.path.join(project_root, 'tests', 'KBZ-Pay-Slip-Sample.jpeg')
+
+class FakeDetector:
+    def __init__(self, release=None):
+        self.release = release
+        self.shapes = []
+
+    def detect(self, image):
+        if self.release:
+            self.release.wait(5)
+        self.shapes.append(image.shape)
+        # Red images are "explicit"
+        explicit = image[0, 0, 2] > 200 and image[0, 0, 0] < 50
+        return [{'class': 'EXPOSED_BREAST_F' if explicit else 'FACE_F', 'score': 0.9, 'box': [0, 0, 1, 1]}]
+
+class TestNSFWService(unittest.TestCase):
+    def test_loads_in_background_and_screens(self):
+        loaded = threading.Event()
+        detector = FakeDetector()
+
+        def factory():
+            loaded.wait(5)
+            return detector
+
+        service = NSFWService(detector_factory=factory, workers=1, queue_size=2)
+        service.start()
+        self.assertEqual(service.state, 'loading')
+        loaded.set()
+
+        self.assertTrue(asyncio.run(service.screen(Image.new('RGB', (1080, 2400), 'red'))))
+        self.assertFalse(asyncio.run(service.screen(SAMPLE_SLIP)))
+        self.assertEqual(service.state, 'ready')
+        # Downscaled before inference
+        self.assertTrue(all(max(shape[:2]) <= 320 for shape in detector.shapes))
+
+        metrics = service.metrics()
+        self.assertEqual((metrics['completed'], metrics['queue_depth'], metrics['in_flight']), (2, 0, 0))
+        self.assertIsNotNone(metrics['latency_ms']['p50'])
+        service.shutdown()
+
+    def test_bounded_queue(self):
+        release = threading.Event()
+        service = NSFWService(detector_factory=lambda: FakeDetector(release), workers=1, queue_size=1)
+        image = Image.new('RGB', (100, 100), 'white')
+
+        async def flood():
+            tasks = [asyncio.ensure_future(service.screen(image)) for _ in range(2)]
+            await asyncio.sleep(0.1)
+            self.assertEqual(service.metrics()['in_flight'], 1)
+            self.assertEqual(service.metrics()['queue_depth'], 1)
+            with self.assertRaises(NSFWQueueFull):
+                await service.screen(image)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        self.assertEqual(asyncio.run(flood()), [False, False])
+        self.assertEqual(service.metrics()['rejected'], 1)
+        service.shutdown()
+
+    def test_cancelled_caller_keeps_its_slot(self):
+        release = threading.Event()
+        service = NSFWService(detector_factory=lambda: FakeDetector(release), workers=1, queue_size=0)
+        image = Image.new('RGB', (100, 100), 'white')
+
+        async def cancel_then_screen():
+            task = asyncio.ensure_future(service.screen(image))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await asyncio.sleep(0.05)
+            # The cancelled inference is still running, so the only slot is taken
+            with self.assertRaises(NSFWQueueFull):
+                await service.screen(image)
+            release.set()
+            await asyncio.sleep(0.1)
+            return await service.screen(image)
+
+        self.assertFalse(asyncio.run(cancel_then_screen()))
+        service.shutdown()
+
+    def test_failed_load(self):
+        def factory():
+            raise ImportError("No module named 'nudenet'")
+
+        service = NSFWService(detector_factory=factory)
+        with self.assertRaises(NSFWUnavailable):
+            asyncio.run(service.screen(Image.new('RGB', (10, 10))))
+        self.assertEqual(service.state, 'failed')
+        service.shutdown()
+
+    def test_prepare_image(self):
+        array = prepare_image(Image.new('RGB', (1080, 2400), (255, 0, 0)))
+        self.assertEqual(array.shape, (320, 144, 3))
+        # BGR, as OpenCV would have read it
+        self.assertEqual(array[0, 0].tolist(), [0, 0, 255])
+        self.assertLessEqual(max(prepare_image(SAMPLE_SLIP).shape), 320)
+
+if __name__ == '__main__':
+    unittest.main()
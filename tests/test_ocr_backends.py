@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from services.ocr_backends import WarmPoolBackend, OCRWorkerError, make_backend, SpawnBackend, TesserocrBackend
+
+class FakeEngine:
+    """Stands in for Tesseract inside a worker; the 'image' is a command string."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def image_to_string(self, image, lang='eng'):
+        self.calls += 1
+        if image == 'hang':
+            time.sleep(60)
+        if image == 'crash':
+            os._exit(1)
+        if image == 'fail':
+            raise ValueError("bad image")
+        if image.startswith('sleep'):
+            time.sleep(float(image.split()[1]))
+        return f"{lang} {os.getpid()} {self.calls}"
+
+    def close(self):
+        pass
+
+class TestWarmPoolBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = WarmPoolBackend(workers=1, timeout=2, engine_factory=FakeEngine, start_method='fork')
+
+    def tearDown(self):
+        self.backend.close()
+
+    def test_engine_is_reused_between_jobs(self):
+        lang, pid, calls = self.backend.image_to_string('slip', lang='mya').split()
+        self.assertEqual((lang, calls), ('mya', '1'))
+        self.assertEqual(self.backend.image_to_string('slip').split()[1:], [pid, '2'])
+
+    def test_timeout_replaces_worker(self):
+        pid = self.backend.image_to_string('slip').split()[1]
+        self.backend.timeout = 0.2
+        with self.assertRaises(OCRWorkerError):
+            self.backend.image_to_string('hang')
+        self.assertNotEqual(self.backend.image_to_string('slip').split()[1], pid)
+
+    def test_crash_replaces_worker(self):
+        with self.assertRaises(OCRWorkerError):
+            self.backend.image_to_string('crash')
+        self.assertEqual(self.backend.image_to_string('slip').split()[2], '1')
+
+    def test_engine_error_keeps_worker(self):
+        pid = self.backend.image_to_string('slip').split()[1]
+        with self.assertRaises(RuntimeError):
+            self.backend.image_to_string('fail')
+        self.assertEqual(self.backend.image_to_string('slip').split()[1], pid)
+
+    def test_workers_run_in_parallel(self):
+        backend = WarmPoolBackend(workers=3, timeout=5, engine_factory=FakeEngine, start_method='fork')
+        backend.start()
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                pids = set(r.split()[1] for r in executor.map(backend.image_to_string, ['sleep 0.3'] * 3))
+            self.assertEqual(len(pids), 3)
+            self.assertLess(time.perf_counter() - start, 0.8)
+        finally:
+            backend.close()
+
+class TestMakeBackend(unittest.TestCase):
+    def test_named_backends(self):
+        self.assertIsInstance(make_backend('spawn'), SpawnBackend)
+        with mock.patch.object(TesserocrBackend, 'available', return_value=True):
+            self.assertIsInstance(make_backend('warm'), WarmPoolBackend)
+        with self.assertRaises(ValueError):
+            make_backend('nope')
+
+    def test_warm_without_tesserocr_is_disabled(self):
+        with mock.patch.object(TesserocrBackend, 'available', return_value=False):
+            with self.assertLogs('services.ocr_backends', level='ERROR'):
+                self.assertIsInstance(make_backend('warm'), SpawnBackend)
+            # Never a pool of workers that each spawn tesseract
+            with self.assertRaises(RuntimeError):
+                WarmPoolBackend()
+
+if __name__ == '__main__':
+    unittest.main()
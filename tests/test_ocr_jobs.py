@@ -0,0 +1,131 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from services import ocr_jobs
+from services.ocr_jobs import OCRJobQueue, PaymentJobError
+
+KBZ_SLIP = ["KBZ Pay", "Transfer Successful", "Transaction ID: 0123456789", "Amount", "3,000 MMK"]
+
+class TestOCRJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+        self.provisioned = []
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def provision(self, user_uuid, protocol, data):
+        self.provisioned.append((user_uuid, protocol, data['transaction_id']))
+        return {"success": True, "key": f"{protocol}://{user_uuid}"}
+
+    def run_job(self, ocr_lines, provision=None):
+        # Forked workers inherit the patched OCR
+        with mock.patch.object(ocr_jobs.ocr_service, 'extract_text', return_value=ocr_lines):
+            queue = OCRJobQueue(provision or self.provision, workers=1, start_method='fork')
+            job_id = queue.submit('user-1', 'vless', b'image')
+            self.assertEqual(database.get_payment_job(job_id)['status'], 'queued')
+            queue.shutdown(wait=True)
+        return database.get_payment_job(job_id)
+
+    def test_valid_slip_is_provisioned(self):
+        job = self.run_job(KBZ_SLIP)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result'], {"success": True, "key": "vless://user-1"})
+        self.assertEqual(self.provisioned, [('user-1', 'vless', '0123456789')])
+
+    def test_unreadable_slip_fails(self):
+        job = self.run_job([])
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], "Could not read text from image")
+        self.assertEqual(job['error_code'], 400)
+        self.assertEqual(self.provisioned, [])
+
+    def test_invalid_receipt_fails(self):
+        job = self.run_job(["Some random text"])
+        self.assertEqual(job['status'], 'failed')
+        self.assertTrue(job['error'].startswith("Invalid Receipt:"))
+
+    def test_provision_error_is_reported(self):
+        def provision(user_uuid, protocol, data):
+            raise PaymentJobError("Transaction 0123456789 already used")
+
+        job = self.run_job(KBZ_SLIP, provision)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], "Transaction 0123456789 already used")
+        self.assertEqual(job['error_code'], 400)
+
+    def test_provisioning_runs_concurrently(self):
+        # Each provision waits for the other, as payments waiting on one config batch do
+        barrier = threading.Barrier(2, timeout=5)
+
+        def provision(user_uuid, protocol, data):
+            barrier.wait()
+            return {"success": True}
+
+        with mock.patch.object(ocr_jobs.ocr_service, 'extract_text', return_value=KBZ_SLIP):
+            queue = OCRJobQueue(provision, workers=1, start_method='fork', provision_workers=2)
+            job_ids = [queue.submit(f'user-{i}', 'vless', f'image-{i}'.encode()) for i in range(2)]
+            queue.shutdown(wait=True)
+        self.assertEqual([database.get_payment_job(j)['status'] for j in job_ids], ['succeeded'] * 2)
+
+    def test_cache_write_error_fails_job(self):
+        with mock.patch.object(ocr_jobs, 'store_slip', side_effect=RuntimeError("disk I/O error")):
+            job = self.run_job(KBZ_SLIP)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], "disk I/O error")
+        self.assertEqual(self.provisioned, [])
+
+    def test_submit_after_shutdown_fails_job(self):
+        queue = OCRJobQueue(self.provision, workers=1, start_method='fork')
+        queue.shutdown()
+        job = database.get_payment_job(queue.submit('user-1', 'vless', b'image'))
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error_code'], 503)
+
+    def test_worker_crash_fails_job_and_replaces_pool(self):
+        with mock.patch.object(ocr_jobs.ocr_service, 'extract_text', side_effect=lambda image: os._exit(1)):
+            queue = OCRJobQueue(self.provision, workers=1, start_method='fork')
+            job_id = queue.submit('user-1', 'vless', b'image')
+            broken = queue._pool
+            deadline = time.time() + 10
+            while database.get_payment_job(job_id)['status'] == 'queued' and time.time() < deadline:
+                time.sleep(0.02)
+
+        job = database.get_payment_job(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error_code'], 503)
+        self.assertIsNone(queue._pool)
+        self.assertIsNot(queue._get_pool(), broken)
+        queue.shutdown()
+
+    def test_start_fails_interrupted_jobs(self):
+        database.create_payment_job('stale', 'user-1', 'vless')
+        database.create_payment_job('done', 'user-1', 'vless')
+        database.update_payment_job('done', 'succeeded', result={"success": True})
+
+        queue = OCRJobQueue(self.provision, workers=1, start_method='fork')
+        self.assertEqual(queue.start(), 1)
+        queue.shutdown()
+
+        self.assertEqual(database.get_payment_job('stale')['status'], 'failed')
+        self.assertEqual(database.get_payment_job('stale')['error_code'], 503)
+        self.assertEqual(database.get_payment_job('done')['result'], {"success": True})
+
+if __name__ == '__main__':
+    unittest.main()
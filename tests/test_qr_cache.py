@@ -0,0 +1,79 @@
+import unittest
+import sys
+import os
+import asyncio
+import tempfile
+from unittest import mock
+
+from telegram.error import BadRequest
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from bot import qr_cache
+from bot.qr_cache import send_qr, get_qr_png, link_hash
+
+LINK = "vless://0f2c8d1e-3b7a-4c55-9e61-2a9d4b8c7e10@203.0.113.7:8443?security=reality#User-Key1"
+
+class FakeMessage:
+    def __init__(self, reject=()):
+        self.sent = []
+        self.reject = set(reject)
+
+    async def reply_photo(self, photo, **kwargs):
+        if photo in self.reject:
+            raise BadRequest("Wrong file identifier/http url specified")
+        self.sent.append(photo)
+        return mock.Mock(photo=[mock.Mock(file_id='small'), mock.Mock(file_id=f'AgAC{len(self.sent)}')])
+
+class TestQRCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+        qr_cache.clear_png_cache()
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_second_send_reuses_file_id(self):
+        message = FakeMessage()
+        with mock.patch.object(qr_cache, 'render_png_async', wraps=qr_cache.render_png_async) as render:
+            asyncio.run(send_qr(message, LINK, caption="Scan this QR to import"))
+            qr_cache.clear_png_cache()
+            asyncio.run(send_qr(message, LINK, caption="Scan this QR to import"))
+        self.assertEqual(render.call_count, 1)
+        self.assertTrue(message.sent[0].startswith(b'\x89PNG'))
+        self.assertEqual(message.sent[1], 'AgAC1')
+        # Only the hash of the link is stored
+        self.assertEqual(database.get_qr_file_id(link_hash(LINK)), 'AgAC1')
+
+    def test_rejected_file_id_falls_back_to_png(self):
+        database.put_qr_file_id(link_hash(LINK), 'expired')
+        message = FakeMessage(reject={'expired'})
+        asyncio.run(send_qr(message, LINK))
+        self.assertTrue(message.sent[0].startswith(b'\x89PNG'))
+        self.assertEqual(database.get_qr_file_id(link_hash(LINK)), 'AgAC1')
+
+    def test_png_lru(self):
+        async def render_png_async(link):
+            return link.encode()
+
+        async def run():
+            for link in ('a', 'b', 'a', 'c', 'a', 'b'):
+                self.assertEqual(await get_qr_png(link), link.encode())
+
+        with mock.patch.object(qr_cache, 'QR_PNG_CACHE_SIZE', 2), \
+             mock.patch.object(qr_cache, 'render_png_async', side_effect=render_png_async) as render:
+            asyncio.run(run())
+        # 'b' was evicted by 'c'; 'a' stayed hot
+        self.assertEqual([c.args[0] for c in render.call_args_list], ['a', 'b', 'c', 'b'])
+
+if __name__ == '__main__':
+    unittest.main()
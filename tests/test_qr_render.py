@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import asyncio
+import io
+
+import numpy as np
+import qrcode
+from PIL import Image
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_H
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from services.qr_render import make_qr, render_png, render_png_async
+
+REALITY = ("vless://0f2c8d1e-3b7a-4c55-9e61-2a9d4b8c7e10@203.0.113.7:8443?security=reality&encryption=none"
+           "&pbk=Q2xhdWRlUmVhbGl0eVB1YmxpY0tleUV4YW1wbGUxMjM&fp=randomized&type=tcp"
+           "&flow=xtls-rprx-vision&sni=www.microsoft.com&sid=6ba85179e30d4fc2#User-Key1")
+SS = "ss://Y2hhY2hhMjAtaWV0Zi1wb2x5MTMwNTpzZWNyZXQ=@203.0.113.7:9388#User-Key2"
+
+def reference_modules(data, version, error_correction, border):
+    qr = qrcode.QRCode(version=version, error_correction=error_correction, border=border)
+    qr.add_data(data)
+    qr.make(fit=False)
+    return np.array(qr.get_matrix(), dtype=bool)
+
+class TestQRRender(unittest.TestCase):
+    def test_smallest_version_strongest_level(self):
+        for link in (REALITY, SS):
+            qr = make_qr(link)
+            smallest = qrcode.QRCode(error_correction=ERROR_CORRECT_L)
+            smallest.add_data(link)
+            smallest.make(fit=True)
+            self.assertEqual(qr.version, smallest.version)
+        # A short link has room for level H at its smallest version
+        self.assertEqual(make_qr("ss://x").error_correction, ERROR_CORRECT_H)
+
+    def test_png_matches_symbol(self):
+        png = render_png(REALITY, box_size=3, border=4)
+        img = Image.open(io.BytesIO(png))
+        self.assertEqual(img.mode, 'P')
+        self.assertEqual(img.getpalette()[:6], [0, 0, 0, 255, 255, 255])
+
+        # Sample one pixel per module; dark modules are palette index 0
+        qr = make_qr(REALITY)
+        pixels = np.array(img)[1::3, 1::3] == 0
+        np.testing.assert_array_equal(pixels, reference_modules(REALITY, qr.version, qr.error_correction, 4))
+
+    def test_smaller_than_legacy_render(self):
+        legacy = qrcode.QRCode(version=1, box_size=10, border=5)
+        legacy.add_data(REALITY)
+        legacy.make(fit=True)
+        bio = io.BytesIO()
+        legacy.make_image(fill_color="black", back_color="white").save(bio)
+        self.assertLess(len(render_png(REALITY)), len(bio.getvalue()))
+
+    def test_async(self):
+        self.assertEqual(asyncio.run(render_png_async(SS)), render_png(SS))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+import sys
+import os
+import subprocess
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestQueryPlans(unittest.TestCase):
+    def test_no_full_table_scans(self):
+        # Schema-only mode: any SCAN on an indexed lookup fails the check
+        result = subprocess.run(
+            [sys.executable, os.path.join(project_root, 'scripts', 'check_query_plans.py')],
+            capture_output=True, text=True, timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
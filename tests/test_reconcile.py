@@ -0,0 +1,130 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+# Add project root (config_manager imports src.bot.config) and src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from bot import config_manager
+from bot import reconcile
+from bot.config_model import SingboxConfig
+
+def make_config():
+    return {
+        "inbounds": [
+            {"type": "vless", "tag": "vless-in",
+             "users": [{"uuid": "keep", "flow": "xtls-rprx-vision", "name": "alice"},
+                       {"uuid": "stale", "flow": "xtls-rprx-vision", "name": "gone"}]},
+            {"type": "vless", "tag": "vless-limited-in", "users": []},
+            {"type": "shadowsocks", "tag": "ss-in", "users": []},
+            {"type": "tuic", "tag": "tuic-in", "users": []},
+            {"type": "shadowsocks", "tag": "ss-legacy-in", "password": "shared"},
+        ],
+        "experimental": {"v2ray_api": {"stats": {"enabled": True, "users": ["keep", "stale"]}}},
+    }
+
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+        self.config_path = os.path.join(self.tmpdir.name, 'config.json')
+        with open(self.config_path, 'w') as f:
+            json.dump(make_config(), f)
+
+        patches = [
+            mock.patch.object(config_manager, 'SINGBOX_CONFIG_PATH', self.config_path),
+            mock.patch.object(reconcile, 'FileLock', lambda: mock.MagicMock()),
+            mock.patch('builtins.print'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.reload = mock.patch.object(reconcile, 'reload_service').start()
+        self.addCleanup(mock.patch.stopall)
+
+        database.add_user('keep', 1, 'alice', protocol='vless')
+        database.add_user('limited', 2, 'bob', protocol='vless_limited')
+        database.add_user('ss-key', 3, None, protocol='ss')
+        database.add_user('tuic-key', 4, 'carol', protocol='admin_tuic')
+        database.add_user('legacy', 5, 'dave', protocol='ss_legacy')
+        database.add_user('inactive', 6, 'erin', protocol='vless')
+        database.deactivate_user('inactive')
+        database.add_user('revoked', 7, 'frank', protocol='ss')
+        conn = database.get_db_connection()
+        conn.execute("INSERT INTO vpn_keys (key_uuid, protocol, is_active) VALUES ('revoked', 'ss', 0)")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def read_config(self):
+        with open(self.config_path) as f:
+            return SingboxConfig(json.load(f))
+
+    def test_provisioned_keys(self):
+        keys = {row[0]: row for row in database.get_provisioned_keys()}
+        self.assertEqual(set(keys), {'keep', 'limited', 'ss-key', 'tuic-key', 'legacy'})
+        self.assertEqual(keys['ss-key'], ('ss-key', 'ss', None, 3))
+
+    def test_dry_run_plan(self):
+        plan = reconcile.reconcile(dry_run=True)
+        self.assertEqual(plan.counts(), {'vless-in': (0, 1), 'vless-limited-in': (1, 0),
+                                         'ss-in': (1, 0), 'tuic-in': (1, 0)})
+        self.assertEqual(plan.adds['ss-in'], [{"password": "ss-key", "name": "User3"}])
+        self.assertEqual(plan.adds['tuic-in'], [{"uuid": "tuic-key", "password": "tuic-key", "name": "carol"}])
+        self.assertEqual(plan.removes['vless-in'], ['stale'])
+        self.assertFalse(plan.applied)
+        self.assertIn('vless-in: +0 -1', plan.describe())
+        with open(self.config_path) as f:
+            self.assertEqual(json.load(f), make_config())
+        self.reload.assert_not_called()
+
+    def test_apply_writes_and_reloads_once(self):
+        plan = reconcile.reconcile()
+        self.assertTrue(plan.applied)
+        self.reload.assert_called_once()
+
+        config = self.read_config()
+        self.assertEqual(list(config.inbound('vless-in').users), ['keep'])
+        self.assertTrue(config.has_user('vless-limited-in', 'limited'))
+        self.assertTrue(config.has_user('ss-in', 'ss-key'))
+        self.assertFalse(config.has_user('ss-in', 'revoked'))
+        self.assertTrue(config.has_user('tuic-in', 'tuic-key'))
+        stats = config.to_dict()['experimental']['v2ray_api']['stats']['users']
+        self.assertEqual(stats, ['keep', 'limited'])
+        # Unmanaged inbounds are left alone
+        self.assertEqual(config.to_dict()['inbounds'][4], make_config()['inbounds'][4])
+
+        # Second run: in sync, no write, no reload
+        mtime = os.stat(self.config_path).st_mtime_ns
+        again = reconcile.reconcile()
+        self.assertTrue(again.empty)
+        self.assertFalse(again.applied)
+        self.assertEqual(os.stat(self.config_path).st_mtime_ns, mtime)
+        self.reload.assert_called_once()
+
+    def test_keep_extra(self):
+        plan = reconcile.reconcile(keep_extra=True)
+        self.assertEqual(plan.removes, {})
+        self.assertTrue(self.read_config().has_user('vless-in', 'stale'))
+
+    def test_missing_inbound(self):
+        database.add_user('plain', 8, 'gina', protocol='vlessplain')
+        plan = reconcile.reconcile(dry_run=True)
+        self.assertEqual(plan.missing_inbounds, {'vless-plain-in': 1})
+        self.assertIn('vless-plain-in: not in config', plan.describe())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+from unittest import mock
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from services import ocr_jobs, slip_cache
+from services.ocr_jobs import OCRJobQueue
+from services.slip_cache import slip_digest, lookup_slip, store_slip
+
+KBZ_SLIP = ["KBZ Pay", "Transfer Successful", "Transaction ID: 0123456789", "Amount", "3,000 MMK"]
+
+class TestSlipCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        digest = slip_digest(b'image')
+        self.assertEqual(len(digest), 64)
+        self.assertIsNone(lookup_slip(digest))
+
+        store_slip(digest, text_lines=KBZ_SLIP, validated_data={'transaction_id': '0123456789'})
+        self.assertEqual(lookup_slip(digest), {
+            'nsfw_verdict': None,
+            'text_lines': KBZ_SLIP,
+            'validated_data': {'transaction_id': '0123456789'},
+        })
+
+    def test_partial_store_keeps_earlier_fields(self):
+        digest = slip_digest(b'image')
+        store_slip(digest, text_lines=KBZ_SLIP)
+        store_slip(digest, nsfw_verdict=False)
+        entry = lookup_slip(digest)
+        self.assertIs(entry['nsfw_verdict'], False)
+        self.assertEqual(entry['text_lines'], KBZ_SLIP)
+        self.assertIsNone(entry['validated_data'])
+
+    def test_empty_ocr_is_not_cached(self):
+        digest = slip_digest(b'blurry')
+        store_slip(digest, text_lines=[])
+        self.assertIsNone(lookup_slip(digest))
+
+    def test_expired_entries_are_ignored_and_evicted(self):
+        old, new = slip_digest(b'old'), slip_digest(b'new')
+        with mock.patch.object(slip_cache.time, 'time', return_value=time.time() - 2 * slip_cache.SLIP_CACHE_TTL):
+            store_slip(old, text_lines=KBZ_SLIP)
+        self.assertIsNone(lookup_slip(old))
+
+        store_slip(new, text_lines=KBZ_SLIP)
+        conn = database.get_db_connection()
+        rows = [r[0] for r in conn.execute('SELECT sha256 FROM slip_cache')]
+        conn.close()
+        self.assertEqual(rows, [new])
+
+    def test_resubmitted_slip_skips_ocr(self):
+        provisioned = []
+
+        def provision(user_uuid, protocol, data):
+            provisioned.append(data['transaction_id'])
+            return {"success": True}
+
+        with mock.patch.object(ocr_jobs.ocr_service, 'extract_text', return_value=KBZ_SLIP):
+            queue = OCRJobQueue(provision, workers=1, start_method='fork')
+            queue.submit('user-1', 'vless', b'image')
+            queue.shutdown(wait=True)
+
+        queue = OCRJobQueue(provision, workers=1, start_method='fork')
+        job_id = queue.submit('user-1', 'vless', b'image')
+        queue.shutdown(wait=True)
+
+        # Served from the cache: no worker pool was ever started
+        self.assertIsNone(queue._pool)
+        self.assertEqual(database.get_payment_job(job_id)['status'], 'succeeded')
+        self.assertEqual(provisioned, ['0123456789', '0123456789'])
+
+    def test_cached_invalid_slip_fails_the_same_way(self):
+        with mock.patch.object(ocr_jobs.ocr_service, 'extract_text', return_value=["Some random text"]):
+            queue = OCRJobQueue(lambda *args: None, workers=1, start_method='fork')
+            first = queue.submit('user-1', 'vless', b'image')
+            queue.shutdown(wait=True)
+
+        queue = OCRJobQueue(lambda *args: None, workers=1, start_method='fork')
+        second = queue.submit('user-1', 'vless', b'image')
+        queue.shutdown(wait=True)
+
+        self.assertIsNone(queue._pool)
+        self.assertEqual(database.get_payment_job(second)['error'], database.get_payment_job(first)['error'])
+        self.assertEqual(database.get_payment_job(second)['error_code'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import asyncio
+import tempfile
+import time
+from unittest import mock
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from services import slip_files
+from services.slip_files import lookup_file, record_file
+
+class TestSlipFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        self.assertIsNone(lookup_file('AQADk7kxG'))
+        record_file('AQADk7kxG', slip_files.LOW_AMOUNT, '0123456789', 1000)
+        self.assertEqual(lookup_file('AQADk7kxG'), {
+            'outcome': 'low_amount', 'transaction_id': '0123456789', 'detail': '1000',
+        })
+        # A later outcome for the same photo replaces the earlier one
+        record_file('AQADk7kxG', slip_files.DUPLICATE, '0123456789')
+        self.assertEqual(lookup_file('AQADk7kxG')['outcome'], 'duplicate')
+
+    def test_only_non_final_outcomes_expire(self):
+        with mock.patch.object(slip_files.time, 'time', return_value=time.time() - 2 * slip_files.SLIP_CACHE_TTL):
+            record_file('accepted', slip_files.ACCEPTED, '0123456789')
+            record_file('nsfw', slip_files.NSFW)
+            record_file('invalid', slip_files.INVALID, detail='Unknown provider')
+        self.assertEqual(lookup_file('accepted')['outcome'], 'accepted')
+        self.assertEqual(lookup_file('nsfw')['outcome'], 'nsfw')
+        self.assertIsNone(lookup_file('invalid'))
+
+        record_file('fresh', slip_files.INVALID, detail='Unknown provider')
+        conn = database.get_db_connection()
+        rows = sorted(r[0] for r in conn.execute('SELECT file_unique_id FROM slip_files'))
+        conn.close()
+        self.assertEqual(rows, ['accepted', 'fresh', 'nsfw'])
+
+    def test_lookup_failure_is_a_miss(self):
+        with mock.patch.object(slip_files, 'get_slip_file', side_effect=RuntimeError("database is locked")):
+            self.assertIsNone(lookup_file('AQADk7kxG'))
+
+    def test_known_photo_is_not_downloaded(self):
+        from bot import main
+
+        record_file('AQADk7kxG', slip_files.ACCEPTED, '0123456789')
+        photo = mock.Mock(file_unique_id='AQADk7kxG', get_file=mock.AsyncMock())
+        update = mock.Mock()
+        update.message.photo = [photo]
+        update.message.reply_text = mock.AsyncMock()
+
+        asyncio.run(main.handle_photo(update, mock.Mock()))
+
+        photo.get_file.assert_not_called()
+        update.message.reply_text.assert_awaited_once_with(
+            "Transaction ID `0123456789` has already been used!", parse_mode="Markdown"
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import sys
+import os
+import io
+import tempfile
+import importlib
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+from services import slip_hash
+from services.slip_hash import SlipHashIndex, slip_hash as hash_image, load_slip_hash, _popcount
+
+SAMPLE_SLIP = os.path.join(project_root, 'tests', 'KBZ-Pay-Slip-Sample.jpeg')
+
+def reencode(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    return buffer
+
+class TestSlipHash(unittest.TestCase):
+    def test_copies_of_a_slip_match(self):
+        slip = Image.open(SAMPLE_SLIP).convert('RGB')
+        index = SlipHashIndex(max_distance=2)
+        index.add(load_slip_hash(SAMPLE_SLIP), 'tid-1')
+
+        self.assertEqual(index.find(load_slip_hash(reencode(slip, 60)))[0], 'tid-1')
+        resized = slip.resize((slip.width * 2 // 3, slip.height * 2 // 3), Image.Resampling.LANCZOS)
+        self.assertEqual(index.find(hash_image(resized))[0], 'tid-1')
+
+        other = Image.new('RGB', slip.size, 'white')
+        other.paste(slip.rotate(180), (0, 0))
+        self.assertIsNone(index.find(hash_image(other)))
+
+    def test_unreadable_image(self):
+        self.assertIsNone(load_slip_hash(io.BytesIO(b'not an image')))
+
+class TestSlipHashIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.hashes = rng.integers(0, 2 ** 63, size=(3000, slip_hash.STRIPS), dtype=np.uint64)
+        self.index = SlipHashIndex(max_distance=3)
+        for i, phash in enumerate(self.hashes):
+            self.index.add(phash, f'tid-{i}')
+
+    def flip(self, phash, strip, bits):
+        phash = phash.copy()
+        for bit in bits:
+            phash[strip] ^= np.uint64(1 << bit)
+        return phash
+
+    def test_finds_within_distance_in_every_strip(self):
+        # More than REBUILD_EVERY rows: the lookup goes through the sorted index
+        query = self.flip(self.flip(self.hashes[42], 0, (1, 20, 40)), 5, (63,))
+        self.assertEqual(self.index.find(query), ('tid-42', 3))
+        self.assertIsNone(self.index.find(self.flip(self.hashes[42], 2, (0, 17, 33, 49))))
+
+    def test_indexed_and_pending_rows_agree(self):
+        self.index.find(self.hashes[0])
+        self.assertGreater(self.index._indexed, 0)
+        for i in (0, 1500, 2999):
+            self.assertEqual(self.index.find(self.flip(self.hashes[i], 7, (5,))), (f'tid-{i}', 1))
+        self.index.add(self.hashes[10], 'tid-late')
+        self.assertLess(self.index._indexed, len(self.index))
+        self.assertEqual(self.index.find(self.hashes[10])[1], 0)
+
+    def test_popcount(self):
+        values = np.array([[0, 1, 2 ** 64 - 1]], dtype=np.uint64)
+        self.assertEqual(_popcount(values).tolist(), [[0, 1, 64]])
+
+    def test_max_distance_limited_by_bands(self):
+        with self.assertRaises(ValueError):
+            SlipHashIndex(max_distance=slip_hash.BANDS)
+
+class TestSlipHashStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+        slip_hash.reset_index()
+
+    def tearDown(self):
+        slip_hash.reset_index()
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_remembered_slips_are_found(self):
+        phash = load_slip_hash(SAMPLE_SLIP)
+        self.assertIsNone(slip_hash.find_reused_slip(phash))
+        slip_hash.remember_slip(phash, '0123456789')
+        self.assertEqual(slip_hash.find_reused_slip(phash), '0123456789')
+
+        # A fresh process loads it from the database
+        slip_hash.reset_index()
+        self.assertEqual(slip_hash.find_reused_slip(phash), '0123456789')
+
+class TestSlipHashAction(unittest.TestCase):
+    def test_off_by_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('SLIP_HASH_ACTION', None)
+            module = importlib.reload(slip_hash)
+            try:
+                self.assertEqual(module.SLIP_HASH_ACTION, 'off')
+                self.assertFalse(module.enabled())
+            finally:
+                importlib.reload(slip_hash)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+import asyncio
+import io
+import time
+from unittest import mock
+
+from PIL import Image
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from services import slip_pipeline
+from services.slip_pipeline import decode_image, screen_and_read
+from services.nsfw_service import NSFWQueueFull
+
+STAGE_SECONDS = 0.3
+
+class FakeDetector:
+    def __init__(self, verdict=False, error=None):
+        self.verdict = verdict
+        self.error = error
+
+    async def screen(self, image):
+        await asyncio.sleep(STAGE_SECONDS)
+        if self.error:
+            raise self.error
+        return self.verdict
+
+def slow_ocr(image):
+    time.sleep(STAGE_SECONDS)
+    return ["KBZ Pay", f"{image.width}x{image.height}"]
+
+class TestSlipPipeline(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(slip_pipeline.ocr_service, 'extract_text', side_effect=slow_ocr)
+        self.ocr = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.image = Image.new('RGB', (108, 240), 'white')
+
+    def test_stages_run_concurrently(self):
+        start = time.perf_counter()
+        result = asyncio.run(screen_and_read(self.image, FakeDetector()))
+        self.assertEqual(result, (False, ["KBZ Pay", "108x240"]))
+        # About max(nsfw, ocr), not their sum
+        self.assertLess(time.perf_counter() - start, STAGE_SECONDS * 1.7)
+
+    def test_flagged_photo_cancels_ocr(self):
+        async def run():
+            # Occupy the pool so this photo's OCR is still queued when the screen flags it
+            executor = slip_pipeline.get_executor()
+            blockers = [asyncio.get_running_loop().run_in_executor(executor, time.sleep, STAGE_SECONDS * 2)
+                        for _ in range(slip_pipeline.SLIP_PIPELINE_WORKERS)]
+            result = await screen_and_read(self.image, FakeDetector(verdict=True))
+            await asyncio.gather(*blockers)
+            return result
+
+        self.assertEqual(asyncio.run(run()), (True, None))
+        self.ocr.assert_not_called()
+
+    def test_screening_errors_do_not_stop_ocr(self):
+        is_nsfw, text_lines = asyncio.run(screen_and_read(self.image, FakeDetector(error=RuntimeError("model crashed"))))
+        self.assertIsNone(is_nsfw)
+        self.assertEqual(text_lines[0], "KBZ Pay")
+
+    def test_full_queue_fails_closed(self):
+        async def run():
+            # Occupy the pool so this photo's OCR is still queued when screening is refused
+            executor = slip_pipeline.get_executor()
+            blockers = [asyncio.get_running_loop().run_in_executor(executor, time.sleep, STAGE_SECONDS * 2)
+                        for _ in range(slip_pipeline.SLIP_PIPELINE_WORKERS)]
+            try:
+                with self.assertRaises(NSFWQueueFull):
+                    await screen_and_read(self.image, FakeDetector(error=NSFWQueueFull("full")))
+            finally:
+                await asyncio.gather(*blockers)
+
+        asyncio.run(run())
+        self.ocr.assert_not_called()
+
+    def test_cached_text_skips_ocr(self):
+        self.assertEqual(asyncio.run(screen_and_read(self.image, None, read=False)), (None, None))
+        self.ocr.assert_not_called()
+
+    def test_decode_image(self):
+        buffer = io.BytesIO()
+        self.image.save(buffer, 'PNG')
+        self.assertEqual(decode_image(buffer.getvalue()).size, (108, 240))
+        with self.assertRaises(OSError):
+            decode_image(b'not an image')
+
+if __name__ == '__main__':
+    unittest.main()
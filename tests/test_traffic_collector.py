@@ -0,0 +1,66 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+# Add watchdog to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src', 'watchdog'))
+
+from traffic_collector import parse_stat_name, parse_user_stats, traffic_deltas
+
+class TestTrafficCollector(unittest.TestCase):
+    def test_parse_stat_name(self):
+        self.assertEqual(
+            parse_stat_name("user>>>abc-123>>>traffic>>>downlink"),
+            ("abc-123", "downlink")
+        )
+        self.assertEqual(
+            parse_stat_name("user>>>abc-123>>>traffic>>>uplink"),
+            ("abc-123", "uplink")
+        )
+
+    def test_parse_stat_name_rejects_other_counters(self):
+        self.assertIsNone(parse_stat_name("inbound>>>vless-in>>>traffic>>>uplink"))
+        self.assertIsNone(parse_stat_name("user>>>abc>>>traffic>>>sideways"))
+        self.assertIsNone(parse_stat_name("user>>>>>>traffic>>>uplink"))
+        self.assertIsNone(parse_stat_name("user>>>abc"))
+
+    def test_parse_user_stats(self):
+        stats = [
+            SimpleNamespace(name="user>>>u1>>>traffic>>>uplink", value=100),
+            SimpleNamespace(name="user>>>u1>>>traffic>>>downlink", value=400),
+            SimpleNamespace(name="user>>>u2>>>traffic>>>downlink", value=7),
+            SimpleNamespace(name="outbound>>>direct>>>traffic>>>downlink", value=999),
+        ]
+        traffic = parse_user_stats(stats)
+        self.assertEqual(traffic, {
+            "u1": {"uplink": 100, "downlink": 400},
+            "u2": {"uplink": 0, "downlink": 7},
+        })
+
+    def test_first_read_is_a_baseline(self):
+        current = {"u1": {"uplink": 100, "downlink": 400}}
+        self.assertEqual(traffic_deltas(None, current), {})
+
+    def test_deltas_since_previous_read(self):
+        previous = {
+            "u1": {"uplink": 100, "downlink": 400},
+            "u2": {"uplink": 5, "downlink": 5},
+        }
+        current = {
+            "u1": {"uplink": 150, "downlink": 500},
+            "u2": {"uplink": 5, "downlink": 5},
+            "u3": {"uplink": 0, "downlink": 30},
+        }
+        # u2 is idle; u3 is a new counter, all of it is new traffic
+        self.assertEqual(traffic_deltas(previous, current), {"u1": 150, "u3": 30})
+
+    def test_counter_reset_counts_current_value(self):
+        previous = {"u1": {"uplink": 1000, "downlink": 9000}}
+        current = {"u1": {"uplink": 20, "downlink": 9100}}
+        # uplink was recreated by a core restart: its 20 bytes are all new
+        self.assertEqual(traffic_deltas(previous, current), {"u1": 120})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import datetime
+import tempfile
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+
+class TestUsageBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_batch_inserts_and_accumulates(self):
+        day = datetime.date(2024, 1, 15)
+        database.update_usage('u1', 100, date=day)
+
+        updated = database.update_usage_batch({'u1': 50, 'u2': 25, 'u3': 0}, date=day)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(database.get_daily_usage('u1', date=day), 150)
+        self.assertEqual(database.get_daily_usage('u2', date=day), 25)
+        self.assertEqual(database.get_daily_usage('u3', date=day), 0)
+
+    def test_batch_matches_per_user_updates(self):
+        day = datetime.date(2024, 1, 16)
+        for _ in range(3):
+            database.update_usage_batch({'a': 10, 'b': 20}, date=day)
+            database.update_usage('c', 10, date=day)
+            database.update_usage('d', 20, date=day)
+
+        self.assertEqual(database.get_daily_usage('a', date=day), database.get_daily_usage('c', date=day))
+        self.assertEqual(database.get_daily_usage('b', date=day), database.get_daily_usage('d', date=day))
+
+    def test_active_daily_usage(self):
+        day = datetime.date(2024, 1, 17)
+        database.add_user('active', 1, 'a', 'ss')
+        database.add_user('idle', 2, 'b', 'ss')
+        database.add_user('gone', 3, 'c', 'ss')
+        database.expire_user('gone')
+        database.update_usage_batch({'active': 70, 'gone': 5}, date=day)
+        database.update_usage('active', 30, date=day - datetime.timedelta(days=1))
+
+        self.assertEqual(database.get_active_daily_usage(date=day), {'active': 70, 'idle': 0})
+
+    def test_empty_batch(self):
+        self.assertEqual(database.update_usage_batch({}), 0)
+
+if __name__ == '__main__':
+    unittest.main()
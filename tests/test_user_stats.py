@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import datetime
+import tempfile
+
+# Add src to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from db import database
+from db.pool import close_all_pools
+
+class TestUserStats(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self.tmpdir.name, 'test.db')
+        database.init_db()
+
+    def tearDown(self):
+        close_all_pools()
+        database.DB_PATH = self.original_path
+        self.tmpdir.cleanup()
+
+    def test_stats_join_today_usage(self):
+        database.add_user('k1', 42, 'alice', protocol='vless')
+        database.add_user('k2', 42, 'alice', protocol='')
+        database.add_user('k3', 42, 'alice', protocol='tuic')
+        database.add_user('other', 7, 'bob')
+        database.deactivate_user('k3')
+
+        database.update_usage('k1', 1000)
+        database.update_usage('k1', 9999, date=datetime.date.today() - datetime.timedelta(days=1))
+        database.update_usage('other', 5)
+
+        stats = database.get_user_stats(42)
+
+        self.assertEqual([s['uuid'] for s in stats], ['k1', 'k2', 'k3'])
+        self.assertEqual([s['protocol'] for s in stats], ['vless', 'ss', 'tuic'])
+        self.assertEqual([s['daily_usage_bytes'] for s in stats], [1000, 0, 0])
+        self.assertEqual([s['is_active'] for s in stats], [1, 1, 0])
+        self.assertEqual(set(stats[0]), {'uuid', 'protocol', 'is_active', 'data_limit_gb', 'daily_usage_bytes', 'expiry_date'})
+
+    def test_unknown_user(self):
+        self.assertEqual(database.get_user_stats(999), [])
+
+    def test_account_usage_aggregates_active_keys(self):
+        database.add_user('k1', 0, 'acct', protocol='vless', data_limit_gb=3.0)
+        database.add_user('k2', 0, 'acct', protocol='ss', data_limit_gb=5.0)
+        database.add_user('k3', 0, 'acct', protocol='tuic', data_limit_gb=50.0)
+        conn = database.get_db_connection()
+        conn.executemany('''
+            INSERT INTO vpn_keys (user_uuid, key_name, protocol, key_uuid, config_link, expires_at, is_active)
+            VALUES ('acct', ?, ?, ?, 'link', ?, ?)
+        ''', [
+            ('a', 'vless', 'k1', '2030-01-01T00:00:00', 1),
+            ('b', 'ss', 'k2', '2029-06-01T00:00:00', 1),
+            ('c', 'tuic', 'k3', '2031-01-01T00:00:00', 0),  # inactive: ignored
+        ])
+        conn.commit()
+        conn.close()
+        database.update_usage('k1', 100)
+        database.update_usage('k2', 20)
+        database.update_usage('k3', 3)
+
+        summary = database.get_account_usage('acct')
+
+        self.assertEqual(summary['key_count'], 2)
+        self.assertEqual(summary['daily_usage_bytes'], 120)
+        self.assertEqual(summary['data_limit_gb'], 8.0)
+        self.assertEqual(summary['max_expires_at'], '2030-01-01T00:00:00')
+        self.assertEqual(summary['latest_protocol'], 'ss')
+
+    def test_account_usage_without_keys(self):
+        summary = database.get_account_usage('nobody')
+        self.assertEqual(summary['key_count'], 0)
+        self.assertEqual(summary['daily_usage_bytes'], 0)
+        self.assertIsNone(summary['latest_protocol'])
+
+if __name__ == '__main__':
+    unittest.main()
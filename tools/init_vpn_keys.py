@@ -1,31 +1,21 @@
-import sqlite3
+import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+
+from db.migrations import migrate
+from db.pool import get_connection
+
 DB_PATH = "src/db/vpn_bot.db"
 
 def init_vpn_keys():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    # vpn_keys is part of the versioned schema; just bring the DB up to date
+    conn = get_connection(DB_PATH)
     
     print("Creating vpn_keys table...")
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS vpn_keys (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_uuid TEXT,
-            key_name TEXT,
-            protocol TEXT,
-            server_address TEXT,
-            server_port INTEGER,
-            key_uuid TEXT,
-            key_password TEXT,
-            config_link TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP
-        )
-    ''')
+    for version, description in migrate(conn):
+        print(f"Applied migration {version}: {description}")
     
-    conn.commit()
     conn.close()
     print("Done.")
 